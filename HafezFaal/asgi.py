@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HafezFaal.settings')
+# Serve the read-only API endpoints with their native async views.
+os.environ.setdefault('FAAL_ASYNC_API', '1')
 
 application = get_asgi_application()
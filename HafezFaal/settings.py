@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -36,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
     'rest_framework',
     'corsheaders',
@@ -43,12 +47,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'faal.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'faal.frontend.FrontendMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'faal.hashing.HashingPoolMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,8 +89,55 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,  # seconds to wait for a lock before "database is locked"
+        },
     }
 }
+if django.VERSION >= (5, 1):
+    # Take the write lock when a transaction starts instead of upgrading a
+    # read lock later, which fails immediately under contention.
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# Read-only copy of the corpus tables (faal.replica), rebuilt when the corpus
+# changes. Ghazal, beyt and quote reads go there while it exists; tests read
+# the test database through it.
+FAAL_CORPUS_SNAPSHOT = BASE_DIR / '.cache' / 'corpus.sqlite3'
+FAAL_CORPUS_SNAPSHOT_DELAY = 1.0  # seconds of quiet before rebuilding
+# The database the snapshots copy. Test and benchmark databases never touch them.
+FAAL_CORPUS_SNAPSHOT_SOURCE = str(DATABASES['default']['NAME'])
+DATABASES['corpus'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': f'file:{FAAL_CORPUS_SNAPSHOT}?mode=ro&immutable=1',
+    'CONN_MAX_AGE': 600,
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['faal.replica.CorpusReplicaRouter']
+
+# Binary, memory-mapped copy of the ghazals and quotes (faal.corpus_map) that
+# all workers share through the page cache. Built from the same source and
+# on the same schedule as the snapshot above.
+FAAL_CORPUS_MAP = BASE_DIR / '.cache' / 'corpus.map'
+
+# Its modification time is the corpus version (faal.corpus), which every
+# worker compares against its cached indexes, payloads and pages.
+FAAL_CORPUS_VERSION_FILE = BASE_DIR / '.cache' / 'corpus.version'
+
+# Points FAAL_CORPUS_VERSION_FILE and the other shared files under .cache at a
+# temporary directory, so test runs leave running workers alone.
+TEST_RUNNER = 'faal.testing.TestRunner'
+
+# Applied to every new SQLite connection by faal.db.configure_sqlite.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,  # ms
+    'cache_size': -20000,  # KiB, i.e. ~20 MB of page cache per connection
+    'mmap_size': 268435456,  # 256 MB
+    'temp_store': 'MEMORY',
+}
 
 
 # Password validation
@@ -105,6 +159,25 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing. The preferred hasher is picked with DJANGO_PASSWORD_HASHER
+# ('pbkdf2', 'scrypt' or 'argon2'; argon2 needs the argon2-cffi package). The
+# others stay listed so existing hashes still verify, and Django rehashes them
+# with the preferred hasher on the next successful login. Each hasher runs on
+# the bounded pool in faal.hashing; hashes beyond workers + queue get 429.
+PASSWORD_HASHER = os.environ.get('DJANGO_PASSWORD_HASHER', 'pbkdf2')
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'faal.hashing.PooledPBKDF2PasswordHasher',
+    'scrypt': 'faal.hashing.PooledScryptPasswordHasher',
+    'argon2': 'faal.hashing.PooledArgon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+FAAL_HASHING_WORKERS = None  # None: os.cpu_count(); 0: hash inline on the request thread
+FAAL_HASHING_QUEUE = 16
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -118,9 +191,21 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [
-    BASE_DIR / 'static',
+    ('fonts', BASE_DIR / 'hafez-faal-frontend' / 'public' / 'fonts'),
 ]
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # Content-hashed names plus .gz/.br variants (brotli when the package is installed).
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
+
+# The React bundle written by `manage.py build_static`, served under /app/ by
+# faal.frontend.FrontendMiddleware (WhiteNoise) and faal.frontend.spa.
+FAAL_FRONTEND_BUILD = BASE_DIR / 'hafez-faal-frontend' / 'build'
+# Hashed names, collectstatic's 12 hex digits or the bundle's 8 or more, never change.
+WHITENOISE_IMMUTABLE_FILE_TEST = r'\.[0-9a-f]{8,}\.'
 
 
 # Default primary key field type
@@ -178,6 +263,27 @@ SESSION_COOKIE_HTTPONLY = False  # Allow JavaScript access
 SESSION_COOKIE_AGE = 86400  # 24 hours
 SESSION_SAVE_EVERY_REQUEST = True
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
+# Sliding expiry is kept in the shared session cache; the django_session row
+# is only rewritten on real changes or when half of its age has elapsed.
+SESSION_ENGINE = 'faal.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_DB_REFRESH_RATIO = 0.5
+
+# Caches. Sessions live in a file-based cache so every gunicorn worker sees
+# the same entries (a logout in one worker must not linger in another).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'sessions',
+        'TIMEOUT': SESSION_COOKIE_AGE,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
 
 # For API authentication
 REST_FRAMEWORK = {
@@ -195,6 +301,10 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ],
+    # Reverse proxies in front of the app. Throttles key on the client address
+    # they append to X-Forwarded-For; with none, on REMOTE_ADDR, so a client
+    # cannot pick its own bucket with a forged header.
+    'NUM_PROXIES': int(os.environ.get('FAAL_NUM_PROXIES', '0')),
 }
 
 # Logging for debugging
@@ -213,4 +323,60 @@ LOGGING = {
             'propagate': True,
         },
     },
-}
\ No newline at end of file
+}
+# Daily faal assignment: 'random' writes the UserDailyFaal row inside the
+# request, 'deterministic' derives it from (user, date, corpus) and persists
+# it in batches from a background flusher.
+FAAL_ASSIGNMENT_MODE = 'random'
+FAAL_FLUSH_BATCH_SIZE = 500
+FAAL_FLUSH_INTERVAL = 2.0  # seconds
+
+# Ghazal recordings (<ghazal_number>.mp3) and the manifest written by
+# `manage.py build_audio_manifest`.
+FAAL_AUDIO_DIR = BASE_DIR / 'hafez-faal-frontend' / 'public' / 'audio' / 'hafez'
+FAAL_AUDIO_MANIFEST = FAAL_AUDIO_DIR / 'manifest.json'
+
+# Native async views for the read-only API (faal.async_api_views). HafezFaal.asgi
+# turns this on; they need Django 5.1+ for request.auser() and async sessions.
+FAAL_ASYNC_API = os.environ.get('FAAL_ASYNC_API') == '1' and django.VERSION >= (5, 1)
+
+# Static copies of the anonymous pages (with .gz/.br variants) written by
+# `manage.py prerender_pages` for the front-end server.
+FAAL_PRERENDER_DIR = BASE_DIR / 'prerendered'
+
+# Request metrics (faal.metrics), scraped from /metrics/ by a local Prometheus.
+# Each worker writes its counters to FAAL_METRICS_DIR so one scrape covers all.
+FAAL_METRICS_DIR = BASE_DIR / '.cache' / 'metrics'
+FAAL_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+# Most queries a request to each URL name should run once the worker is warm.
+# The first request after a corpus change also loads the corpus indexes and
+# may go over once per worker.
+FAAL_QUERY_BUDGETS = {
+    'api_daily_quote': 0,
+    'api_dashboard': 3,
+    'api_current_user': 2,
+    'api_quotes': 2,
+    'api_ghazals': 2,
+    'api_history': 3,
+}
+# Profile this fraction of requests with cProfile and keep the slow ones.
+FAAL_PROFILE_SAMPLE_RATE = float(os.environ.get('FAAL_PROFILE_SAMPLE_RATE', '0'))
+FAAL_PROFILE_SLOW_MS = 500
+FAAL_PROFILE_DIR = BASE_DIR / '.cache' / 'profiles'
+
+# Token buckets (faal.throttling): 'N/period' allows a burst of N that refills
+# over the period. FAAL_THROTTLE=0 turns throttling off, e.g. for load tests.
+FAAL_THROTTLE_DB = BASE_DIR / '.cache' / 'throttle.sqlite3'
+FAAL_THROTTLE_RATES = {} if os.environ.get('FAAL_THROTTLE') == '0' else {
+    'auth_ip': '20/min',
+    'login_username': '10/min',
+    'availability_ip': '120/min',
+    'dashboard_user': '30/min',
+    'dashboard_ip': '300/min',
+}
+
+# Bloom filter behind /api/auth/availability/ (faal.availability). Users that
+# other workers registered are loaded every REFRESH seconds, and the whole
+# filter every REBUILD seconds.
+FAAL_AVAILABILITY_REFRESH = 5
+FAAL_AVAILABILITY_REBUILD = 3600
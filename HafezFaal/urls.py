@@ -16,13 +16,18 @@ Including another URLconf
 """
 # from django.contrib import admin
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.contrib.auth import views as auth_views
 
+from faal import frontend
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('faal.urls')),
     path('api/', include('faal.api_urls')), 
     path('login/', auth_views.LoginView.as_view(), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
-]
\ No newline at end of file
+    # The React build: /app/ and its client-side routes (no file extension).
+    # Its files under /app/ are served by faal.frontend.FrontendMiddleware.
+    re_path(rf'^{frontend.URL_PREFIX}[^.]*$', frontend.spa, name='frontend'),
+]
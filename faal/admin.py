@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Quote, HafezGhazal, UserDailyFaal
+from . import search
+from .models import DailyFaalCount, GhazalDrawCount, Quote, HafezGhazal, UserDailyFaal
 
 @admin.register(Quote)
 class QuoteAdmin(admin.ModelAdmin):
@@ -13,8 +14,47 @@ class HafezGhazalAdmin(admin.ModelAdmin):
     ordering = ['ghazal_number']
     search_fields = ['ghazal_number', 'persian_text']
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of LIKE '%...%' over persian_text.
+        if not search_term or not search.is_available():
+            return super().get_search_results(request, queryset, search_term)
+        matches = queryset.filter(pk__in=search.matching_ids(search_term))
+        if search_term.strip().isdigit():
+            matches |= queryset.filter(ghazal_number=int(search_term))
+        return matches, False
+
 @admin.register(UserDailyFaal)
 class UserDailyFaalAdmin(admin.ModelAdmin):
     list_display = ['user', 'ghazal', 'date']
+    # One joined query for the page; __str__ touches both relations.
+    list_select_related = ['user', 'ghazal']
     list_filter = ['date']
-    readonly_fields = ['user', 'ghazal', 'date']
\ No newline at end of file
+    ordering = ['-date', '-user']
+    # Skip the unfiltered COUNT(*) over the whole table on every page.
+    show_full_result_count = False
+    readonly_fields = ['user', 'ghazal', 'date']
+
+class RollupAdmin(admin.ModelAdmin):
+    """Read-only views of the analytics rollups, maintained by triggers (faal.analytics)."""
+
+    date_hierarchy = 'date'
+    ordering = ['-date']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(DailyFaalCount)
+class DailyFaalCountAdmin(RollupAdmin):
+    list_display = ['date', 'count']
+
+@admin.register(GhazalDrawCount)
+class GhazalDrawCountAdmin(RollupAdmin):
+    list_display = ['date', 'ghazal', 'count']
+    list_select_related = ['ghazal']
+    ordering = ['-date', '-count']
@@ -0,0 +1,126 @@
+"""
+Materialized rollups of ``UserDailyFaal`` for analytics.
+
+``GhazalDrawCount`` holds how many faals drew each ghazal on each day, and
+``DailyFaalCount`` how many faals were assigned each day. A user gets at most
+one faal a day, so the daily total is also that day's number of faal users.
+
+SQLite triggers on ``faal_userdailyfaal`` (defined in migration ``0005``) keep
+both tables current inside the writing transaction. Every path that assigns
+faals is counted: the request itself, the deterministic flusher's
+``bulk_create()`` and ``prepare_daily_faals``. Rows that ``ignore_conflicts``
+skipped are not. ``backfill()`` recomputes a date range from
+``UserDailyFaal``, for history loaded while the triggers were missing.
+
+Reports read only the rollups. Their cost depends on the date range asked
+for, never on how much history is kept.
+"""
+
+import math
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .models import DailyFaalCount, GhazalDrawCount, UserDailyFaal
+
+MAX_REPORT_DAYS = 366
+
+FAALS = UserDailyFaal._meta.db_table
+DRAWS = GhazalDrawCount._meta.db_table
+TOTALS = DailyFaalCount._meta.db_table
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def backfill_rows(cursor, start=None, end=None):
+    """Recompute both rollups for ``start``..``end`` (inclusive, open-ended when ``None``)."""
+    conditions, params = [], []
+    if start is not None:
+        conditions.append('date >= %s')
+        params.append(start.isoformat())
+    if end is not None:
+        conditions.append('date <= %s')
+        params.append(end.isoformat())
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+    cursor.execute(f'DELETE FROM {DRAWS} {where}', params)
+    cursor.execute(f'DELETE FROM {TOTALS} {where}', params)
+    cursor.execute(
+        f'INSERT INTO {DRAWS} (date, ghazal_id, count) '
+        f'SELECT date, ghazal_id, COUNT(*) FROM {FAALS} {where} GROUP BY date, ghazal_id',
+        params,
+    )
+    cursor.execute(
+        f'INSERT INTO {TOTALS} (date, count) SELECT date, COUNT(*) FROM {FAALS} {where} GROUP BY date',
+        params,
+    )
+    cursor.execute(f'SELECT COUNT(*) FROM {TOTALS} {where}', params)
+    return cursor.fetchone()[0]
+
+
+def backfill(start=None, end=None):
+    """Rebuild the rollups for a date range from ``UserDailyFaal``; returns the days written."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        return backfill_rows(cursor, start, end)
+
+
+def daily_totals(start, end):
+    return list(
+        DailyFaalCount.objects.filter(date__range=(start, end), count__gt=0).order_by('date').values('date', 'count')
+    )
+
+
+def ghazal_draws(start, end):
+    """``{ghazal_id: draws}`` over a date range."""
+    rows = (
+        GhazalDrawCount.objects.filter(date__range=(start, end))
+        .values('ghazal_id')
+        .annotate(draws=Sum('count'))
+        .values_list('ghazal_id', 'draws')
+    )
+    return dict(rows)
+
+
+def uniformity(draws, ghazal_ids):
+    """Pearson's chi-square test of ``draws`` against a uniform pick from ``ghazal_ids``.
+
+    The p-value uses the Wilson-Hilferty normal approximation, which is close
+    for the hundreds of degrees of freedom a corpus gives. A small p-value
+    means the draws are unlikely to come from a uniform pick.
+    """
+    total = sum(draws.get(pk, 0) for pk in ghazal_ids)
+    if len(ghazal_ids) < 2 or not total:
+        return None
+    expected = total / len(ghazal_ids)
+    chi_square = sum((draws.get(pk, 0) - expected) ** 2 for pk in ghazal_ids) / expected
+    dof = len(ghazal_ids) - 1
+    z = ((chi_square / dof) ** (1 / 3) - (1 - 2 / (9 * dof))) / math.sqrt(2 / (9 * dof))
+    return {
+        'draws': total,
+        'expected_per_ghazal': round(expected, 3),
+        'chi_square': round(chi_square, 3),
+        'degrees_of_freedom': dof,
+        'p_value': round(0.5 * math.erfc(z / math.sqrt(2)), 6),
+    }
+
+
+def report(start, end, pool):
+    """Daily totals, per-ghazal draws and the uniformity test for ``start``..``end``.
+
+    ``pool`` is the current ``ghazal_pool``, which maps ids to ghazal numbers
+    and supplies the ghazals that were never drawn.
+    """
+    days = daily_totals(start, end)
+    draws = ghazal_draws(start, end)
+    return {
+        'start': start,
+        'end': end,
+        'total': sum(day['count'] for day in days),
+        'days': days,
+        'ghazals': [
+            {'ghazal_number': number, 'draws': draws.get(pk, 0)}
+            for number, pk in zip(pool.numbers, pool.ids)
+        ],
+        'uniformity': uniformity(draws, pool.ids),
+    }
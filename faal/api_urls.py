@@ -1,21 +1,51 @@
+from django.conf import settings
 from django.urls import path
-from . import api_views
+from . import api_views, async_api_views
+
+# Under ASGI the read-only endpoints are served by native async views.
+if settings.FAAL_ASYNC_API:
+    read_views = {
+        'quote': async_api_views.daily_quote,
+        'quotes': async_api_views.quote_list,
+        'ghazals': async_api_views.ghazal_list,
+        'dashboard': async_api_views.user_dashboard,
+        'user': async_api_views.current_user,
+    }
+else:
+    read_views = {
+        'quote': api_views.daily_quote,
+        'quotes': api_views.QuoteListView.as_view(),
+        'ghazals': api_views.HafezGhazalListView.as_view(),
+        'dashboard': api_views.user_dashboard,
+        'user': api_views.current_user,
+    }
 
 urlpatterns = [
     # CSRF token endpoint - MUST be first
     path('csrf/', api_views.get_csrf_token, name='api_csrf'),
     
     # Public endpoints
-    path('quote/', api_views.daily_quote, name='api_daily_quote'),
-    path('quotes/', api_views.QuoteListView.as_view(), name='api_quotes'),
-    path('ghazals/', api_views.HafezGhazalListView.as_view(), name='api_ghazals'),
+    path('quote/', read_views['quote'], name='api_daily_quote'),
+    path('quotes/', read_views['quotes'], name='api_quotes'),
+    path('ghazals/', read_views['ghazals'], name='api_ghazals'),
+    path('search/', api_views.search_ghazals, name='api_search'),
+    path('ghazals/<int:ghazal_number>/beyts/', api_views.ghazal_beyts, name='api_beyts'),
+    path('ghazals/<int:ghazal_number>/beyts/<int:position>/', api_views.ghazal_beyt, name='api_beyt'),
+    path('audio/manifest/', api_views.audio_manifest, name='api_audio_manifest'),
+    path('audio/<int:ghazal_number>.<str:fmt>', api_views.ghazal_audio, name='api_audio'),
     
     # Auth endpoints
     path('auth/register/', api_views.register_user, name='api_register'),
+    path('auth/availability/', api_views.check_availability, name='api_availability'),
     path('auth/login/', api_views.login_user, name='api_login'),
     path('auth/logout/', api_views.logout_user, name='api_logout'),
-    path('auth/user/', api_views.current_user, name='api_current_user'),
+    path('auth/user/', read_views['user'], name='api_current_user'),
     
     # Protected endpoints
-    path('dashboard/', api_views.user_dashboard, name='api_dashboard'),
+    path('dashboard/', read_views['dashboard'], name='api_dashboard'),
+    path('history/', api_views.faal_history, name='api_history'),
+    path('history/export.<str:fmt>', api_views.export_faal_history, name='api_history_export'),
+
+    # Staff endpoints
+    path('analytics/', api_views.faal_analytics, name='api_analytics'),
 ]
\ No newline at end of file
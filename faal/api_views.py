@@ -1,20 +1,38 @@
 from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+)
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from django.views.decorators.http import condition, require_safe
 from django.middleware.csrf import get_token
-from datetime import time
 import json
-from .models import Quote, HafezGhazal, UserDailyFaal
+import os
+from datetime import timedelta
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+from . import analytics, audio, availability, beyts, history, search
+from .assignment import get_daily_faal
+from .corpus import ghazal_pool
+from .hashing import HashingPoolSaturated
+from .listing import corpus_conditional, list_response_body, list_response_data
+from .models import Quote, HafezGhazal
+from .payloads import render_dashboard
+from .throttling import (
+    AuthIPThrottle, AvailabilityIPThrottle, DashboardIPThrottle, DashboardUserThrottle, LoginUsernameThrottle,
+)
 from .serializers import (
-    QuoteSerializer, HafezGhazalSerializer, 
-    UserDailyFaalSerializer, UserSerializer, UserRegistrationSerializer
+    BeytSerializer, QuoteSerializer, HafezGhazalSerializer, 
+    UserSerializer, UserRegistrationSerializer
 )
 
 # CSRF Token endpoint
@@ -27,6 +45,7 @@ def get_csrf_token(request):
     return Response({'csrf_token': token})
 
 @api_view(['GET'])
+@authentication_classes([])
 @permission_classes([AllowAny])
 def daily_quote(request):
     quote = Quote.get_daily_quote()
@@ -37,59 +56,247 @@ def daily_quote(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([DashboardUserThrottle, DashboardIPThrottle])
 def user_dashboard(request):
-    today = timezone.now().date()
-    current_time = timezone.now().time()
-    faal_time = time(8, 0)  # 8:00 AM
-    
-    try:
-        user_faal = UserDailyFaal.objects.get(user=request.user, date=today)
-        serializer = UserDailyFaalSerializer(user_faal)
-        return Response({
-            'faal': serializer.data,
-            'faal_available': True,
-            'message': None
-        })
-    except UserDailyFaal.DoesNotExist:
-        if current_time >= faal_time:
-            random_ghazal = HafezGhazal.get_random_ghazal()
-            if random_ghazal:
-                user_faal = UserDailyFaal.objects.create(
-                    user=request.user,
-                    ghazal=random_ghazal,
-                    date=today
-                )
-                serializer = UserDailyFaalSerializer(user_faal)
-                return Response({
-                    'faal': serializer.data,
-                    'faal_available': True,
-                    'message': 'Your personal Hafez Faal for today has been assigned!'
-                })
-            else:
-                return Response({
-                    'faal': None,
-                    'faal_available': False,
-                    'message': 'No ghazals available.'
-                })
-        else:
-            return Response({
-                'faal': None,
-                'faal_available': False,
-                'message': 'Your personal Hafez Faal for today will be available after 8 A.M.'
-            })
+    daily_faal = get_daily_faal(request.user)
+    body = render_dashboard(daily_faal)
+    return HttpResponse(body, content_type='application/json')
 
+@method_decorator(corpus_conditional('quotes'), name='get')
 class QuoteListView(generics.ListAPIView):
     queryset = Quote.objects.all()
     serializer_class = QuoteSerializer
     permission_classes = [AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        body = list_response_body('quotes', request)
+        if body is not None:
+            return HttpResponse(body, content_type='application/json')
+        return Response(list_response_data('quotes', request))
+
+@method_decorator(corpus_conditional('ghazals'), name='get')
 class HafezGhazalListView(generics.ListAPIView):
     queryset = HafezGhazal.objects.all()
     serializer_class = HafezGhazalSerializer
     permission_classes = [AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        body = list_response_body('ghazals', request)
+        if body is not None:
+            return HttpResponse(body, content_type='application/json')
+        return Response(list_response_data('ghazals', request))
+
+SEARCH_COLUMNS = {
+    'all': None,
+    'persian': 'persian_text',
+    'english': 'english_translation',
+}
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_ghazals(request):
+    query = request.query_params.get('q', '').strip()
+    search_in = request.query_params.get('in', 'all')
+    if search_in not in SEARCH_COLUMNS:
+        return Response({'error': f'"in" must be one of: {", ".join(SEARCH_COLUMNS)}'}, status=400)
+    try:
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=400)
+    results = search.search(query, SEARCH_COLUMNS[search_in], limit) if query else []
+    return Response({
+        'query': query,
+        'count': len(results),
+        'results': results
+    })
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+@corpus_conditional('beyt')
+def ghazal_beyt(request, ghazal_number, position):
+    """One couplet, for cards and shares that do not need the whole ghazal."""
+    beyt = beyts.get_beyts(ghazal_number, position, position).first()
+    if beyt is None:
+        return Response({'error': 'Beyt not found'}, status=404)
+    return Response(BeytSerializer(beyt).data)
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+@corpus_conditional('beyts')
+def ghazal_beyts(request, ghazal_number):
+    """A ghazal's couplets, all of them or ``?start=&end=`` (1-based, inclusive)."""
+    try:
+        start = int(request.query_params.get('start', 1))
+        end = int(request.query_params['end']) if request.query_params.get('end') else None
+    except ValueError:
+        return Response({'error': 'start and end must be integers'}, status=400)
+    rows = list(beyts.get_beyts(ghazal_number, start, end))
+    if not rows:
+        return Response({'error': 'Beyt not found'}, status=404)
+    return Response({
+        'ghazal_number': ghazal_number,
+        'count': len(rows),
+        'results': BeytSerializer(rows, many=True).data,
+    })
+
+@require_safe
+@condition(etag_func=lambda request: f'audio-manifest-{audio.library.version()}')
+def audio_manifest(request):
+    """Duration of every recording, with the size, hash and versioned URL of each format."""
+    recordings = {}
+    for (number, fmt), entry in sorted(audio.library.entries().items()):
+        recording = recordings.setdefault(number, {
+            'ghazal_number': number,
+            'duration': entry['duration'],
+            'sources': [],
+        })
+        recording['sources'].append({
+            'format': fmt,
+            'mime_type': audio.mime_type(fmt),
+            'size': entry['size'],
+            'sha256': entry['sha256'],
+            'url': f"{reverse('api_audio', args=[number, fmt])}?v={audio.version_token(entry)}",
+        })
+    response = JsonResponse({'count': len(recordings), 'results': list(recordings.values())})
+    patch_cache_control(response, public=True, max_age=300)
+    return response
+
+@require_safe
+def ghazal_audio(request, ghazal_number, fmt):
+    """Stream a recording, honouring single byte ranges, ETags and If-Range."""
+    if fmt not in audio.FORMATS:
+        raise Http404('Unknown audio format')
+    try:
+        f = open(audio.audio_path(ghazal_number, fmt), 'rb')
+    except FileNotFoundError:
+        raise Http404('No recording for this ghazal')
+    size = os.fstat(f.fileno()).st_size
+    entry = audio.library.get(ghazal_number, fmt, size)
+    etag = audio.etag(entry)
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        f.close()
+        response = HttpResponseNotModified()
+    else:
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if 'Range' in request.headers and (if_range is None or if_range == etag):
+            try:
+                byte_range = audio.parse_range(request.headers['Range'], size)
+            except audio.RangeNotSatisfiable:
+                f.close()
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+        if byte_range is None:
+            response = FileResponse(f, content_type=audio.mime_type(fmt))
+        else:
+            start, end = byte_range
+            response = FileResponse(audio.FileRange(f, start, end - start + 1), status=206, content_type=audio.mime_type(fmt))
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    if request.GET.get('v') == audio.version_token(entry):
+        # The URL names this exact content, so it can be cached forever.
+        patch_cache_control(response, public=True, max_age=365 * 24 * 3600, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=3600)
+    return response
+
+def history_user_id(request):
+    """The user whose history is read: yourself, or ``?user=<id>`` for staff."""
+    requested = request.query_params.get('user')
+    if requested is None or not request.user.is_staff:
+        return request.user.pk
+    try:
+        return int(requested)
+    except ValueError:
+        raise ValidationError({'user': 'A valid integer is required.'})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def faal_history(request):
+    """A user's past faals, newest first, with keyset pagination on date."""
+    params = request.query_params
+    before = history.decode_date_cursor(params['cursor']) if params.get('cursor') else None
+    try:
+        page_size = int(params.get('page_size', history.DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValidationError({'page_size': 'A valid integer is required.'})
+    page_size = max(1, min(page_size, history.MAX_PAGE_SIZE))
+
+    page = history.history_page(history_user_id(request), before, page_size)
+    next_url = None
+    if page['next'] is not None:
+        next_url = replace_query_param(
+            request.build_absolute_uri(), 'cursor', history.encode_date_cursor(page['next'])
+        )
+    return Response({'next': next_url, 'results': page['results']})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_faal_history(request, fmt):
+    """Stream faals as CSV or JSONL for one user, or for every user when staff omit ``user``."""
+    if fmt not in history.CONTENT_TYPES:
+        raise Http404('Unknown export format')
+    params = request.query_params
+    start = history.parse_date(params, 'start')
+    end = history.parse_date(params, 'end')
+    if request.user.is_staff and 'user' not in params:
+        user_id = None
+    else:
+        user_id = history_user_id(request)
+
+    rows = history.export_rows(user_id, start, end)
+    response = StreamingHttpResponse(history.stream_export(rows, fmt), content_type=history.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="faal-history.{fmt}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def faal_analytics(request):
+    """Daily faal totals and per-ghazal draws for ``?start=&end=`` (default: the last 30 days).
+
+    Read from the rollup tables only, with a chi-square test of whether the
+    draws look uniform.
+    """
+    params = request.query_params
+    end = history.parse_date(params, 'end') or timezone.localdate()
+    start = history.parse_date(params, 'start') or end - timedelta(days=29)
+    if start > end:
+        raise ValidationError({'start': 'start must not be after end.'})
+    if (end - start).days >= analytics.MAX_REPORT_DAYS:
+        raise ValidationError({'start': f'At most {analytics.MAX_REPORT_DAYS} days per report.'})
+    return Response(analytics.report(start, end, ghazal_pool.get()))
+
+def too_many_hashing_requests():
+    response = Response({'error': 'Too many login attempts right now, please retry shortly'}, status=429)
+    response['Retry-After'] = '1'
+    return response
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([AvailabilityIPThrottle])
+def check_availability(request):
+    """As-you-type check for the registration form: ``?username=...&email=...``."""
+    values = {
+        field: request.query_params[field].strip()
+        for field in availability.FIELDS
+        if request.query_params.get(field, '').strip()
+    }
+    if not values:
+        raise ValidationError({'detail': 'Pass a username, an email or both.'})
+    response = Response(availability.check(values))
+    patch_cache_control(response, no_store=True)
+    return response
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AuthIPThrottle])
 @csrf_exempt
 def register_user(request):
     try:
@@ -101,7 +308,10 @@ def register_user(request):
         
         serializer = UserRegistrationSerializer(data=data)
         if serializer.is_valid():
-            user = serializer.save()
+            try:
+                user = serializer.save()
+            except HashingPoolSaturated:
+                return too_many_hashing_requests()
             # Automatically log in the user after registration
             login(request, user)
             return Response({
@@ -114,6 +324,7 @@ def register_user(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AuthIPThrottle, LoginUsernameThrottle])
 @csrf_exempt
 def login_user(request):
     try:
@@ -129,7 +340,10 @@ def login_user(request):
         if not username or not password:
             return Response({'error': 'Username and password required'}, status=400)
         
-        user = authenticate(request, username=username, password=password)
+        try:
+            user = authenticate(request, username=username, password=password)
+        except HashingPoolSaturated:
+            return too_many_hashing_requests()
         if user:
             login(request, user)
             serializer = UserSerializer(user)
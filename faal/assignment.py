@@ -0,0 +1,243 @@
+"""
+Daily faal assignment shared by the API and the server-rendered dashboard.
+
+Two modes are available through ``settings.FAAL_ASSIGNMENT_MODE``:
+
+``random``
+    The original behaviour: the first visit after the gate picks a random
+    ghazal and writes the ``UserDailyFaal`` row inside the request.
+
+``deterministic``
+    The ghazal is derived from a hash of (user id, date, ghazal pool version),
+    so the dashboard can answer without writing. Assignments are queued in
+    memory and persisted to ``UserDailyFaal`` in batches by a background
+    flusher; a row that already exists always wins over the derived value.
+
+Concurrent requests from one user (a double-click, a client retrying) share
+a single assignment in each worker. Across workers the ``(user, date)``
+unique constraint decides: the losing insert reads back the winner's row.
+"""
+
+import atexit
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from datetime import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .coalescing import SingleFlight
+from .corpus import ghazal_pool
+from .db import retry_on_locked
+from .models import HafezGhazal, UserDailyFaal
+
+logger = logging.getLogger(__name__)
+
+FAAL_TIME = time(8, 0)  # 8:00 AM
+
+MESSAGE_ASSIGNED = 'Your personal Hafez Faal for today has been assigned!'
+MESSAGE_NO_GHAZALS = 'No ghazals available.'
+MESSAGE_NOT_YET = 'Your personal Hafez Faal for today will be available after 8 A.M.'
+
+DailyFaal = namedtuple('DailyFaal', ['faal', 'available', 'message'])
+
+
+def assignment_mode():
+    return getattr(settings, 'FAAL_ASSIGNMENT_MODE', 'random')
+
+
+def derive_ghazal(user_id, date, pool):
+    """Return the ``(ghazal_number, pk)`` a user is assigned on ``date``.
+
+    The pick only depends on the sorted ghazal numbers, so reordering or
+    renumbering primary keys does not move anyone's faal.
+    """
+    if not pool.numbers:
+        return None
+    seed = f'{user_id}:{date.isoformat()}:{pool.version}'.encode()
+    digest = hashlib.blake2b(seed, digest_size=8).digest()
+    index = int.from_bytes(digest, 'big') % len(pool.numbers)
+    return pool.numbers[index], pool.ids[index]
+
+
+class FaalFlusher:
+    """Buffers derived assignments and writes them to ``UserDailyFaal`` in batches."""
+
+    def __init__(self, batch_size=500, interval=2.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def get(self, user_id, date):
+        return self._pending.get((user_id, date))
+
+    def add(self, user_id, date, ghazal_id):
+        with self._lock:
+            ghazal_id = self._pending.setdefault((user_id, date), ghazal_id)
+            pending = len(self._pending)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='faal-flusher', daemon=True
+                )
+                self._thread.start()
+        if pending >= self.batch_size:
+            self._wake.set()
+        return ghazal_id
+
+    def _write(self, batch):
+        retry_on_locked(UserDailyFaal.objects.bulk_create)(
+            [
+                UserDailyFaal(user_id=user_id, date=date, ghazal_id=ghazal_id)
+                for (user_id, date), ghazal_id in batch
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def _still_valid(batch):
+        """The entries whose user and ghazal still exist."""
+        user_ids = set(
+            User.objects.filter(pk__in={user_id for (user_id, _), _ in batch}).values_list('pk', flat=True)
+        )
+        ghazal_ids = set(
+            HafezGhazal.objects.filter(pk__in={ghazal_id for _, ghazal_id in batch}).values_list('pk', flat=True)
+        )
+        return [entry for entry in batch if entry[0][0] in user_ids and entry[1] in ghazal_ids]
+
+    def flush(self):
+        """Persist everything queued so far and return the number of rows sent."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.items())
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except IntegrityError:
+                # A user or ghazal deleted since it was queued fails the whole
+                # insert; drop those entries rather than retrying them forever.
+                valid = self._still_valid(batch)
+                logger.warning('Dropped %d daily faal assignments for deleted rows', len(batch) - len(valid))
+                self._write(valid)
+            # Entries stay visible to get() until they are on disk, so a
+            # concurrent request never falls between the buffer and the table.
+            with self._lock:
+                for key, _ in batch:
+                    self._pending.pop(key, None)
+            return len(batch)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush daily faal assignments')
+            finally:
+                connection.close()
+
+
+flusher = FaalFlusher(
+    batch_size=getattr(settings, 'FAAL_FLUSH_BATCH_SIZE', 500),
+    interval=getattr(settings, 'FAAL_FLUSH_INTERVAL', 2.0),
+)
+atexit.register(flusher.flush)
+
+
+assignments = SingleFlight()
+
+
+@retry_on_locked
+def _create_daily_faal(user, ghazal, today):
+    """Insert the day's row, or return ``None`` when another worker got there first."""
+    try:
+        with transaction.atomic():
+            return UserDailyFaal.objects.create(user=user, ghazal=ghazal, date=today)
+    except IntegrityError:
+        return None
+
+
+def _random_daily_faal(user, today):
+    try:
+        user_faal = UserDailyFaal.objects.select_related('ghazal').get(user=user, date=today)
+        return DailyFaal(user_faal, True, None)
+    except UserDailyFaal.DoesNotExist:
+        random_ghazal = HafezGhazal.get_random_ghazal()
+        if not random_ghazal:
+            return DailyFaal(None, False, MESSAGE_NO_GHAZALS)
+        user_faal = _create_daily_faal(user, random_ghazal, today)
+        if user_faal is None:
+            user_faal = UserDailyFaal.objects.select_related('ghazal').get(user=user, date=today)
+        return DailyFaal(user_faal, True, MESSAGE_ASSIGNED)
+
+
+def _deterministic_daily_faal(user, today):
+    pending_id = flusher.get(user.pk, today)
+    if pending_id is None:
+        user_faal = (
+            UserDailyFaal.objects.select_related('ghazal').filter(user=user, date=today).first()
+        )
+        if user_faal:
+            return DailyFaal(user_faal, True, None)
+        derived = derive_ghazal(user.pk, today, ghazal_pool.get())
+        if derived is None:
+            return DailyFaal(None, False, MESSAGE_NO_GHAZALS)
+        message = MESSAGE_ASSIGNED
+        ghazal_id = flusher.add(user.pk, today, derived[1])
+    else:
+        message = None
+        ghazal_id = pending_id
+
+    # The ghazal itself is loaded lazily; the API renders it from the
+    # pre-serialized payload cache without touching the row.
+    return DailyFaal(UserDailyFaal(user=user, ghazal_id=ghazal_id, date=today), True, message)
+
+
+def get_daily_faal(user, now=None):
+    """Return today's faal for ``user``, assigning it once the gate has opened.
+
+    The day and the 8 AM gate are in local time (``TIME_ZONE``), like the
+    daily quote and the analytics rollups.
+
+    Nothing is revealed before the gate, even when ``prepare_daily_faals``
+    has already assigned the day's row.
+    """
+    now = timezone.localtime(now)
+    if now.time() < FAAL_TIME:
+        return DailyFaal(None, False, MESSAGE_NOT_YET)
+    today = now.date()
+    if assignment_mode() == 'deterministic':
+        return assignments.do((user.pk, today), _deterministic_daily_faal, user, today)
+    return assignments.do((user.pk, today), _random_daily_faal, user, today)
+
+
+async def aget_daily_faal(user, now=None):
+    """``get_daily_faal()`` for async views.
+
+    Reads use the async ORM; the first visit after the gate, which writes the
+    assignment, runs the sync path (with its lock retries) in a thread.
+    """
+    now = timezone.localtime(now)
+    if now.time() < FAAL_TIME:
+        return DailyFaal(None, False, MESSAGE_NOT_YET)
+    today = now.date()
+    if assignment_mode() == 'deterministic' and flusher.get(user.pk, today) is not None:
+        return _deterministic_daily_faal(user, today)
+    user_faal = await (
+        UserDailyFaal.objects.select_related('ghazal').filter(user=user, date=today).afirst()
+    )
+    if user_faal:
+        return DailyFaal(user_faal, True, None)
+    return await sync_to_async(get_daily_faal)(user, now)
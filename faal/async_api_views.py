@@ -0,0 +1,99 @@
+"""
+Native async versions of the read-only API endpoints, for ASGI servers.
+
+DRF views are synchronous, so under ASGI every request to them is handed to a
+thread. These views answer the same URLs with the same JSON as their
+``faal.api_views`` counterparts, using ``request.auser()`` for the session
+lookup and the async ORM for queries. ``faal.api_urls`` routes to them when
+``FAAL_ASYNC_API`` is set, which ``HafezFaal.asgi`` does.
+"""
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import APIException, NotAuthenticated, Throttled, ValidationError
+
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from .assignment import aget_daily_faal
+from .listing import alist_response_data, corpus_conditional, list_response_body
+from .models import Quote
+from .payloads import arender_dashboard, renderer
+from .serializers import QuoteSerializer, UserSerializer
+from .throttling import client_ip, retry_after, take
+
+
+def json_response(data, status=200):
+    return HttpResponse(renderer.render(data), content_type='application/json', status=status)
+
+
+def error_response(exc):
+    """Render a DRF exception the way DRF's default exception handler does."""
+    data = exc.detail if isinstance(exc, ValidationError) else {'detail': exc.detail}
+    response = json_response(data, status=exc.status_code)
+    if getattr(exc, 'wait', None) is not None:
+        response['Retry-After'] = retry_after(exc.wait)
+    return response
+
+
+def not_authenticated():
+    """DRF's answer to anonymous users: 403, as session auth sends no ``WWW-Authenticate``."""
+    response = error_response(NotAuthenticated())
+    response.status_code = 403
+    return response
+
+
+def dashboard_wait(user_id, ip):
+    # take() is a blocking SQLite write, so it runs off the event loop.
+    return take('dashboard_user', user_id) or take('dashboard_ip', ip)
+
+
+async def authenticated_user(request):
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+@require_GET
+async def daily_quote(request):
+    quote = await Quote.aget_daily_quote()
+    if quote:
+        return json_response(QuoteSerializer(quote).data)
+    return json_response({'message': 'No quotes available'}, status=404)
+
+
+@require_GET
+async def user_dashboard(request):
+    user = await authenticated_user(request)
+    if user is None:
+        return not_authenticated()
+    wait = await sync_to_async(dashboard_wait)(user.pk, client_ip(request))
+    if wait is not None:
+        return error_response(Throttled(wait))
+    body = await arender_dashboard(await aget_daily_faal(user))
+    return HttpResponse(body, content_type='application/json')
+
+
+@require_GET
+async def current_user(request):
+    user = await authenticated_user(request)
+    if user is None:
+        return not_authenticated()
+    return json_response(UserSerializer(user).data)
+
+
+def listing_view(name):
+    @require_GET
+    @corpus_conditional(name)
+    async def view(request):
+        try:
+            body = list_response_body(name, request)
+            if body is not None:
+                return HttpResponse(body, content_type='application/json')
+            return json_response(await alist_response_data(name, request))
+        except APIException as e:
+            return error_response(e)
+    view.__name__ = f'{name}_list'
+    return view
+
+
+quote_list = listing_view('quotes')
+ghazal_list = listing_view('ghazals')
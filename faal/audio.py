@@ -0,0 +1,298 @@
+"""
+Ghazal recordings, served by ``HafezGhazal.ghazal_number``.
+
+Each recording exists as ``<n>.mp3`` in ``FAAL_AUDIO_DIR`` and as Ogg Opus in
+``ogg/<n>.opus`` under it. The ``build_audio_manifest`` command writes
+``FAAL_AUDIO_MANIFEST``, a JSON list of the size, duration and sha256 of every
+file, so the player knows a recording's length without probing it and
+responses carry a content-hash ETag without hashing on the request path.
+
+Responses are ``FileResponse``s, so WSGI servers with ``wsgi.file_wrapper``
+(gunicorn) send them with ``sendfile()``. Byte ranges are served the same way
+through ``FileRange``, which keeps ``fileno()`` and lets the Content-Length
+bound the copy, so seeking costs one range read instead of a download.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+
+from django.conf import settings
+
+HASH_PREFIX = 12
+
+# format -> (subdirectory of FAAL_AUDIO_DIR, MIME type)
+FORMATS = {
+    'mp3': ('', 'audio/mpeg'),
+    'opus': ('ogg', 'audio/ogg; codecs=opus'),
+}
+
+_NUMBER_RE = re.compile(r'^(\d+)\.(\w+)$')
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# MPEG audio frame header tables, indexed by the header's version and layer bits.
+_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+_LAYERS = {1: 3, 2: 2, 3: 1}
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def audio_dir():
+    return str(settings.FAAL_AUDIO_DIR)
+
+
+def manifest_path():
+    return str(settings.FAAL_AUDIO_MANIFEST)
+
+
+def audio_path(number, fmt='mp3'):
+    return os.path.join(audio_dir(), FORMATS[fmt][0], f'{int(number)}.{fmt}')
+
+
+def mime_type(fmt):
+    return FORMATS[fmt][1]
+
+
+def _parse_frame_header(header):
+    """``(frame_bytes, samples)`` for a 4-byte MPEG audio frame header, or None."""
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = _VERSIONS.get((header[1] >> 3) & 3)
+    layer = _LAYERS.get((header[1] >> 1) & 3)
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 1
+    if layer == 1:
+        samples = 384
+        frame_bytes = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 1 else 576
+        frame_bytes = samples // 8 * bitrate // sample_rate + padding
+    return frame_bytes, samples / sample_rate
+
+
+def mp3_duration(data):
+    """Duration in seconds of MP3 ``data``, from walking its frame headers."""
+    position = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        position = 10 + size
+    duration = 0.0
+    end = len(data)
+    if data[-128:-125] == b'TAG':
+        end -= 128
+    while position + 4 <= end:
+        frame = _parse_frame_header(data[position:position + 4])
+        if frame is None or frame[0] <= 0:
+            # Lost sync (junk or a tag between frames): skip to the next sync byte.
+            position = data.find(b'\xff', position + 1, end)
+            if position < 0:
+                break
+            continue
+        duration += frame[1]
+        position += frame[0]
+    return round(duration, 3)
+
+
+def opus_duration(data):
+    """Duration in seconds of Ogg Opus ``data``: last granule position less the pre-skip."""
+    last_page = data.rfind(b'OggS')
+    head = data.find(b'OpusHead')
+    if last_page < 0 or head < 0:
+        return 0.0
+    granule = int.from_bytes(data[last_page + 6:last_page + 14], 'little')
+    pre_skip = int.from_bytes(data[head + 10:head + 12], 'little')
+    # Opus granule positions always count 48 kHz samples.
+    return round(max(granule - pre_skip, 0) / 48000, 3)
+
+
+_DURATIONS = {'mp3': mp3_duration, 'opus': opus_duration}
+
+
+def describe_file(path, fmt):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return {
+        'size': len(data),
+        'duration': _DURATIONS[fmt](data),
+        'sha256': hashlib.sha256(data).hexdigest(),
+    }
+
+
+def build_manifest(directory=None):
+    """Describe every recording in every format, ordered by ghazal number."""
+    directory = directory or audio_dir()
+    entries = []
+    for fmt, (subdirectory, _) in FORMATS.items():
+        path = os.path.join(directory, subdirectory)
+        if not os.path.isdir(path):
+            continue
+        for name in os.listdir(path):
+            match = _NUMBER_RE.match(name)
+            if match and match.group(2) == fmt:
+                number = int(match.group(1))
+                entries.append({
+                    'ghazal_number': number,
+                    'format': fmt,
+                    **describe_file(os.path.join(path, name), fmt),
+                })
+    entries.sort(key=lambda entry: (entry['ghazal_number'], entry['format']))
+    return entries
+
+
+def write_manifest(entries, path=None):
+    """Atomically replace the manifest file so readers never see half of it."""
+    path = path or manifest_path()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.manifest-')
+    try:
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=1)
+            f.write('\n')
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class AudioLibrary:
+    """The audio manifest, reloaded when the manifest file changes on disk."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None
+        self._stamp = None
+        # Files missing from (or newer than) the manifest, described on first use.
+        self._described = {}
+
+    def _manifest_stamp(self):
+        try:
+            stat = os.stat(manifest_path())
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def entries(self):
+        stamp = self._manifest_stamp()
+        if self._entries is None or self._stamp != stamp:
+            with self._lock:
+                if self._entries is None or self._stamp != stamp:
+                    entries = {}
+                    if stamp is not None:
+                        with open(manifest_path(), encoding='utf-8') as f:
+                            entries = {
+                                (entry['ghazal_number'], entry['format']): entry
+                                for entry in json.load(f)
+                            }
+                    self._entries = entries
+                    self._stamp = stamp
+                    self._described = {}
+        return self._entries
+
+    def version(self):
+        stamp = self._manifest_stamp()
+        return 'none' if stamp is None else f'{stamp[0]:x}-{stamp[1]:x}'
+
+    def get(self, number, fmt='mp3', size=None):
+        """Manifest entry for a recording; ``size`` is the file's actual size, if known."""
+        key = (number, fmt)
+        entry = self.entries().get(key)
+        if entry is not None and (size is None or entry['size'] == size):
+            return entry
+        entry = self._described.get(key)
+        if entry is None or (size is not None and entry['size'] != size):
+            path = audio_path(number, fmt)
+            if not os.path.exists(path):
+                return None
+            entry = {'ghazal_number': number, 'format': fmt, **describe_file(path, fmt)}
+            self._described[key] = entry
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+            self._stamp = None
+            self._described = {}
+
+
+library = AudioLibrary()
+
+
+def etag(entry):
+    return f'"{entry["sha256"][:32]}"'
+
+
+def version_token(entry):
+    return entry['sha256'][:HASH_PREFIX]
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single ``bytes=`` range, or None to send everything.
+
+    Malformed and multi-range headers are ignored, as RFC 9110 allows.
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = size - 1 if last == '' else min(int(last), size - 1)
+    if last != '' and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+class FileRange:
+    """Read-only view of ``length`` bytes of ``file`` starting at ``start``.
+
+    ``fileno()`` and ``tell()`` are kept so gunicorn's ``sendfile()`` path
+    copies exactly the range (it stops at the response's Content-Length).
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
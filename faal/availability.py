@@ -0,0 +1,185 @@
+"""
+Username and email availability for the registration form.
+
+Matching is case-insensitive: ``Reader`` is taken when ``reader`` exists, and
+so is ``Reader@Example.com``. Lookups compare ``LOWER()`` of the column, which
+the expression indexes from migration ``0006`` answer without a scan.
+
+Each worker also keeps a Bloom filter of every case-folded username and email.
+A name the filter has never seen is certainly free, so the as-you-type
+``/api/auth/availability/`` check answers most requests without a query. Only
+filter hits (taken names and the ~1% false positives) go to the database.
+
+The filter never forgets a name, so it can only err towards a query. It does
+miss users registered by other workers since it was loaded, so every
+``FAAL_AVAILABILITY_REFRESH`` seconds it loads the users added since. A full
+reload every ``FAAL_AVAILABILITY_REBUILD`` seconds picks up renames. In this
+worker, new users are added straight away from ``faal.signals``.
+Registration does not trust the filter: ``taken()`` checks both fields in
+one indexed query.
+"""
+
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
+
+FIELDS = ('username', 'email')
+
+MESSAGES = {
+    'username': 'این نام کاربری قبلاً گرفته شده است',
+    'email': 'این ایمیل قبلاً استفاده شده است',
+}
+
+
+def fold(value):
+    return value.casefold()
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter of strings with about ``error_rate`` false positives at ``capacity``."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        positions = self._positions(key)
+        # |= is a read-modify-write; two unlocked adds to one byte could lose a bit.
+        with self._lock:
+            for position in positions:
+                self.bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _key(field, value):
+    return f'{field}:{fold(value)}'
+
+
+class AvailabilityFilter:
+    """This worker's Bloom filter of the usernames and emails in use."""
+
+    def __init__(self, error_rate=0.01):
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_pk = 0
+        self._loaded_at = 0.0
+        self._refreshed_at = 0.0
+
+    @staticmethod
+    def _add_rows(bloom, rows, last_pk=0):
+        for pk, username, email in rows:
+            bloom.add(_key('username', username))
+            if email:
+                bloom.add(_key('email', email))
+            last_pk = max(last_pk, pk)
+        return last_pk
+
+    def _rebuild(self, now):
+        # Room to grow, so new registrations do not push up the false-positive rate.
+        capacity = max(1024, 4 * User.objects.count())
+        bloom = BloomFilter(capacity, self.error_rate)
+        self._last_pk = self._add_rows(bloom, User.objects.values_list('pk', 'username', 'email').iterator())
+        self._filter = bloom
+        self._loaded_at = self._refreshed_at = now
+
+    def _catch_up(self, now):
+        rows = User.objects.filter(pk__gt=self._last_pk).order_by('pk').values_list('pk', 'username', 'email')
+        self._last_pk = self._add_rows(self._filter, rows, self._last_pk)
+        self._refreshed_at = now
+
+    def _needs_rebuild(self, now):
+        return (
+            self._filter is None
+            or self._filter.count > self._filter.capacity
+            or now - self._loaded_at >= getattr(settings, 'FAAL_AVAILABILITY_REBUILD', 3600)
+        )
+
+    def _needs_refresh(self, now):
+        return now - self._refreshed_at >= getattr(settings, 'FAAL_AVAILABILITY_REFRESH', 5)
+
+    def get(self):
+        now = time.monotonic()
+        # Read once: invalidate() may clear the attribute at any moment.
+        bloom = self._filter
+        if bloom is not None and not self._needs_rebuild(now) and not self._needs_refresh(now):
+            return bloom
+        with self._lock:
+            if self._needs_rebuild(now):
+                self._rebuild(now)
+            elif self._needs_refresh(now):
+                self._catch_up(now)
+            return self._filter
+
+    def might_be_taken(self, field, value):
+        return _key(field, value) in self.get()
+
+    def add(self, user):
+        bloom = self._filter
+        if bloom is not None:
+            bloom.add(_key('username', user.username))
+            if user.email:
+                bloom.add(_key('email', user.email))
+
+    def invalidate(self):
+        with self._lock:
+            self._filter = None
+
+
+availability_filter = AvailabilityFilter()
+
+
+def matching_users(username=None, email=None):
+    """Users whose username or email equals the given ones, ignoring case."""
+    conditions = Q()
+    if username:
+        conditions |= Q(username_folded=Lower(Value(username)))
+    if email:
+        conditions |= Q(email_folded=Lower(Value(email)))
+    if not conditions:
+        return User.objects.none()
+    return User.objects.alias(username_folded=Lower('username'), email_folded=Lower('email')).filter(conditions)
+
+
+def taken(username=None, email=None):
+    """The fields among ``username`` and ``email`` already in use, from a single query."""
+    found = set()
+    for row_username, row_email in matching_users(username, email).values_list('username', 'email'):
+        if username and fold(row_username) == fold(username):
+            found.add('username')
+        if email and row_email and fold(row_email) == fold(email):
+            found.add('email')
+    return found
+
+
+def check(values):
+    """``{field: {'available': bool, 'message': str or None}}`` for the given fields.
+
+    Only the fields the Bloom filter might have seen are looked up.
+    """
+    maybe = {field: value for field, value in values.items() if availability_filter.might_be_taken(field, value)}
+    in_use = taken(**maybe) if maybe else set()
+    return {
+        field: {'available': field not in in_use, 'message': MESSAGES[field] if field in in_use else None}
+        for field in values
+    }
@@ -0,0 +1,184 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks never touch ``db.sqlite3``: they run inside a scratch database
+created the same way the test runner creates its test database.
+"""
+
+import datetime
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+SAMPLE_PERSIAN_TEXT = (
+    'الا یا ایها الساقی ادر کاسا و ناولها\n'
+    'که عشق آسان نمود اول ولی افتاد مشکل ها\n'
+    'به بوی نافه ای کاخر صبا زان طره بگشاید\n'
+    'ز تاب جعد مشکینش چه خون افتاد در دل ها\n'
+    'مرا در منزل جانان چه امن عیش چون هر دم\n'
+    'جرس فریاد می‌دارد که بربندید محمل ها\n'
+    'به می سجاده رنگین کن گرت پیر مغان گوید\n'
+    'که سالک بی‌خبر نبود ز راه و رسم منزل ها\n'
+    'شب تاریک و بیم موج و گردابی چنین هایل\n'
+    'کجا دانند حال ما سبکباران ساحل ها\n'
+)
+SAMPLE_TRANSLATION = (
+    'O Saki, pass around and offer the bowl, for love seemed easy at first '
+    'but difficulties arose.'
+)
+
+# Every named route in faal/api_urls.py and faal/urls.py, as
+# (url name, url kwargs, method, data, signed in (True or 'staff'), queries once warm).
+# ``{n}`` in data is replaced with the attempt number, so repeated
+# registrations use fresh names. RouteQueryCountTests asserts the query
+# counts exactly; ``bench_views`` times each route.
+ROUTES = [
+    ('api_csrf', {}, 'get', None, False, 0),
+    ('api_daily_quote', {}, 'get', None, False, 0),
+    ('api_quotes', {}, 'get', None, False, 0),
+    ('api_ghazals', {}, 'get', None, False, 0),
+    ('api_search', {}, 'get', {'q': 'ساقی'}, False, 1),
+    ('api_beyts', {'ghazal_number': 1}, 'get', {'start': '2', 'end': '4'}, False, 1),
+    ('api_beyt', {'ghazal_number': 1, 'position': 2}, 'get', None, False, 1),
+    ('api_audio_manifest', {}, 'get', None, False, 0),
+    ('api_audio', {'ghazal_number': 1, 'fmt': 'mp3'}, 'get', None, False, 0),
+    ('api_register', {}, 'post', {'username': 'new{n}', 'email': 'new{n}@example.com',
+                                  'password': 'secret123', 'password2': 'secret123'}, False, 10),
+    ('api_availability', {}, 'get', {'username': 'free{n}', 'email': 'free{n}@example.com'}, False, 0),
+    ('api_login', {}, 'post', {'username': 'reader', 'password': 'secret123'}, False, 9),
+    ('api_logout', {}, 'post', None, True, 3),
+    ('api_current_user', {}, 'get', None, True, 1),
+    ('api_dashboard', {}, 'get', None, True, 2),
+    ('api_history', {}, 'get', None, True, 2),
+    ('api_history_export', {'fmt': 'csv'}, 'get', None, True, 2),
+    ('api_analytics', {}, 'get', None, 'staff', 3),
+    ('homepage', {}, 'get', None, False, 0),
+    ('dashboard', {}, 'get', None, True, 2),
+    ('ghazals_list', {}, 'get', None, False, 0),
+    ('quotes_list', {}, 'get', None, False, 0),
+    ('register', {}, 'get', None, False, 0),
+    ('metrics', {}, 'get', None, False, 0),
+]
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """Swap the default connection to a freshly migrated throwaway database file."""
+    scratch_dir = tempfile.mkdtemp(prefix='faal-bench-')
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    previous_test_name = test_settings.get('NAME')
+    test_settings['NAME'] = os.path.join(scratch_dir, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+    try:
+        yield test_settings['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        test_settings['NAME'] = previous_test_name
+        # Other threads' connections may leave -wal/-shm files behind.
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def seed_ghazals(count, batch_size=5000):
+    from .models import HafezGhazal
+
+    lines = SAMPLE_PERSIAN_TEXT.splitlines()
+
+    def persian_text(number):
+        # Rotate the lines so ghazals differ and searches do not match everything.
+        shift = number % len(lines)
+        return '\n'.join(lines[shift:] + lines[:shift] + [f'غزل {number}'])
+
+    HafezGhazal.objects.bulk_create(
+        (
+            HafezGhazal(
+                ghazal_number=number,
+                persian_text=persian_text(number),
+                english_translation=SAMPLE_TRANSLATION,
+            )
+            for number in range(1, count + 1)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def seed_quotes(count, batch_size=5000):
+    from .models import Quote
+
+    Quote.objects.bulk_create(
+        (Quote(text=SAMPLE_TRANSLATION, author='Hafez') for _ in range(count)),
+        batch_size=batch_size,
+    )
+
+
+def seed_users(count, password_hash, batch_size=5000):
+    from django.contrib.auth.models import User
+
+    User.objects.bulk_create(
+        (
+            User(username=f'user{number}', email=f'user{number}@example.com', password=password_hash)
+            for number in range(1, count + 1)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def seed_daily_faals(count, batch_size=5000):
+    """Spread ``count`` faals over every user, one per user per day, going back from today."""
+    from django.contrib.auth.models import User
+
+    from .models import HafezGhazal, UserDailyFaal
+
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    ghazal_ids = list(HafezGhazal.objects.values_list('pk', flat=True))
+    today = datetime.date.today()
+    rng = random.Random(0)
+
+    def rows():
+        for index in range(count):
+            day, position = divmod(index, len(user_ids))
+            yield UserDailyFaal(
+                user_id=user_ids[position],
+                ghazal_id=rng.choice(ghazal_ids),
+                date=today - datetime.timedelta(days=day + 1),
+            )
+
+    UserDailyFaal.objects.bulk_create(rows(), batch_size=batch_size)
+
+
+def measure(func, number=200, warmup=20, setup=None):
+    """Call ``func`` repeatedly and return per-call timings in microseconds.
+
+    ``setup`` runs untimed before every call.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    samples = []
+    for _ in range(number):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    samples.sort()
+    return {
+        'calls': number,
+        'mean_us': statistics.fmean(samples),
+        'p50_us': samples[len(samples) // 2],
+        'p99_us': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def format_row(label, result):
+    return '{:<40} mean {:>10.1f}us  p50 {:>10.1f}us  p99 {:>10.1f}us'.format(
+        label, result['mean_us'], result['p50_us'], result['p99_us']
+    )
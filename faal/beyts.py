@@ -0,0 +1,82 @@
+"""
+Verse-level (beyt) rows derived from ``HafezGhazal.persian_text``.
+
+Each line of a ghazal's text is one mesra (hemistich), and consecutive pairs
+of lines make a beyt. ``beyt_fields()`` splits a ghazal into ``Beyt`` rows
+holding:
+
+* the beyt's 1-based ``position`` in the ghazal and its two mesras,
+* ``tokens``: its words, folded by ``search.normalize()`` and space-separated,
+* ``token_offset``: how many words of the ghazal come before it, so a word
+  position in the whole ghazal maps to its beyt with one range lookup.
+
+A single verse, or a range of them, is then an indexed point query on
+``(ghazal, position)`` instead of re-splitting the full text per request.
+
+The ``HafezGhazal`` signals keep the rows current. ``rebuild()`` re-creates
+them after bulk loads that bypass signals.
+"""
+
+from django.db import transaction
+
+from .search import tokenize
+
+
+def beyt_fields(ghazal_id, text):
+    """Field values of the ``Beyt`` rows for one ghazal, in order."""
+    lines = [line.strip() for line in (text or '').splitlines()]
+    lines = [line for line in lines if line]
+    rows = []
+    token_offset = 0
+    for index in range(0, len(lines), 2):
+        first, second = lines[index], lines[index + 1] if index + 1 < len(lines) else ''
+        tokens = tokenize(first) + tokenize(second)
+        rows.append({
+            'ghazal_id': ghazal_id,
+            'position': index // 2 + 1,
+            'first_mesra': first,
+            'second_mesra': second,
+            'tokens': ' '.join(tokens),
+            'token_offset': token_offset,
+        })
+        token_offset += len(tokens)
+    return rows
+
+
+def index_ghazal(ghazal):
+    from .models import Beyt
+
+    with transaction.atomic():
+        Beyt.objects.filter(ghazal_id=ghazal.pk).delete()
+        Beyt.objects.bulk_create(Beyt(**fields) for fields in beyt_fields(ghazal.pk, ghazal.persian_text))
+
+
+def rebuild(batch_size=2000):
+    """Re-split every ghazal; use after loads that bypass model signals."""
+    from .models import Beyt, HafezGhazal
+
+    count = 0
+    rows = HafezGhazal.objects.order_by('pk').values_list('pk', 'persian_text')
+    with transaction.atomic():
+        Beyt.objects.all().delete()
+        batch = []
+        for pk, text in rows.iterator(chunk_size=batch_size):
+            batch.extend(Beyt(**fields) for fields in beyt_fields(pk, text))
+            if len(batch) >= batch_size:
+                Beyt.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            Beyt.objects.bulk_create(batch)
+            count += len(batch)
+    return count
+
+
+def get_beyts(ghazal_number, start=1, end=None):
+    """Beyts ``start``..``end`` (inclusive) of a ghazal, by ghazal number."""
+    from .models import Beyt
+
+    queryset = Beyt.objects.filter(ghazal__ghazal_number=ghazal_number, position__gte=start)
+    if end is not None:
+        queryset = queryset.filter(position__lte=end)
+    return queryset.select_related('ghazal').order_by('position')
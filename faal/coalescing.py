@@ -0,0 +1,45 @@
+"""
+Coalescing of concurrent identical calls within a worker.
+
+``SingleFlight.do(key, func)`` runs ``func`` once for every caller that
+arrives with ``key`` while a call is in flight. The first caller runs it and
+the others wait and share its result or exception. Nothing is cached: the
+next call after that one finishes runs ``func`` again.
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
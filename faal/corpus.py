@@ -0,0 +1,221 @@
+"""
+Process-local indexes over the Hafez corpus.
+
+Random selection used to ask SQLite for ``ORDER BY RANDOM()``, which scans and
+sorts the whole table on every call. Instead each worker keeps the primary keys
+of the corpus in memory, picks one in constant time and fetches a single row by
+primary key. The indexes are rebuilt whenever the corpus version moves, which
+happens from the model signals in ``faal.signals``.
+
+The version is the modification time of ``FAAL_CORPUS_VERSION_FILE``, so a
+change saved by one worker is seen by all of them on their next lookup.
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+
+def _now_version():
+    return time.time_ns() // 1_000_000
+
+
+def _version_path():
+    return str(settings.FAAL_CORPUS_VERSION_FILE)
+
+
+def corpus_version():
+    """Current corpus version, a millisecond timestamp of the last change."""
+    try:
+        return os.stat(_version_path()).st_mtime_ns // 1_000_000
+    except FileNotFoundError:
+        return bump_corpus_version()
+
+
+def bump_corpus_version():
+    """Mark the corpus as changed so every derived cache, in every worker, is rebuilt."""
+    path = _version_path()
+    try:
+        previous = os.stat(path).st_mtime_ns // 1_000_000
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        previous = 0
+    version = max(_now_version(), previous + 1)
+    with open(path, 'a'):
+        pass
+    os.utime(path, ns=(version * 1_000_000, version * 1_000_000))
+    return version
+
+
+class CorpusIndex:
+    """In-memory list of the primary keys of one corpus model."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+
+    @property
+    def model(self):
+        return apps.get_model('faal', self.model_name)
+
+    def load(self):
+        return tuple(self.model._default_manager.order_by('pk').values_list('pk', flat=True))
+
+    def get(self):
+        version = corpus_version()
+        if self._data is None or self._version != version:
+            with self._lock:
+                if self._data is None or self._version != version:
+                    self._data = self.load()
+                    self._version = version
+        return self._data
+
+    def ids(self):
+        return self.get()
+
+    async def aget(self):
+        """``get()`` for async code; only a stale index goes to a thread to reload."""
+        if self._data is None or self._version != corpus_version():
+            return await sync_to_async(self.get)()
+        return self._data
+
+    async def aids(self):
+        return await self.aget()
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+            self._version = None
+
+    def random_id(self):
+        ids = self.ids()
+        if not ids:
+            return None
+        return random.choice(ids)
+
+    def random_object(self):
+        # A row deleted by another worker may still be in our index; reload
+        # once and try again before giving up.
+        for attempt in range(2):
+            pk = self.random_id()
+            if pk is None:
+                return None
+            obj = self.model._default_manager.filter(pk=pk).first()
+            if obj is not None:
+                return obj
+            self.invalidate()
+        return None
+
+    async def arandom_object(self):
+        for attempt in range(2):
+            ids = await self.aids()
+            if not ids:
+                return None
+            obj = await self.model._default_manager.filter(pk=random.choice(ids)).afirst()
+            if obj is not None:
+                return obj
+            self.invalidate()
+        return None
+
+
+GhazalPool = namedtuple('GhazalPool', ['numbers', 'ids', 'version'])
+
+
+class GhazalPoolIndex(CorpusIndex):
+    """Ghazal numbers in ascending order, used for deterministic assignment.
+
+    The pool is keyed by ``ghazal_number`` rather than by primary key or row
+    order, and its version is a digest of the numbers themselves, so it only
+    changes when ghazals are added or removed.
+    """
+
+    def load(self):
+        rows = tuple(
+            self.model._default_manager.order_by('ghazal_number').values_list('ghazal_number', 'pk')
+        )
+        numbers = tuple(number for number, _ in rows)
+        digest = hashlib.blake2b(','.join(map(str, numbers)).encode(), digest_size=8)
+        return GhazalPool(numbers, tuple(pk for _, pk in rows), digest.hexdigest())
+
+    def ids(self):
+        return self.get().ids
+
+    async def aids(self):
+        return (await self.aget()).ids
+
+
+class QuotePoolIndex(CorpusIndex):
+    """Quotes eligible for the daily rotation: the curated ones if any are flagged."""
+
+    def load(self):
+        quotes = self.model._default_manager.order_by('pk')
+        curated = tuple(quotes.filter(is_daily_quote=True).values_list('pk', flat=True))
+        return curated or tuple(quotes.values_list('pk', flat=True))
+
+
+def rotation_order(pool):
+    """``pool`` in a fixed pseudo-random order that only depends on its contents."""
+    seed = hashlib.blake2b(','.join(map(str, pool)).encode(), digest_size=8).digest()
+    order = list(pool)
+    random.Random(seed).shuffle(order)
+    return order
+
+
+class DailyQuote:
+    """The quote of the day, picked once per local date and held in memory until midnight."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        # ((date, corpus version), quote), swapped as one tuple.
+        self._current = (None, None)
+
+    def pick(self, date, pool):
+        # Walking one fixed order cyclically, a day's quote only comes back
+        # after every other quote in the pool has been shown.
+        if not pool:
+            return None
+        order = rotation_order(pool)
+        return order[date.toordinal() % len(order)]
+
+    def get(self, date=None):
+        key = (date or timezone.localdate(), corpus_version())
+        current_key, quote = self._current
+        if current_key != key:
+            with self._lock:
+                current_key, quote = self._current
+                if current_key != key:
+                    pk = self.pick(key[0], self.pool.get())
+                    quote = None
+                    if pk is not None:
+                        quote = self.pool.model._default_manager.filter(pk=pk).first()
+                    self._current = (key, quote)
+        return quote
+
+    async def aget(self, date=None):
+        key = (date or timezone.localdate(), corpus_version())
+        current_key, quote = self._current
+        if current_key != key:
+            return await sync_to_async(self.get)(date)
+        return quote
+
+    def invalidate(self):
+        with self._lock:
+            self._current = (None, None)
+
+
+ghazal_index = CorpusIndex('HafezGhazal')
+quote_index = CorpusIndex('Quote')
+ghazal_pool = GhazalPoolIndex('HafezGhazal')
+quote_pool = QuotePoolIndex('Quote')
+daily_quote = DailyQuote(quote_pool)
@@ -0,0 +1,69 @@
+"""
+Streaming readers and writers for corpus import/export.
+
+Records are read and written one at a time, so loading or dumping the corpus
+never holds more than one batch in memory.
+"""
+
+import csv
+import json
+import os
+
+FORMATS = ('jsonl', 'csv')
+
+CORPUS_FIELDS = {
+    'ghazals': ('ghazal_number', 'persian_text', 'english_translation'),
+    'quotes': ('id', 'text', 'author', 'is_daily_quote'),
+}
+
+
+def guess_format(path, explicit=None):
+    if explicit:
+        return explicit
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson', 'json'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_records(stream, fmt):
+    """Yield ``(line_number, dict)`` for each record in ``stream``."""
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f'line {line_number}: invalid JSON ({e})')
+            if not isinstance(record, dict):
+                raise ValueError(f'line {line_number}: expected a JSON object')
+            yield line_number, record
+    else:
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 't')
+
+
+class RecordWriter:
+    def __init__(self, stream, fmt, fields):
+        self.stream = stream
+        self.fmt = fmt
+        self.fields = fields
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(stream, fieldnames=fields)
+            self._csv.writeheader()
+
+    def write(self, record):
+        if self.fmt == 'jsonl':
+            self.stream.write(json.dumps(record, ensure_ascii=False))
+            self.stream.write('\n')
+        else:
+            self._csv.writerow(record)
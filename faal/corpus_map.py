@@ -0,0 +1,294 @@
+"""
+A compact, memory-mapped copy of the corpus shared by every worker.
+
+Each worker used to hold its own Python objects for the same ghazals and
+quotes: ORM rows, serialized list pages and rendered payloads, so memory grew
+with the worker count. ``build()`` writes the corpus to ``FAAL_CORPUS_MAP``
+once, and every worker maps the file read-only. The pages live in the OS page
+cache, so all workers share one copy.
+
+Layout (little-endian)::
+
+    header    magic, counts and the offset of each section
+    ghazals   fixed-width records ordered by ghazal_number:
+              id, ghazal_number, then (offset, length) of persian_text,
+              english_translation and the rendered JSON payload
+    ghazal ids  (id, record index) ordered by id
+    quotes    fixed-width records ordered by id:
+              id, is_daily_quote, then (offset, length) of text, author and
+              the rendered JSON payload
+    text      the UTF-8 strings and JSON payloads the records point into
+
+The payloads are exactly what ``HafezGhazalSerializer``/``QuoteSerializer``
+render, so responses spliced from them match the ORM path byte for byte.
+
+Like ``faal.replica``, a corpus change unlinks the file at once and rebuilds
+it in the background, and does both again once the change commits. The new
+file is written next to the old one and swapped in by ``replica.swap_in()``,
+which throws it away if another worker changed the corpus during the build.
+Each worker checks the inode at the start of every request and remaps when it
+has changed. A worker still reading the old mapping keeps it until its last
+reference goes.
+"""
+
+import atexit
+import bisect
+import mmap
+import os
+import random
+import struct
+import threading
+from collections import namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from .corpus import corpus_version
+from .replica import SnapshotBuilder, remove, swap_in
+
+MAGIC = b'FAALMAP1'
+HEADER = struct.Struct('<8sIIQQQQ')
+GHAZAL = struct.Struct('<qi' + 'QI' * 3)
+GHAZAL_ID = struct.Struct('<qI')
+QUOTE = struct.Struct('<qB' + 'QI' * 3)
+
+GhazalRow = namedtuple('GhazalRow', ['id', 'ghazal_number', 'persian_text', 'english_translation'])
+QuoteRow = namedtuple('QuoteRow', ['id', 'is_daily_quote', 'text', 'author'])
+
+
+def map_path():
+    return getattr(settings, 'FAAL_CORPUS_MAP', None)
+
+
+def enabled():
+    """Whether ``default`` is the database the map is built from; never true for test databases."""
+    return bool(map_path()) and str(connections.databases['default']['NAME']) == str(
+        getattr(settings, 'FAAL_CORPUS_SNAPSHOT_SOURCE', '')
+    )
+
+
+class _Writer:
+    def __init__(self):
+        self.text = bytearray()
+
+    def add(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        offset = len(self.text)
+        self.text += data
+        return offset, len(data)
+
+
+def build(path=None):
+    """Write the corpus from ``default`` to a new map file and swap it in.
+
+    Returns the map's path, or ``None`` when the corpus changed during the
+    build and the file was thrown away.
+    """
+    from rest_framework.renderers import JSONRenderer
+
+    from .models import HafezGhazal, Quote
+    from .serializers import HafezGhazalSerializer, QuoteSerializer
+
+    path = str(path or map_path())
+    version = corpus_version()
+    renderer = JSONRenderer()
+    writer = _Writer()
+    ghazal_records, quote_records = [], []
+    with transaction.atomic(using='default'):
+        for ghazal in HafezGhazal.objects.using('default').order_by('ghazal_number').iterator():
+            ghazal_records.append((
+                ghazal.pk,
+                ghazal.ghazal_number,
+                *writer.add(ghazal.persian_text),
+                *writer.add(ghazal.english_translation),
+                *writer.add(renderer.render(HafezGhazalSerializer(ghazal).data)),
+            ))
+        for quote in Quote.objects.using('default').order_by('id').iterator():
+            quote_records.append((
+                quote.pk,
+                quote.is_daily_quote,
+                *writer.add(quote.text),
+                *writer.add(quote.author),
+                *writer.add(renderer.render(QuoteSerializer(quote).data)),
+            ))
+    ghazal_ids = sorted((record[0], index) for index, record in enumerate(ghazal_records))
+
+    ghazals_offset = HEADER.size
+    ids_offset = ghazals_offset + GHAZAL.size * len(ghazal_records)
+    quotes_offset = ids_offset + GHAZAL_ID.size * len(ghazal_ids)
+    text_offset = quotes_offset + QUOTE.size * len(quote_records)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(
+                MAGIC, len(ghazal_records), len(quote_records), ghazals_offset, ids_offset, quotes_offset, text_offset
+            ))
+            f.writelines(GHAZAL.pack(*record) for record in ghazal_records)
+            f.writelines(GHAZAL_ID.pack(*record) for record in ghazal_ids)
+            f.writelines(QUOTE.pack(*record) for record in quote_records)
+            f.write(writer.text)
+        return swap_in(tmp_path, path, version)
+    except BaseException:
+        remove(tmp_path)
+        raise
+
+
+class _Keys:
+    """The sort key of each record in a table, as a sequence ``bisect`` can search."""
+
+    def __init__(self, buffer, offset, count, record, field):
+        self.buffer, self.offset, self.count, self.record = buffer, offset, count, record
+        self.key = struct.Struct('<' + record.format[1:][field])
+        self.key_offset = struct.calcsize('<' + record.format[1:field + 1])
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.key.unpack_from(self.buffer, self.offset + index * self.record.size + self.key_offset)[0]
+
+
+class MappedCorpus:
+    """Read-only accessors over one map file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.ghazal_count, self.quote_count, self._ghazals, self._ids, self._quotes, self._text = (
+            HEADER.unpack_from(self.buffer)
+        )
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a corpus map')
+        self._ghazal_numbers = _Keys(self.buffer, self._ghazals, self.ghazal_count, GHAZAL, 1)
+        self._ghazal_ids = _Keys(self.buffer, self._ids, self.ghazal_count, GHAZAL_ID, 0)
+        self._quote_ids = _Keys(self.buffer, self._quotes, self.quote_count, QUOTE, 0)
+
+    def _bytes(self, offset, length):
+        start = self._text + offset
+        return self.buffer[start:start + length]
+
+    def _str(self, offset, length):
+        return self._bytes(offset, length).decode()
+
+    def _ghazal_record(self, index):
+        return GHAZAL.unpack_from(self.buffer, self._ghazals + index * GHAZAL.size)
+
+    def _quote_record(self, index):
+        return QUOTE.unpack_from(self.buffer, self._quotes + index * QUOTE.size)
+
+    def _ghazal_index(self, ghazal_id):
+        position = bisect.bisect_left(self._ghazal_ids, ghazal_id)
+        if position == self.ghazal_count or self._ghazal_ids[position] != ghazal_id:
+            return None
+        return GHAZAL_ID.unpack_from(self.buffer, self._ids + position * GHAZAL_ID.size)[1]
+
+    def ghazal_at(self, index):
+        pk, number, *spans = self._ghazal_record(index)
+        return GhazalRow(pk, number, self._str(*spans[0:2]), self._str(*spans[2:4]))
+
+    def ghazal(self, ghazal_id):
+        index = self._ghazal_index(ghazal_id)
+        return None if index is None else self.ghazal_at(index)
+
+    def ghazal_by_number(self, number):
+        index = bisect.bisect_left(self._ghazal_numbers, number)
+        if index == self.ghazal_count or self._ghazal_numbers[index] != number:
+            return None
+        return self.ghazal_at(index)
+
+    def ghazal_payload(self, ghazal_id):
+        """The ghazal's ``HafezGhazalSerializer`` JSON, or ``None``."""
+        index = self._ghazal_index(ghazal_id)
+        if index is None:
+            return None
+        return self._bytes(*self._ghazal_record(index)[6:8])
+
+    def random_ghazal(self):
+        return self.ghazal_at(random.randrange(self.ghazal_count)) if self.ghazal_count else None
+
+    def quote_at(self, index):
+        pk, is_daily, *spans = self._quote_record(index)
+        return QuoteRow(pk, bool(is_daily), self._str(*spans[0:2]), self._str(*spans[2:4]))
+
+    def page(self, name, after=None, page_size=None):
+        """``(payloads, next_key)`` for a listing page, ordered like ``faal.listing``."""
+        if name == 'ghazals':
+            keys, record, count = self._ghazal_numbers, self._ghazal_record, self.ghazal_count
+        else:
+            keys, record, count = self._quote_ids, self._quote_record, self.quote_count
+        start = 0 if after is None else bisect.bisect_right(keys, after)
+        stop = count if page_size is None else min(count, start + page_size)
+        payloads = [self._bytes(*record(index)[-2:]) for index in range(start, stop)]
+        return payloads, keys[stop - 1] if stop < count else None
+
+
+class CorpusMap:
+    """The current ``MappedCorpus`` of this process, remapped when the file is replaced."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mapped = None
+        self._inode = None
+
+    def refresh(self):
+        try:
+            inode = os.stat(map_path()).st_ino
+        except OSError:
+            inode = None
+        if inode != self._inode:
+            with self._lock:
+                try:
+                    self._mapped = MappedCorpus(map_path()) if inode is not None else None
+                except (OSError, ValueError):
+                    self._mapped = None
+                self._inode = inode
+        return self._mapped
+
+    def get(self):
+        """The mapped corpus, or ``None`` when callers should read the database."""
+        if not enabled():
+            return None
+        if self._inode is None:
+            return self.refresh()
+        return self._mapped
+
+    def invalidate(self):
+        # Like faal.replica.invalidate(): rebuilt now, and again after a commit.
+        if not enabled():
+            return
+        builder.invalidate()
+        with self._lock:
+            self._mapped = None
+            self._inode = None
+        transaction.on_commit(builder.invalidate)
+
+
+corpus_map = CorpusMap()
+builder = SnapshotBuilder(
+    build, lambda: remove(map_path()), delay=getattr(settings, 'FAAL_CORPUS_SNAPSHOT_DELAY', 1.0)
+)
+atexit.register(lambda: enabled() and builder.flush())
+
+
+@receiver(request_started)
+def refresh_corpus_map(sender, **kwargs):
+    if enabled():
+        corpus_map.refresh()
+
+
+@receiver(post_migrate)
+def rebuild_after_migrate(sender, using='default', **kwargs):
+    if sender.name == 'faal' and using == 'default' and enabled():
+        build()
+
+
+def ghazal_instance(ghazal):
+    """A ``HafezGhazal`` for a ``GhazalRow``, as if loaded from ``default``."""
+    return apps.get_model('faal', 'HafezGhazal').from_db('default', GhazalRow._fields, ghazal)
@@ -0,0 +1,84 @@
+"""
+SQLite connection tuning and lock-contention handling.
+
+Every new SQLite connection gets the pragmas from ``settings.SQLITE_PRAGMAS``
+(WAL journal, relaxed fsync, larger page cache and mmap). ``retry_on_locked``
+retries short write operations that hit "database is locked" with jittered
+exponential backoff, for the cases the busy timeout alone does not cover.
+"""
+
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection as default_connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+def sqlite_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(sqlite_pragmas())
+    journal_mode = pragmas.pop('journal_mode', None)
+    if 'mode=ro' in str(connection.settings_dict['NAME']):
+        # Read-only snapshots (faal.replica) only take the read-side pragmas.
+        journal_mode = None
+        pragmas.pop('synchronous', None)
+    with connection.cursor() as cursor:
+        # busy_timeout goes first so the remaining pragmas already wait on locks.
+        if 'busy_timeout' in pragmas:
+            cursor.execute(f'PRAGMA busy_timeout = {pragmas.pop("busy_timeout")}')
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        if journal_mode:
+            # WAL is persistent in the database file. Switching needs an
+            # exclusive lock, so only ask when the mode actually differs.
+            cursor.execute('PRAGMA journal_mode')
+            if cursor.fetchone()[0].lower() != str(journal_mode).lower():
+                cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+
+
+def is_locked_error(error):
+    message = str(error).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def retry_on_locked(func=None, attempts=5, base_delay=0.05, max_delay=1.0):
+    """Retry ``func`` when SQLite reports lock contention.
+
+    Retrying is skipped inside ``atomic()`` blocks: the surrounding transaction
+    is already broken and only its owner can restart it.
+    """
+    if func is None:
+        return functools.partial(
+            retry_on_locked, attempts=attempts, base_delay=base_delay, max_delay=max_delay
+        )
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(1, attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if (
+                    not is_locked_error(e)
+                    or attempt == attempts
+                    or default_connection.in_atomic_block
+                ):
+                    raise
+                delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.5)
+                logger.warning('SQLite locked, retrying %s in %.3fs (attempt %d)', func.__name__, delay, attempt)
+                time.sleep(delay)
+
+    return wrapper
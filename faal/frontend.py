@@ -0,0 +1,72 @@
+"""
+The built React front end, served by the Django process itself under ``/app/``.
+
+``manage.py build_static`` writes the bundle to ``FAAL_FRONTEND_BUILD`` with
+``.gz``/``.br`` variants next to each file. ``FrontendMiddleware``, WhiteNoise
+with the build added under ``/app/``, serves its files. The bundle is built
+with ``"homepage": "/app"``, so its asset URLs carry the prefix. Hashed
+filenames, like the bundle's ``static/js/main.1a2b3c4d.js`` or
+``collectstatic``'s ``admin/css/base.5af66c1b1797.css``, are sent with a
+far-future immutable ``Cache-Control``.
+
+``spa`` answers ``/app/`` and the client-side routes (``/app/dashboard``,
+``/app/ghazal/12``, ...) with ``index.html``. Browsers revalidate it on every
+visit, so a new deploy's bundle is picked up straight away. The site root and
+Django's own pages are left to Django.
+"""
+
+import hashlib
+import os
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_safe
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+URL_PREFIX = 'app/'
+
+_index = {}
+
+
+def index_path():
+    return os.path.join(settings.FAAL_FRONTEND_BUILD, 'index.html')
+
+
+def available():
+    return os.path.isfile(index_path())
+
+
+class FrontendMiddleware(WhiteNoiseMiddleware):
+    """``WhiteNoiseMiddleware`` that also serves the React build under ``/app/``."""
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        build = str(settings.FAAL_FRONTEND_BUILD)
+        if os.path.isdir(build):
+            self.add_files(build, prefix=URL_PREFIX)
+
+
+def read_index():
+    """``(content, etag)`` of the built ``index.html``, reloaded when the file changes."""
+    path = index_path()
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None, None
+    if _index.get('key') != key:
+        with open(path, 'rb') as f:
+            content = f.read()
+        _index.update(key=key, content=content, etag=f'"{hashlib.md5(content).hexdigest()}"')
+    return _index['content'], _index['etag']
+
+
+@require_safe
+@condition(etag_func=lambda request, *args, **kwargs: read_index()[1])
+def spa(request, *args, **kwargs):
+    content, _ = read_index()
+    if content is None:
+        raise Http404('The front end has not been built.')
+    response = HttpResponse(content, content_type='text/html; charset=utf-8')
+    patch_cache_control(response, no_cache=True)
+    return response
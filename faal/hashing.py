@@ -0,0 +1,123 @@
+"""
+Bounded worker pool for password hashing.
+
+Password hashers are deliberately slow. Running them inline lets a burst of
+logins or registrations occupy every request thread at once, starving the
+rest of the API. The ``Pooled*PasswordHasher`` classes listed in
+``PASSWORD_HASHERS`` hand each hash to a small pool instead: at most
+``FAAL_HASHING_WORKERS`` hashes run at a time, up to ``FAAL_HASHING_QUEUE``
+more may wait, and anything beyond that is rejected with
+``HashingPoolSaturated`` so the request can be answered 429 straight away.
+The API views answer it themselves; ``HashingPoolMiddleware`` does so for
+the login page, the registration form and the admin.
+``FAAL_HASHING_WORKERS = 0`` keeps the limit but hashes on the calling thread.
+
+Only the hash itself leaves the request thread. ``authenticate()`` and user
+creation still run there, on the request's connection and in its transaction.
+
+The stdlib PBKDF2 and scrypt implementations, as well as argon2-cffi, release
+the GIL while hashing, so the pool threads hash in parallel.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+
+class HashingPoolSaturated(Exception):
+    pass
+
+
+class HashingPool:
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='faal-hashing'
+                    )
+        return self._executor
+
+    def run(self, func, *args, **kwargs):
+        """Run ``func`` on the pool and wait for it, or raise ``HashingPoolSaturated``."""
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated()
+        if not self.workers:
+            # Inline mode (FAAL_HASHING_WORKERS = 0): same backpressure, no threads.
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._slots.release()
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def _configured_workers():
+    workers = getattr(settings, 'FAAL_HASHING_WORKERS', None)
+    if workers is None:
+        return os.cpu_count() or 2
+    return workers
+
+
+hashing_pool = HashingPool(
+    workers=_configured_workers(),
+    queue_size=getattr(settings, 'FAAL_HASHING_QUEUE', 16),
+)
+
+
+class PooledHasherMixin:
+    """Run a password hasher's ``encode()`` and ``verify()`` on ``hashing_pool``."""
+
+    def encode(self, password, salt, *args, **kwargs):
+        return hashing_pool.run(super().encode, password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return hashing_pool.run(super().verify, password, encoded)
+
+
+class PooledPBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class PooledScryptPasswordHasher(PooledHasherMixin, hashers.ScryptPasswordHasher):
+    pass
+
+
+class PooledArgon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    pass
+
+
+class HashingPoolMiddleware(MiddlewareMixin):
+    """Answer 429 instead of 500 when a view's hash was rejected by a full pool."""
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingPoolSaturated):
+            return None
+        response = HttpResponse(
+            'Too many login attempts right now, please retry shortly', status=429, content_type='text/plain'
+        )
+        response['Retry-After'] = '1'
+        return response
@@ -0,0 +1,201 @@
+"""
+Cached, keyset-paginated pages of the corpus.
+
+Pages are generated once per corpus version and kept in the default cache, so
+``/api/ghazals/``, ``/api/quotes/`` and the server-rendered list pages share
+the same rows. API responses carry an ETag and Last-Modified derived from the
+corpus version, which lets a revalidating client get a 304 without any query.
+
+When the shared corpus map (``faal.corpus_map``) is mapped, list responses
+and page rows come from it instead, and workers keep no copy of their own.
+"""
+
+import base64
+import hashlib
+import json
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.views.decorators.http import condition
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+from .corpus import corpus_version
+from .corpus_map import corpus_map
+from .models import HafezGhazal, Quote
+from .payloads import SLOT, splice
+from .serializers import HafezGhazalSerializer, QuoteSerializer
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+Listing = namedtuple('Listing', ['model', 'serializer_class', 'key'])
+
+LISTINGS = {
+    'ghazals': Listing(HafezGhazal, HafezGhazalSerializer, 'ghazal_number'),
+    'quotes': Listing(Quote, QuoteSerializer, 'id'),
+}
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(str(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (TypeError, ValueError, UnicodeError):
+        raise NotFound('Invalid cursor')
+
+
+def parse_fields(name, raw):
+    if not raw:
+        return None
+    allowed = LISTINGS[name].serializer_class().fields
+    fields = tuple(field for field in (part.strip() for part in raw.split(',')) if field)
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise ValidationError({'fields': f'Unknown fields: {", ".join(unknown) or raw}'})
+    return fields
+
+
+def _page_cache_key(name, after, page_size, fields):
+    return f'faal:page:{name}:{corpus_version()}:{after}:{page_size}:{",".join(fields or ())}'
+
+
+def _page_queryset(name, after, page_size):
+    listing = LISTINGS[name]
+    queryset = listing.model.objects.order_by(listing.key)
+    if after is not None:
+        queryset = queryset.filter(**{f'{listing.key}__gt': after})
+    if page_size is not None:
+        queryset = queryset[:page_size + 1]
+    return queryset
+
+
+def _store_page(cache_key, name, rows, page_size, fields):
+    listing = LISTINGS[name]
+    next_position = None
+    if page_size is not None and len(rows) > page_size:
+        rows = rows[:page_size]
+        next_position = getattr(rows[-1], listing.key)
+
+    results = listing.serializer_class(rows, many=True).data
+    if fields:
+        results = [{field: row[field] for field in fields} for row in results]
+    else:
+        results = [dict(row) for row in results]
+    page = {'results': results, 'next': next_position}
+    cache.set(cache_key, page, None)
+    return page
+
+
+def get_page(name, after=None, page_size=None, fields=None):
+    """Return ``{'results': [...], 'next': position}`` for one page of a listing.
+
+    ``page_size=None`` returns every row after ``after``.
+    """
+    cache_key = _page_cache_key(name, after, page_size, fields)
+    page = cache.get(cache_key)
+    if page is None:
+        rows = list(_page_queryset(name, after, page_size))
+        page = _store_page(cache_key, name, rows, page_size, fields)
+    return page
+
+
+async def aget_page(name, after=None, page_size=None, fields=None):
+    """``get_page()`` for async views, loading a missing page with the async ORM."""
+    cache_key = _page_cache_key(name, after, page_size, fields)
+    page = cache.get(cache_key)
+    if page is None:
+        rows = [row async for row in _page_queryset(name, after, page_size)]
+        page = _store_page(cache_key, name, rows, page_size, fields)
+    return page
+
+
+def corpus_rows(name):
+    """Every row of a listing, as plain dicts, for the server-rendered pages."""
+    mapped = corpus_map.get()
+    if mapped is not None:
+        return [json.loads(payload) for payload in mapped.page(name)[0]]
+    return get_page(name)['results']
+
+
+def _list_arguments(name, params):
+    """``(paginate, after, page_size, fields)`` from a list request's query string."""
+    fields = parse_fields(name, params.get('fields'))
+    paginate = 'cursor' in params or 'page_size' in params
+    if not paginate:
+        return False, None, None, fields
+
+    after = decode_cursor(params['cursor']) if params.get('cursor') else None
+    try:
+        page_size = int(params.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValidationError({'page_size': 'A valid integer is required.'})
+    return True, after, max(1, min(page_size, MAX_PAGE_SIZE)), fields
+
+
+def _cursor_page(request, page):
+    url = request.build_absolute_uri()
+    next_url = None
+    if page['next'] is not None:
+        next_url = replace_query_param(url, 'cursor', encode_cursor(page['next']))
+    return {'next': next_url, 'results': page['results']}
+
+
+def list_response_data(name, request):
+    """Response data for a list endpoint.
+
+    Without ``cursor`` or ``page_size`` the endpoint keeps returning a plain
+    list, as the React client expects; with either it returns a cursor page.
+    """
+    paginate, after, page_size, fields = _list_arguments(name, request.query_params)
+    if not paginate:
+        return get_page(name, fields=fields)['results']
+    return _cursor_page(request, get_page(name, after, page_size, fields))
+
+
+def list_response_body(name, request):
+    """The list response as JSON spliced from the corpus map, or ``None`` to use ``list_response_data()``."""
+    mapped = corpus_map.get()
+    if mapped is None:
+        return None
+    paginate, after, page_size, fields = _list_arguments(name, request.GET)
+    if fields:
+        return None
+    payloads, next_position = mapped.page(name, after, page_size)
+    results = b'[' + b','.join(payloads) + b']'
+    if not paginate:
+        return results
+    return splice(_cursor_page(request, {'next': next_position, 'results': SLOT}), results)
+
+
+async def alist_response_data(name, request):
+    """``list_response_data()`` for async views, which get a plain ``HttpRequest``."""
+    paginate, after, page_size, fields = _list_arguments(name, request.GET)
+    if not paginate:
+        return (await aget_page(name, fields=fields))['results']
+    return _cursor_page(request, await aget_page(name, after, page_size, fields))
+
+
+def corpus_etag(name):
+    def etag(request, *args, **kwargs):
+        query = '&'.join(sorted(f'{key}={value}' for key, value in request.GET.items()))
+        digest = hashlib.blake2b(query.encode(), digest_size=6).hexdigest()
+        return f'{name}-{corpus_version()}-{digest}'
+    return etag
+
+
+def corpus_last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(corpus_version() / 1000, tz=dt_timezone.utc)
+
+
+def corpus_conditional(name):
+    """``condition`` decorator answering 304s for a listing from the corpus version alone.
+
+    For the JSON endpoints only: the HTML pages also render the visitor's
+    sign-in state, which the ETag does not cover.
+    """
+    return condition(etag_func=corpus_etag(name), last_modified_func=corpus_last_modified)
@@ -0,0 +1,144 @@
+import ctypes
+import ctypes.util
+import gc
+import logging
+import multiprocessing
+import os
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from faal import corpus_map
+from faal.benchmarks import scratch_database, seed_ghazals, seed_quotes
+from faal.listing import corpus_rows
+from faal.models import HafezGhazal
+from faal.payloads import ghazal_payloads
+from faal.signals import corpus_changed
+
+MEMORY_FIELDS = ('Rss', 'Pss', 'Anonymous')
+
+try:
+    malloc_trim = ctypes.CDLL(ctypes.util.find_library('c')).malloc_trim
+except (AttributeError, OSError, TypeError):
+    malloc_trim = None
+
+
+def memory():
+    """This process's memory in MiB: RSS, PSS (shared pages split between their users) and heap.
+
+    The heap (anonymous memory) is what a worker holds for itself; the map's
+    pages are file-backed and live once in the page cache.
+
+    Freed heap is handed back to the OS first, so the numbers are what the
+    worker keeps, not the high-water mark of the largest response it built.
+    """
+    gc.collect()
+    if malloc_trim is not None:
+        malloc_trim(0)
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in MEMORY_FIELDS:
+                values[name] = int(rest.split()[0]) / 1024
+    return values['Rss'], values['Pss'], values['Anonymous']
+
+
+def read_corpus(client):
+    """Every corpus read a long-lived worker ends up serving, so its caches are full."""
+    for name in ('api_ghazals', 'api_quotes'):
+        url = reverse(name)
+        client.get(url)
+        url = f'{url}?page_size=50'
+        while url:
+            url = client.get(url).json()['next']
+    for pk in HafezGhazal.objects.values_list('pk', flat=True):
+        ghazal_payloads.get(pk)
+    corpus_rows('ghazals')
+    corpus_rows('quotes')
+
+
+def run_worker(barrier, results):
+    before = memory()
+    client = Client()
+    # Twice: the second pass is served from whatever the first one cached.
+    read_corpus(client)
+    read_corpus(client)
+    # Measure once every worker is warm, and stay alive until all have, so shared pages count as shared.
+    barrier.wait()
+    results.put((before, memory()))
+    barrier.wait()
+
+
+class Command(BaseCommand):
+    help = (
+        'Per-worker memory of forked workers that have served every corpus read, '
+        'first with per-worker ORM caches and then with the shared corpus map (faal.corpus_map).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ghazals', type=int, default=5000)
+        parser.add_argument('--quotes', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        if not os.path.exists('/proc/self/smaps_rollup'):
+            self.stderr.write('Needs /proc/self/smaps_rollup (Linux 4.14+).')
+            return
+        with scratch_database() as database_name, override_settings(FAAL_THROTTLE_RATES={}):
+            seed_ghazals(options['ghazals'])
+            seed_quotes(options['quotes'])
+            path = os.path.join(os.path.dirname(database_name), 'corpus.map')
+            with override_settings(
+                FAAL_CORPUS_SNAPSHOT=None, FAAL_CORPUS_MAP=path, FAAL_CORPUS_SNAPSHOT_SOURCE=database_name
+            ):
+                corpus_map.build()
+                self.stdout.write(
+                    f'{options["ghazals"]} ghazals, {options["quotes"]} quotes, {options["workers"]} workers; '
+                    f'map {os.path.getsize(path) / 2 ** 20:.1f} MiB'
+                )
+                self.stdout.write(
+                    f'{"corpus reads from":<18} {"RSS start":>10} {"RSS warm":>9} {"PSS warm":>9} '
+                    f'{"heap grew":>10} {"all workers PSS":>16}'
+                )
+                logging.disable(logging.CRITICAL)
+                try:
+                    for label, mapped in (('per-worker caches', False), ('corpus map', True)):
+                        with override_settings(FAAL_CORPUS_MAP=path if mapped else None):
+                            self.run(label, options['workers'])
+                finally:
+                    logging.disable(logging.NOTSET)
+
+    def run(self, label, count):
+        cache.clear()
+        corpus_changed(sender=HafezGhazal)
+        for connection in connections.all():
+            connection.close()
+        # Keep the children's collections off the parent's objects, which would copy their pages.
+        gc.collect()
+        gc.freeze()
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(count)
+        results = context.Queue()
+        workers = [context.Process(target=run_worker, args=(barrier, results)) for _ in range(count)]
+        for worker in workers:
+            worker.start()
+        measured = [results.get(timeout=600) for _ in workers]
+        for worker in workers:
+            worker.join()
+        gc.unfreeze()
+
+        def mean(values):
+            return sum(values) / len(values)
+
+        rss_start = mean([before[0] for before, _ in measured])
+        rss, pss = (mean([after[field] for _, after in measured]) for field in range(2))
+        growth = mean([after[2] - before[2] for before, after in measured])
+        self.stdout.write(
+            f'{label:<18} {rss_start:8.1f}MB {rss:7.1f}MB {pss:7.1f}MB {growth:+8.1f}MB '
+            f'{sum(after[1] for _, after in measured):14.1f}MB'
+        )
@@ -0,0 +1,66 @@
+import datetime
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import setup_test_environment
+from rest_framework.renderers import JSONRenderer
+
+from faal.assignment import get_daily_faal
+from faal.benchmarks import format_row, measure, scratch_database, seed_ghazals
+from faal.models import HafezGhazal, UserDailyFaal
+from faal.payloads import render_dashboard
+from faal.serializers import UserDailyFaalSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare re-serializing the dashboard faal with splicing the cached ghazal payload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--ghazals', type=int, default=495)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        today = datetime.date.today()
+        with scratch_database():
+            seed_ghazals(options['ghazals'])
+            ghazal_ids = list(HafezGhazal.objects.values_list('pk', flat=True))
+            User.objects.bulk_create(User(username=f'user{i}') for i in range(options['users']))
+            users = list(User.objects.all())
+            UserDailyFaal.objects.bulk_create(
+                UserDailyFaal(user=user, ghazal_id=ghazal_ids[i % len(ghazal_ids)], date=today)
+                for i, user in enumerate(users)
+            )
+            results = [get_daily_faal(user) for user in users]
+
+            def serializer_path():
+                for daily_faal in results:
+                    JSONRenderer().render({
+                        'faal': UserDailyFaalSerializer(daily_faal.faal).data,
+                        'faal_available': daily_faal.available,
+                        'message': daily_faal.message,
+                    })
+
+            def cached_path():
+                for daily_faal in results:
+                    render_dashboard(daily_faal)
+
+            per_user = len(results)
+            for label, func in (('serializer', serializer_path), ('payload cache', cached_path)):
+                result = measure(func, number=5, warmup=1)
+                result = {key: value / per_user if key != 'calls' else value for key, value in result.items()}
+                self.stdout.write(format_row(f'render {label} (per request)', result))
+
+            client = Client()
+            elapsed = 0.0
+            for user in users:
+                client.force_login(user)
+                started = time.perf_counter()
+                client.get('/api/dashboard/')
+                elapsed += time.perf_counter() - started
+            self.stdout.write(
+                f'{per_user} dashboard requests through the test client: '
+                f'{per_user / elapsed:.0f} req/s'
+            )
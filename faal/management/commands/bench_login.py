@@ -0,0 +1,75 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+
+from faal.benchmarks import scratch_database
+from faal.hashing import HashingPool, HashingPoolSaturated
+
+PASSWORD = 'correct horse battery staple'
+
+
+class Command(BaseCommand):
+    help = 'Measure login (authenticate) throughput per core, inline and through the hashing pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=64)
+        parser.add_argument('--clients', type=int, default=16, help='Concurrent request threads.')
+        parser.add_argument(
+            '--hashers', nargs='+', default=['pbkdf2', 'scrypt', 'argon2'],
+            help='Preferred hashers to measure (see PASSWORD_HASHER in settings).',
+        )
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        self.stdout.write(f'{cores} cores, {options["clients"]} concurrent clients')
+        with scratch_database():
+            for name in options['hashers']:
+                hashers = [settings._PASSWORD_HASHERS[name]] + list(settings.PASSWORD_HASHERS)
+                with override_settings(PASSWORD_HASHERS=hashers):
+                    try:
+                        User.objects.filter(username='bench').delete()
+                        User.objects.create_user('bench', password=PASSWORD)
+                    except (ImportError, ValueError) as e:
+                        self.stdout.write(f'{name:<7} skipped: {e}')
+                        continue
+                    connections.close_all()
+                    for label, pool in (
+                        ('inline', HashingPool(workers=0, queue_size=options['clients'])),
+                        ('pool', HashingPool(workers=cores, queue_size=options['clients'])),
+                    ):
+                        self.run_case(name, label, pool, options)
+
+    def run_case(self, name, label, pool, options):
+        rejected = 0
+
+        def login(_):
+            nonlocal rejected
+            try:
+                user = authenticate(None, username='bench', password=PASSWORD)
+                assert user is not None
+            except HashingPoolSaturated:
+                rejected += 1
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        # The Pooled*PasswordHasher classes hash on faal.hashing.hashing_pool.
+        with mock.patch('faal.hashing.hashing_pool', pool):
+            with ThreadPoolExecutor(max_workers=options['clients']) as clients:
+                list(clients.map(login, range(options['logins'])))
+        elapsed = time.perf_counter() - started
+        pool.shutdown()
+        done = options['logins'] - rejected
+        busy_cores = min(os.cpu_count() or 1, pool.workers or options['clients'])
+        self.stdout.write(
+            f'{name:<7} {label:<7} {done / elapsed:8.1f} logins/s '
+            f'({done / elapsed / busy_cores:6.1f} per core), {rejected} rejected with 429'
+        )
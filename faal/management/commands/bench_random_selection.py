@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from faal import corpus
+from faal.benchmarks import format_row, measure, scratch_database, seed_ghazals, seed_quotes
+from faal.models import HafezGhazal, Quote
+
+
+class Command(BaseCommand):
+    help = 'Compare ORDER BY RANDOM() with the in-memory corpus index for random ghazal/quote picks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[500, 50_000])
+        parser.add_argument('--number', type=int, default=200)
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            with scratch_database():
+                seed_ghazals(size)
+                seed_quotes(size)
+                corpus.bump_corpus_version()
+
+                self.stdout.write(f'{size} rows')
+                cases = [
+                    ('ghazal ORDER BY RANDOM()', lambda: HafezGhazal.objects.order_by('?').first()),
+                    ('ghazal index', HafezGhazal.get_random_ghazal),
+                    ('quote ORDER BY RANDOM()', lambda: Quote.objects.order_by('?').first()),
+                    ('quote index', corpus.quote_index.random_object),
+                ]
+                for label, func in cases:
+                    self.stdout.write('  ' + format_row(label, measure(func, number=options['number'])))
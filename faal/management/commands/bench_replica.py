@@ -0,0 +1,125 @@
+import datetime
+import multiprocessing
+import os
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+
+from faal import replica
+from faal.benchmarks import scratch_database, seed_ghazals, seed_quotes, seed_users
+from faal.db import retry_on_locked
+from faal.management.commands.loadtest import percentile
+from faal.models import HafezGhazal, UserDailyFaal
+
+
+def read_corpus(rng, ghazal_count):
+    """An uncached corpus read: a keyset page of ghazals and one ghazal by number."""
+    after = rng.randrange(ghazal_count)
+    list(HafezGhazal.objects.filter(ghazal_number__gt=after).order_by('ghazal_number')[:50])
+    HafezGhazal.objects.filter(ghazal_number=rng.randrange(1, ghazal_count + 1)).first()
+
+
+def run_worker(role, index, first_day, duration, ghazal_count, user_ids, results):
+    # The parent closed its connections before forking; pick up the snapshot afresh.
+    if replica.enabled():
+        replica.refresh()
+    rng = random.Random(index)
+    ghazal_ids = list(HafezGhazal.objects.values_list('pk', flat=True))
+    create = retry_on_locked(UserDailyFaal.objects.create)
+    start_date = first_day + datetime.timedelta(days=index * 10_000)
+    latencies = []
+    deadline = time.perf_counter() + duration
+    step = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        if role == 'read':
+            read_corpus(rng, ghazal_count)
+        else:
+            # A first dashboard visit: one single-row write transaction.
+            create(
+                user_id=user_ids[step % len(user_ids)],
+                ghazal_id=rng.choice(ghazal_ids),
+                date=start_date + datetime.timedelta(days=step // len(user_ids)),
+            )
+        latencies.append(time.perf_counter() - started)
+        step += 1
+    results.put((role, latencies))
+
+
+class Command(BaseCommand):
+    help = (
+        'Mixed read/write load: reader processes run uncached ghazal reads while writer '
+        'processes insert daily faals, first with corpus reads on the primary database '
+        'and then on the read-only snapshot (faal.replica).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ghazals', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--readers', type=int, default=2)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run.')
+
+    def handle(self, *args, **options):
+        with scratch_database() as database_name:
+            seed_ghazals(options['ghazals'])
+            seed_quotes(100)
+            seed_users(options['users'], '!')
+            user_ids = list(User.objects.values_list('pk', flat=True))
+
+            snapshot = os.path.join(os.path.dirname(database_name), 'corpus.sqlite3')
+            replica_settings = connections.databases[replica.REPLICA_ALIAS]
+            previous_name = replica_settings['NAME']
+            replica_settings['NAME'] = f'file:{snapshot}?mode=ro&immutable=1'
+            try:
+                with override_settings(FAAL_CORPUS_SNAPSHOT=snapshot, FAAL_CORPUS_SNAPSHOT_SOURCE=database_name):
+                    replica.build_snapshot()
+                    self.stdout.write(
+                        f'{options["ghazals"]} ghazals, {options["readers"]} readers, '
+                        f'{options["writers"]} writers, {options["duration"]:.0f}s per run'
+                    )
+                    self.stdout.write(
+                        f'{"corpus reads on":<16} {"reads/s":>8} {"read p50":>9} {"read p99":>9} '
+                        f'{"writes/s":>9} {"write p99":>10}'
+                    )
+                    for run, (label, use_replica) in enumerate((('primary', False), ('snapshot', True))):
+                        # Each run writes its own dates, clear of the other's rows.
+                        first_day = datetime.date(1000 + run * 1000, 1, 1)
+                        with override_settings(FAAL_CORPUS_SNAPSHOT=snapshot if use_replica else None):
+                            self.run(label, first_day, options, user_ids)
+            finally:
+                replica_settings['NAME'] = previous_name
+
+    def run(self, label, first_day, options, user_ids):
+        for connection in connections.all():
+            connection.close()
+        replica._local.__dict__.clear()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=run_worker,
+                args=(role, index, first_day, options['duration'], options['ghazals'], user_ids, results),
+            )
+            for index, role in enumerate(['read'] * options['readers'] + ['write'] * options['writers'])
+        ]
+        for worker in workers:
+            worker.start()
+        collected = {'read': [], 'write': []}
+        for _ in workers:
+            role, latencies = results.get(timeout=options['duration'] + 60)
+            collected[role].extend(latencies)
+        for worker in workers:
+            worker.join()
+
+        reads = sorted(collected['read'])
+        writes = sorted(collected['write'])
+        self.stdout.write(
+            f'{label:<16} {len(reads) / options["duration"]:8.0f} {percentile(reads, 0.5) * 1000:7.2f}ms '
+            f'{percentile(reads, 0.99) * 1000:7.2f}ms {len(writes) / options["duration"]:9.0f} '
+            f'{percentile(writes, 0.99) * 1000:8.2f}ms'
+        )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from faal import search
+from faal.benchmarks import format_row, measure, scratch_database, seed_ghazals
+from faal.models import HafezGhazal
+
+QUERIES = ['الساقی', 'مشکل ها', 'difficulties', '250']
+
+
+class Command(BaseCommand):
+    help = 'Compare the FTS5 ghazal search with the LIKE scan the admin used to run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[500, 50_000])
+        parser.add_argument('--number', type=int, default=50)
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            with scratch_database():
+                seed_ghazals(size)
+                search.rebuild_index()
+                self.stdout.write(f'{size} ghazals')
+                for query in QUERIES:
+                    def like_scan():
+                        list(
+                            HafezGhazal.objects.filter(
+                                Q(persian_text__icontains=query) | Q(english_translation__icontains=query)
+                            )[:20]
+                        )
+
+                    def full_text():
+                        search.search(query, limit=20)
+
+                    for label, func in ((f'LIKE {query!r}', like_scan), (f'FTS5 {query!r}', full_text)):
+                        self.stdout.write('  ' + format_row(label, measure(func, number=options['number'])))
+
+                # A term that matches nothing forces LIKE to scan the whole table.
+                for label, func in (
+                    ('LIKE miss', lambda: list(HafezGhazal.objects.filter(persian_text__icontains='ناموجود')[:20])),
+                    ('FTS5 miss', lambda: search.search('ناموجود', limit=20)),
+                ):
+                    self.stdout.write('  ' + format_row(label, measure(func, number=options['number'])))
@@ -0,0 +1,47 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment
+
+from faal.benchmarks import scratch_database, seed_ghazals, seed_quotes
+
+WRITE_RE = re.compile(r'^\s*(INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+ENGINES = (
+    ('database sessions', 'django.contrib.sessions.backends.db'),
+    ('faal cached sessions', 'faal.sessions'),
+)
+PATHS = ('/api/auth/user/', '/api/dashboard/', '/api/quote/')
+
+
+class Command(BaseCommand):
+    help = 'Count database writes per authenticated API request for each session engine.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with scratch_database():
+            seed_ghazals(10)
+            seed_quotes(10)
+            for label, engine in ENGINES:
+                with override_settings(SESSION_ENGINE=engine):
+                    user = User.objects.create_user(f'reader-{engine}', password='secret-pass')
+                    client = Client()
+                    client.login(username=user.username, password='secret-pass')
+                    # First dashboard hit assigns the faal; keep it out of the count.
+                    client.get('/api/dashboard/')
+
+                    with CaptureQueriesContext(connection) as queries:
+                        for i in range(options['requests']):
+                            client.get(PATHS[i % len(PATHS)])
+                    writes = [q['sql'] for q in queries.captured_queries if WRITE_RE.match(q['sql'])]
+                    session_writes = [sql for sql in writes if 'django_session' in sql]
+                    self.stdout.write(
+                        f'{label:<22} {len(queries.captured_queries) / options["requests"]:.2f} queries/request, '
+                        f'{len(writes) / options["requests"]:.2f} writes/request '
+                        f'({len(session_writes)} django_session writes over {options["requests"]} requests)'
+                    )
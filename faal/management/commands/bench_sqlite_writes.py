@@ -0,0 +1,103 @@
+import datetime
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+
+from faal.benchmarks import scratch_database, seed_ghazals
+from faal.db import retry_on_locked, sqlite_pragmas
+from faal.models import HafezGhazal, UserDailyFaal
+
+# A stock sqlite3 DATABASES entry: rollback journal, synchronous=FULL,
+# Python's 5 second lock timeout and no retries.
+STOCK = {'journal_mode': 'DELETE', 'pragmas': {}, 'options': {}, 'retry': False}
+
+
+def tuned_profile():
+    return {
+        'journal_mode': sqlite_pragmas().get('journal_mode', 'WAL'),
+        'pragmas': sqlite_pragmas(),
+        'options': dict(settings.DATABASES['default'].get('OPTIONS', {})),
+        'retry': True,
+    }
+
+
+def write_worker(profile, user_ids, ghazal_id, date, results):
+    written = 0
+    try:
+        # Forked children must not share the parent's SQLite handle.
+        connections.close_all()
+        settings.SQLITE_PRAGMAS = profile['pragmas']
+        connection.settings_dict['OPTIONS'] = profile['options']
+
+        create = UserDailyFaal.objects.create
+        if profile['retry']:
+            create = retry_on_locked(create)
+        for user_id in user_ids:
+            try:
+                create(user_id=user_id, ghazal_id=ghazal_id, date=date)
+                written += 1
+            except OperationalError:
+                pass
+        connections.close_all()
+    finally:
+        # Rows that were not written, including after a crash, count as errors.
+        results.put((written, len(user_ids) - written))
+
+
+class Command(BaseCommand):
+    help = 'Measure concurrent UserDailyFaal insert throughput with stock and tuned SQLite settings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+        parser.add_argument('--rows', type=int, default=300, help='Rows written by each worker.')
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        date = datetime.date.today()
+        with scratch_database():
+            seed_ghazals(1)
+            ghazal_id = HafezGhazal.objects.get().pk
+            total_users = max(options['workers']) * options['rows']
+            User.objects.bulk_create(User(username=f'bench{i}') for i in range(total_users))
+            user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+            tuned_settings = tuned_profile()
+
+            for label, profile in (('stock', STOCK), ('tuned', tuned_settings)):
+                for workers in options['workers']:
+                    UserDailyFaal.objects.all().delete()
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+                    connections.close_all()
+
+                    results = context.Queue()
+                    processes = [
+                        context.Process(
+                            target=write_worker,
+                            args=(
+                                profile,
+                                user_ids[i * options['rows']:(i + 1) * options['rows']],
+                                ghazal_id,
+                                date,
+                                results,
+                            ),
+                        )
+                        for i in range(workers)
+                    ]
+                    started = time.perf_counter()
+                    for process in processes:
+                        process.start()
+                    outcomes = [results.get() for _ in processes]
+                    for process in processes:
+                        process.join()
+                    elapsed = time.perf_counter() - started
+
+                    written = sum(w for w, _ in outcomes)
+                    errors = sum(e for _, e in outcomes)
+                    self.stdout.write(
+                        f'{label:<6} {workers:>2} workers: {written:>6} rows in {elapsed:6.2f}s '
+                        f'({written / elapsed:8.0f} rows/s), {errors} locked errors'
+                    )
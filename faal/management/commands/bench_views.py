@@ -0,0 +1,151 @@
+import json
+import logging
+import platform
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template import TemplateDoesNotExist
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from faal import beyts, search
+from faal.benchmarks import (
+    ROUTES, format_row, measure, scratch_database, seed_daily_faals, seed_ghazals, seed_quotes, seed_users,
+)
+from faal.models import HafezGhazal
+from faal.signals import corpus_changed
+
+PASSWORD = 'secret123'
+
+
+class Command(BaseCommand):
+    help = (
+        'Time every route through the test client against a large synthetic corpus '
+        '(50k ghazals, 100k users, 1M daily faals by default) in a scratch database, '
+        'and record p50/p99 latency and query counts as JSON. With --baseline, exit '
+        'with an error when a route runs more queries than the baseline or its p50 '
+        'grows beyond --latency-tolerance.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ghazals', type=int, default=50_000)
+        parser.add_argument('--quotes', type=int, default=1_000)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--faals', type=int, default=1_000_000)
+        parser.add_argument('--number', type=int, default=30, help='Timed requests per route.')
+        parser.add_argument('--routes', nargs='+', help='Only these URL names.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare against this earlier --output file.')
+        parser.add_argument('--latency-tolerance', type=float, default=0.25,
+                            help='Allowed p50 growth over the baseline, as a fraction (default 0.25).')
+        parser.add_argument('--latency-floor-us', type=float, default=200,
+                            help='Ignore p50 growth smaller than this, which is timer noise.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+        routes = [route for route in ROUTES if not options['routes'] or route[0] in options['routes']]
+
+        # Every timed request comes from the same address and user.
+        with scratch_database(), override_settings(FAAL_THROTTLE_RATES={}):
+            self.seed(options)
+            results = {}
+            # Budget warnings and missing-template tracebacks would drown the table.
+            logging.disable(logging.CRITICAL)
+            try:
+                self.bench_routes(routes, options['number'], results)
+            finally:
+                logging.disable(logging.NOTSET)
+
+        report = {
+            'corpus': {key: options[key] for key in ('ghazals', 'quotes', 'users', 'faals')},
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'created': timezone.now().isoformat(),
+            'routes': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+            self.stdout.write(f'Wrote {options["output"]}')
+        if baseline:
+            self.compare(results, baseline, options)
+
+    def seed(self, options):
+        self.stdout.write(
+            f'Seeding {options["ghazals"]} ghazals, {options["quotes"]} quotes, '
+            f'{options["users"]} users and {options["faals"]} faals...'
+        )
+        seed_ghazals(options['ghazals'])
+        seed_quotes(options['quotes'])
+        password_hash = make_password(PASSWORD)
+        seed_users(options['users'], password_hash)
+        User.objects.create(username='reader', email='reader@example.com', password=password_hash)
+        User.objects.create(username='curator', email='curator@example.com', password=password_hash, is_staff=True)
+        seed_daily_faals(options['faals'])
+        search.rebuild_index()
+        beyts.rebuild()
+        cache.clear()
+        corpus_changed(sender=HafezGhazal)
+        self.reader = User.objects.get(username='reader')
+        self.curator = User.objects.get(username='curator')
+
+    def bench_routes(self, routes, number, results):
+        for route in routes:
+            try:
+                results[route[0]] = self.bench(route, number)
+            except TemplateDoesNotExist as exc:
+                self.stdout.write(f'{route[0]:<40} skipped: template {exc} is missing')
+
+    def bench(self, route, number):
+        name, kwargs, method, data, signed_in, _ = route
+        url = reverse(name, kwargs=kwargs)
+        attempt = 0
+        client = None
+
+        def setup():
+            nonlocal attempt, client
+            attempt += 1
+            client = Client()
+            if signed_in:
+                client.force_login(self.curator if signed_in == 'staff' else self.reader)
+
+        def call():
+            payload = {key: value.format(n=attempt) for key, value in data.items()} if data else None
+            response = getattr(client, method)(url, payload)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            if response.status_code >= 400:
+                raise CommandError(f'{name} returned {response.status_code}')
+
+        result = measure(call, number=number, warmup=3, setup=setup)
+        setup()
+        with CaptureQueriesContext(connection) as queries:
+            call()
+        result['queries'] = len(queries.captured_queries)
+        self.stdout.write(format_row(name, result) + f'  {result["queries"]:>3} queries')
+        return result
+
+    def compare(self, results, baseline, options):
+        regressions = []
+        for name, result in results.items():
+            before = baseline['routes'].get(name)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                regressions.append(f'{name}: {before["queries"]} -> {result["queries"]} queries')
+            growth = result['p50_us'] - before['p50_us']
+            if growth > options['latency_floor_us'] and growth > before['p50_us'] * options['latency_tolerance']:
+                regressions.append(f'{name}: p50 {before["p50_us"]:.0f}us -> {result["p50_us"]:.0f}us')
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from faal import audio
+
+
+class Command(BaseCommand):
+    help = 'Record the size, duration and sha256 of every ghazal recording in the audio manifest.'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        entries = audio.build_manifest()
+        audio.write_manifest(entries)
+        audio.library.invalidate()
+        elapsed = time.perf_counter() - started
+        total_size = sum(entry['size'] for entry in entries)
+        total_duration = sum(entry['duration'] for entry in entries)
+        self.stdout.write(self.style.SUCCESS(
+            f'Described {len(entries)} files ({total_size / 1e6:.1f} MB, '
+            f'{total_duration / 3600:.1f} h) in {elapsed:.2f}s -> {audio.manifest_path()}'
+        ))
@@ -0,0 +1,28 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from faal import corpus_map
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the ghazals and quotes to the binary corpus map that workers share read-only '
+        '(FAAL_CORPUS_MAP). Run it at deploy time; corpus changes rebuild it on their own afterwards.'
+    )
+
+    def handle(self, *args, **options):
+        if not corpus_map.enabled():
+            raise CommandError('FAAL_CORPUS_MAP is not configured for this database.')
+        started = time.perf_counter()
+        path = corpus_map.build()
+        if path is None:
+            raise CommandError('The corpus changed during the build; run the command again.')
+        elapsed = time.perf_counter() - started
+        mapped = corpus_map.MappedCorpus(path)
+        size = os.path.getsize(path) / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {path} ({mapped.ghazal_count} ghazals, {mapped.quote_count} quotes, {size:.0f} KiB) '
+            f'in {elapsed:.2f}s'
+        ))
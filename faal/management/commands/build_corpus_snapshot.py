@@ -0,0 +1,25 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from faal import replica
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the ghazal and quote tables into the read-only snapshot that corpus reads '
+        'are routed to (FAAL_CORPUS_SNAPSHOT). Run it at deploy time; corpus changes '
+        'rebuild it on their own afterwards.'
+    )
+
+    def handle(self, *args, **options):
+        if not replica.enabled():
+            raise CommandError('FAAL_CORPUS_SNAPSHOT or the corpus database is not configured.')
+        started = time.perf_counter()
+        path = replica.build_snapshot()
+        if path is None:
+            raise CommandError('The corpus changed during the copy; run the command again.')
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(path) / 1024
+        self.stdout.write(self.style.SUCCESS(f'Wrote {path} ({size:.0f} KiB) in {elapsed:.2f}s'))
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from whitenoise.compress import Compressor
+
+# Recordings are already compressed; gzipping 200 MB of mp3 buys nothing.
+SKIP_COMPRESS_EXTENSIONS = Compressor.SKIP_COMPRESS_EXTENSIONS + ('mp3', 'ogg', 'm4a')
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the React bundle into FAAL_FRONTEND_BUILD, write gzip/brotli variants '
+        'next to its files and run collectstatic, for WhiteNoise to serve.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-npm', action='store_true', help='Compress an existing build.')
+        parser.add_argument('--skip-collectstatic', action='store_true')
+
+    def handle(self, *args, **options):
+        build = str(settings.FAAL_FRONTEND_BUILD)
+        started = time.perf_counter()
+        if not options['skip_npm']:
+            frontend = os.path.dirname(build)
+            self.stdout.write(f'npm run build in {frontend}')
+            try:
+                subprocess.run(['npm', 'run', 'build'], cwd=frontend, check=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                raise CommandError(f'npm run build failed: {e}')
+        if not os.path.isdir(build):
+            raise CommandError(f'No front-end build at {build}.')
+
+        compressor = Compressor(extensions=SKIP_COMPRESS_EXTENSIONS, quiet=True)
+        paths = [
+            os.path.join(directory, filename)
+            for directory, _, filenames in os.walk(build)
+            for filename in filenames
+            if compressor.should_compress(filename)
+        ]
+        with ThreadPoolExecutor() as executor:
+            written = sum(len(names) for names in executor.map(compressor.compress, paths))
+        self.stdout.write(f'{written} compressed variants for {len(paths)} files in {build}')
+        if not compressor.use_brotli:
+            self.stdout.write(self.style.WARNING('brotli is not installed; wrote gzip variants only'))
+
+        if not options['skip_collectstatic']:
+            call_command('collectstatic', interactive=False, verbosity=0)
+            self.stdout.write(f'collectstatic -> {settings.STATIC_ROOT}')
+        self.stdout.write(self.style.SUCCESS(f'Static files ready in {time.perf_counter() - started:.2f}s'))
@@ -0,0 +1,45 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from faal.corpus_io import CORPUS_FIELDS, FORMATS, RecordWriter, guess_format
+from faal.models import HafezGhazal, Quote
+
+
+class Command(BaseCommand):
+    help = 'Stream ghazals or quotes out as JSONL/CSV without loading every row.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', choices=sorted(CORPUS_FIELDS))
+        parser.add_argument('path', help='Output file, or - for stdout.')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = guess_format(path, options['format'])
+        fields = CORPUS_FIELDS[options['corpus']]
+        if options['corpus'] == 'ghazals':
+            rows = HafezGhazal.objects.order_by('ghazal_number')
+        else:
+            rows = Quote.objects.order_by('id')
+
+        stream = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+        started = time.perf_counter()
+        total = 0
+        try:
+            writer = RecordWriter(stream, fmt, fields)
+            for record in rows.values(*fields).iterator(chunk_size=options['chunk_size']):
+                writer.write(record)
+                total += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        if stream is not sys.stdout:
+            elapsed = time.perf_counter() - started
+            rate = total / elapsed if elapsed else 0
+            self.stdout.write(self.style.SUCCESS(
+                f'Exported {total} {options["corpus"]} in {elapsed:.2f}s ({rate:.0f} rows/s)'
+            ))
@@ -0,0 +1,118 @@
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from faal import beyts, search
+from faal.corpus_io import CORPUS_FIELDS, FORMATS, guess_format, parse_bool, read_records
+from faal.models import HafezGhazal, Quote
+from faal.signals import corpus_changed
+
+
+class Command(BaseCommand):
+    help = 'Stream ghazals or quotes from JSONL/CSV and upsert them in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', choices=sorted(CORPUS_FIELDS))
+        parser.add_argument('path', help='Input file, or - for stdin.')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = guess_format(path, options['format'])
+        build = self.ghazal_from_record if options['corpus'] == 'ghazals' else self.quote_from_record
+        self.seen_numbers = set()
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        started = time.perf_counter()
+        total = 0
+        try:
+            objects = (build(line, record) for line, record in read_records(stream, fmt))
+            while True:
+                batch = list(islice(objects, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self.upsert(options['corpus'], batch, options['batch_size'])
+                total += len(batch)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{total} rows...')
+        except ValueError as e:
+            raise CommandError(f'{e} (the {total} rows before its batch were imported)')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            # Each batch commits on its own, so refresh after a failed run too.
+            if total:
+                self.refresh(options['corpus'])
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {total} {options["corpus"]} in {elapsed:.2f}s ({rate:.0f} rows/s)'
+        ))
+
+    def refresh(self, corpus):
+        # bulk_create() bypasses model signals, so refresh derived state here.
+        corpus_changed(HafezGhazal if corpus == 'ghazals' else Quote)
+        if corpus == 'ghazals':
+            search.rebuild_index()
+            beyts.rebuild()
+
+    def ghazal_from_record(self, line, record):
+        try:
+            number = int(record.get('ghazal_number'))
+        except (TypeError, ValueError):
+            raise ValueError(f'line {line}: ghazal_number must be an integer')
+        if number in self.seen_numbers:
+            raise ValueError(f'line {line}: duplicate ghazal_number {number}')
+        self.seen_numbers.add(number)
+        persian_text = record.get('persian_text') or ''
+        if not persian_text.strip():
+            raise ValueError(f'line {line}: persian_text is required')
+        return HafezGhazal(
+            ghazal_number=number,
+            persian_text=persian_text,
+            english_translation=record.get('english_translation') or '',
+        )
+
+    def quote_from_record(self, line, record):
+        text = record.get('text') or ''
+        author = record.get('author') or ''
+        if not text.strip() or not author.strip():
+            raise ValueError(f'line {line}: text and author are required')
+        max_length = Quote._meta.get_field('author').max_length
+        if len(author) > max_length:
+            raise ValueError(f'line {line}: author is longer than {max_length} characters')
+        pk = record.get('id')
+        try:
+            pk = int(pk) if pk not in (None, '') else None
+        except (TypeError, ValueError):
+            raise ValueError(f'line {line}: id must be an integer')
+        return Quote(
+            pk=pk,
+            text=text,
+            author=author,
+            is_daily_quote=parse_bool(record.get('is_daily_quote', False)),
+        )
+
+    def upsert(self, corpus, batch, batch_size):
+        if corpus == 'ghazals':
+            HafezGhazal.objects.bulk_create(
+                batch,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['ghazal_number'],
+                update_fields=['persian_text', 'english_translation'],
+            )
+        else:
+            Quote.objects.bulk_create(
+                batch,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=['text', 'author', 'is_daily_quote'],
+            )
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ['/api/quote/', '/api/quotes/', '/api/ghazals/?page_size=50']
+
+SERVERS = {
+    'wsgi': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', 'HafezFaal.wsgi:application',
+        '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+    ],
+    'asgi': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'HafezFaal.asgi:application',
+        '--workers', str(workers), '--port', str(port), '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Connection:
+    """Minimal HTTP/1.1 client connection that reuses the socket while the server allows it."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, raw_request):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(raw_request)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif status not in (204, 304):
+            await self.reader.read()
+            self.close()
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def slow_client(host, port, stop):
+    """Hold a connection open by trickling request headers, like a client on a bad network."""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f'GET /api/quote/ HTTP/1.1\r\nHost: {host}\r\n'.encode())
+        while not stop.is_set():
+            await asyncio.sleep(0.5)
+            writer.write(b'X-Slow: 1\r\n')
+            await writer.drain()
+        writer.close()
+    except (ConnectionError, OSError):
+        pass
+
+
+async def run_load(base_url, path, concurrency, total, slow_clients, cookie):
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    headers = f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n'
+    if cookie:
+        headers += f'Cookie: {cookie}\r\n'
+    raw_request = (headers + '\r\n').encode()
+
+    stop = asyncio.Event()
+    slow = [asyncio.create_task(slow_client(host, port, stop)) for _ in range(slow_clients)]
+    if slow:
+        await asyncio.sleep(1)
+
+    latencies = []
+    errors = 0
+    remaining = total
+
+    async def client():
+        nonlocal remaining, errors
+        connection = Connection(host, port)
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                status = await connection.request(raw_request)
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                connection.close()
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+        connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*slow)
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'errors': errors,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the read-only API: p50/p99 latency and requests/s at high concurrency. '
+        'With --compare, start gunicorn (WSGI, sync workers) and uvicorn (ASGI, async views) '
+        'side by side and run the same load against each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of an already running server.')
+        parser.add_argument('--compare', action='store_true', help='Start and compare WSGI and ASGI servers.')
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes with --compare.')
+        parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=4000, help='Requests per path.')
+        parser.add_argument('--slow-clients', type=int, default=0,
+                            help='Connections that trickle their headers for the whole run.')
+        parser.add_argument('--cookie', help='Cookie header, e.g. "sessionid=..." for /api/dashboard/.')
+
+    def handle(self, *args, **options):
+        if not options['url'] and not options['compare']:
+            raise CommandError('Pass --url of a running server or --compare.')
+        self.stdout.write(
+            f'{options["concurrency"]} concurrent clients, {options["requests"]} requests per path, '
+            f'{options["slow_clients"]} slow clients'
+        )
+        self.stdout.write(f'{"server":<7} {"path":<28} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+        if options['url']:
+            self.run_paths('server', options['url'], options)
+            return
+        for name in ('wsgi', 'asgi'):
+            with self.server(name, options['workers'], options['verbosity']) as base_url:
+                self.run_paths(name, base_url, options)
+
+    def run_paths(self, label, base_url, options):
+        for path in options['paths']:
+            # Warm up each worker's process-local caches before measuring.
+            asyncio.run(run_load(base_url, path, options['workers'] * 4, options['workers'] * 20, 0, options['cookie']))
+            result = asyncio.run(run_load(
+                base_url, path, options['concurrency'], options['requests'],
+                options['slow_clients'], options['cookie'],
+            ))
+            self.stdout.write(
+                f'{label:<7} {path:<28} {result["rps"]:8.0f} {result["p50"]:8.1f} '
+                f'{result["p99"]:8.1f} {result["errors"]:7}'
+            )
+
+    @contextmanager
+    def server(self, name, workers, verbosity=1):
+        port = free_port()
+        env = dict(os.environ)
+        env.pop('FAAL_ASYNC_API', None)
+        # Every simulated client shares one address and one session.
+        env['FAAL_THROTTLE'] = '0'
+        # Slow clients make gunicorn log worker timeouts; only show them with -v 2.
+        process = subprocess.Popen(
+            SERVERS[name](port, workers), cwd=settings.BASE_DIR, env=env,
+            stderr=None if verbosity > 1 else subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                if process.poll() is not None:
+                    raise CommandError(f'The {name} server exited; is {SERVERS[name](0, 0)[2]} installed?')
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise CommandError(f'The {name} server did not start')
+                    time.sleep(0.2)
+            yield f'http://127.0.0.1:{port}'
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
@@ -0,0 +1,79 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from faal.assignment import assignment_mode, derive_ghazal
+from faal.corpus import ghazal_index, ghazal_pool
+from faal.db import retry_on_locked
+from faal.models import UserDailyFaal
+
+
+class Command(BaseCommand):
+    help = (
+        "Assign the day's faal to every active user ahead of the 8 AM gate, so the "
+        'first dashboard visits only read. Safe to re-run: users who already have '
+        'a faal for the date are skipped, so an interrupted run just continues. '
+        'The day and the gate are in local time (TIME_ZONE), so schedule it before '
+        'the gate in that zone, e.g. "CRON_TZ=Asia/Tehran" then '
+        '"30 7 * * * manage.py prepare_daily_faals".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat, help='Defaults to today in TIME_ZONE.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--active-within', type=int, metavar='DAYS',
+            help='Only users who logged in within DAYS days (default: every active user).',
+        )
+
+    def handle(self, *args, **options):
+        date = options['date'] or timezone.localdate()
+        chunk_size = options['chunk_size']
+        deterministic = assignment_mode() == 'deterministic'
+        pool = ghazal_pool.get() if deterministic else None
+        ghazal_ids = ghazal_index.ids()
+        if not ghazal_ids:
+            raise CommandError('No ghazals available.')
+
+        users = User.objects.filter(is_active=True).exclude(
+            Exists(UserDailyFaal.objects.filter(user=OuterRef('pk'), date=date))
+        )
+        if options['active_within'] is not None:
+            since = timezone.now() - datetime.timedelta(days=options['active_within'])
+            users = users.filter(last_login__gte=since)
+        users = users.order_by('pk').values_list('pk', flat=True)
+
+        bulk_create = retry_on_locked(UserDailyFaal.objects.bulk_create)
+        started = time.perf_counter()
+        total = 0
+        last_pk = 0
+        while True:
+            user_ids = list(users.filter(pk__gt=last_pk)[:chunk_size])
+            if not user_ids:
+                break
+            rows = [
+                UserDailyFaal(
+                    user_id=user_id,
+                    date=date,
+                    ghazal_id=derive_ghazal(user_id, date, pool)[1] if deterministic else random.choice(ghazal_ids),
+                )
+                for user_id in user_ids
+            ]
+            # bulk_create() commits each chunk on its own, so the write lock is
+            # free for dashboard requests between chunks.
+            bulk_create(rows, ignore_conflicts=True)
+            total += len(rows)
+            last_pk = user_ids[-1]
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{total} users...')
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Assigned {total} faals for {date} in {elapsed:.2f}s ({rate:.0f} rows/s)'
+        ))
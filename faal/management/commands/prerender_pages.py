@@ -0,0 +1,62 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from django.utils import translation
+
+from faal.corpus import corpus_version
+from faal.pages import compressed_variants
+
+PAGES = ['homepage', 'ghazals_list', 'quotes_list']
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the anonymous pages once and write them, with gzip/brotli variants, '
+        'to FAAL_PRERENDER_DIR/<language>/<path>/index.html for the front-end server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.FAAL_PRERENDER_DIR))
+        parser.add_argument('--languages', nargs='+', default=[settings.LANGUAGE_CODE])
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST='localhost')
+        os.makedirs(options['output'], exist_ok=True)
+        started = time.perf_counter()
+        written = 0
+        for language in options['languages']:
+            for name in PAGES:
+                path = reverse(name)
+                with translation.override(language):
+                    try:
+                        response = client.get(path, HTTP_ACCEPT_LANGUAGE=language)
+                    except Exception as e:
+                        self.stderr.write(f'{language} {path}: {e.__class__.__name__}: {e}')
+                        continue
+                if response.status_code != 200:
+                    self.stderr.write(f'{language} {path}: HTTP {response.status_code}, skipped')
+                    continue
+                directory = os.path.join(options['output'], language, path.strip('/'))
+                os.makedirs(directory, exist_ok=True)
+                target = os.path.join(directory, 'index.html')
+                self.write(target, response.content)
+                for extension, data in compressed_variants(response.content).items():
+                    self.write(f'{target}.{extension}', data)
+                written += 1
+                self.stdout.write(f'{language} {path}: {len(response.content)} bytes')
+
+        with open(os.path.join(options['output'], 'corpus-version'), 'w') as f:
+            f.write(f'{corpus_version()}\n')
+        self.stdout.write(self.style.SUCCESS(
+            f'Prerendered {written} pages in {time.perf_counter() - started:.2f}s -> {options["output"]}'
+        ))
+
+    def write(self, path, data):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
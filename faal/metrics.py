@@ -0,0 +1,313 @@
+"""
+Request metrics in Prometheus text format.
+
+``MetricsMiddleware`` records, per URL name: a latency histogram, a query
+count histogram, query time, serializer time and response bytes. Queries are
+counted by an execute wrapper on every connection, so this works with
+``DEBUG = False``. The wrapper finds the request through a context variable,
+which also follows async views into their ``sync_to_async`` threads.
+Serializer time comes from ``serializer_timer()``, which the API serializers
+and payload renderers wrap around their work.
+
+``FAAL_QUERY_BUDGETS`` maps URL names to the most queries a request may run,
+e.g. ``{'api_dashboard': 3}``. Requests over budget are counted and logged.
+
+Each worker process keeps its own counters and writes them to
+``FAAL_METRICS_DIR`` every few seconds. The ``metrics`` endpoint adds up
+every worker's file, so a scrape sees all workers, not just the one that
+answered it. Files left by workers that have exited are removed on the next
+scrape, so their counters drop out instead of adding up forever.
+
+With ``FAAL_PROFILE_SAMPLE_RATE`` set, that fraction of requests run under
+cProfile. A sampled request slower than ``FAAL_PROFILE_SLOW_MS`` is dumped to
+``FAAL_PROFILE_DIR`` as ``<view>-<timestamp>.prof``; load it with ``pstats``.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+DUMP_INTERVAL = 5.0
+
+_request_state = contextvars.ContextVar('faal_request_metrics', default=None)
+
+
+class RequestState:
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+
+
+@contextlib.contextmanager
+def serializer_timer():
+    """Add the time spent inside the block to the request's serializer time."""
+    state = _request_state.get()
+    if state is None:
+        yield
+        return
+    # Only the outermost block counts, so nested serializers are not added twice.
+    state.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        state.serializer_depth -= 1
+        if not state.serializer_depth:
+            state.serializer_seconds += time.perf_counter() - started
+
+
+def count_query(execute, sql, params, many, context):
+    state = _request_state.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state.queries += 1
+        state.query_seconds += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    # The wrappers outlive reconnects, so only add it once.
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def _empty_stats():
+    return {
+        'count': 0,
+        'latency_sum': 0.0,
+        'latency_buckets': [0] * len(LATENCY_BUCKETS),
+        'queries_sum': 0,
+        'queries_buckets': [0] * len(QUERY_BUCKETS),
+        'query_seconds': 0.0,
+        'serializer_seconds': 0.0,
+        'response_bytes': 0,
+        'budget_exceeded': 0,
+    }
+
+
+class Registry:
+    """Per-process metrics, keyed by view name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+        self._last_dump = 0.0
+
+    def observe(self, view, seconds, state, response_bytes, over_budget):
+        with self._lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = _empty_stats()
+            stats['count'] += 1
+            stats['latency_sum'] += seconds
+            index = bisect_left(LATENCY_BUCKETS, seconds)
+            if index < len(LATENCY_BUCKETS):
+                stats['latency_buckets'][index] += 1
+            stats['queries_sum'] += state.queries
+            index = bisect_left(QUERY_BUCKETS, state.queries)
+            if index < len(QUERY_BUCKETS):
+                stats['queries_buckets'][index] += 1
+            stats['query_seconds'] += state.query_seconds
+            stats['serializer_seconds'] += state.serializer_seconds
+            stats['response_bytes'] += response_bytes
+            stats['budget_exceeded'] += over_budget
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.views))
+
+    def dump(self, directory, force=False):
+        """Write this process's counters to ``directory/<pid>.json`` at most every few seconds."""
+        now = time.monotonic()
+        if not directory or (not force and now - self._last_dump < DUMP_INTERVAL):
+            return
+        self._last_dump = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+registry = Registry()
+
+
+def metrics_dir():
+    return getattr(settings, 'FAAL_METRICS_DIR', None)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Running, under another user.
+    return True
+
+
+def collect():
+    """Every running worker's counters added together, with this process's taken live."""
+    views = {}
+    sources = [registry.snapshot()]
+    directory = metrics_dir()
+    if directory:
+        own = os.path.join(directory, f'{os.getpid()}.json')
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            if path == own:
+                continue
+            pid = os.path.basename(path)[:-len('.json')]
+            if not pid.isdigit() or not _pid_alive(int(pid)):
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                continue
+            try:
+                with open(path) as f:
+                    sources.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    for source in sources:
+        for view, stats in source.items():
+            total = views.setdefault(view, _empty_stats())
+            for key, value in stats.items():
+                if isinstance(value, list):
+                    total[key] = [a + b for a, b in zip(total[key], value)]
+                else:
+                    total[key] += value
+    return views
+
+
+def _histogram(lines, name, view, buckets, counts, total, count):
+    cumulative = 0
+    for bound, bucket_count in zip(buckets, counts):
+        cumulative += bucket_count
+        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {count}')
+    lines.append(f'{name}_sum{{view="{view}"}} {total}')
+    lines.append(f'{name}_count{{view="{view}"}} {count}')
+
+
+def render_prometheus(views):
+    lines = [
+        '# HELP faal_request_duration_seconds Request latency by view.',
+        '# TYPE faal_request_duration_seconds histogram',
+    ]
+    for view, stats in sorted(views.items()):
+        _histogram(lines, 'faal_request_duration_seconds', view, LATENCY_BUCKETS,
+                   stats['latency_buckets'], stats['latency_sum'], stats['count'])
+    lines += [
+        '# HELP faal_db_queries Database queries per request by view.',
+        '# TYPE faal_db_queries histogram',
+    ]
+    for view, stats in sorted(views.items()):
+        _histogram(lines, 'faal_db_queries', view, QUERY_BUCKETS,
+                   stats['queries_buckets'], stats['queries_sum'], stats['count'])
+    counters = (
+        ('faal_db_query_seconds_total', 'query_seconds', 'Time spent in database queries.'),
+        ('faal_serializer_seconds_total', 'serializer_seconds', 'Time spent serializing responses.'),
+        ('faal_response_bytes_total', 'response_bytes', 'Response body bytes sent.'),
+        ('faal_query_budget_exceeded_total', 'budget_exceeded', 'Requests over their FAAL_QUERY_BUDGETS entry.'),
+    )
+    for name, key, help_text in counters:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for view, stats in sorted(views.items()):
+            lines.append(f'{name}{{view="{view}"}} {stats[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _response_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.budgets = getattr(settings, 'FAAL_QUERY_BUDGETS', {})
+        self.sample_rate = getattr(settings, 'FAAL_PROFILE_SAMPLE_RATE', 0.0)
+        self.slow_seconds = getattr(settings, 'FAAL_PROFILE_SLOW_MS', 500) / 1000
+        self.profile_dir = getattr(settings, 'FAAL_PROFILE_DIR', None)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profiler = None
+        if self.sample_rate and self.profile_dir and random.random() < self.sample_rate:
+            profiler = cProfile.Profile()
+        with self.measure() as state:
+            if profiler:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+        self.record(request, response, state, profiler)
+        return response
+
+    async def __acall__(self, request):
+        # cProfile would see every request on the event loop's thread, so async requests are not sampled.
+        with self.measure() as state:
+            response = await self.get_response(request)
+        self.record(request, response, state)
+        return response
+
+    @contextlib.contextmanager
+    def measure(self):
+        """Count the queries and time of the request handled inside the block."""
+        state = RequestState()
+        token = _request_state.set(state)
+        started = time.perf_counter()
+        try:
+            yield state
+        finally:
+            _request_state.reset(token)
+            state.seconds = time.perf_counter() - started
+
+    def record(self, request, response, state, profiler=None):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        budget = self.budgets.get(view)
+        over_budget = budget is not None and state.queries > budget
+        if over_budget:
+            logger.warning('%s ran %d queries (budget %d): %s', view, state.queries, budget, request.path)
+        registry.observe(view, state.seconds, state, _response_size(response), over_budget)
+        if profiler and state.seconds >= self.slow_seconds:
+            self.dump_profile(profiler, view)
+        registry.dump(metrics_dir())
+
+    def dump_profile(self, profiler, view):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = f'{view.replace(":", "-")}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.prof'
+        profiler.dump_stats(os.path.join(self.profile_dir, name))
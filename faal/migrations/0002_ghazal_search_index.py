@@ -0,0 +1,62 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'faal_ghazal_search'
+
+# A copy of faal.search.normalize() as of this migration, so later changes to
+# the app code cannot change what this migration does.
+_FOLD = {
+    '\u064a': '\u06cc',  # Arabic yeh -> Persian yeh
+    '\u0649': '\u06cc',  # alef maksura -> Persian yeh
+    '\u0643': '\u06a9',  # Arabic kaf -> Persian kaf
+    '\u0623': '\u0627',  # alef with hamza above -> alef
+    '\u0625': '\u0627',  # alef with hamza below -> alef
+    '\u0671': '\u0627',  # alef wasla -> alef
+    '\u0629': '\u0647',  # teh marbuta -> heh
+    '\u06c0': '\u0647',  # heh with yeh above -> heh
+    '\u200c': None,  # zero-width non-joiner
+    '\u200d': None,  # zero-width joiner
+    '\u0640': None,  # tatweel
+    '\u0670': None,  # superscript alef
+}
+_FOLD.update({chr(code): None for code in range(0x064B, 0x0660)})  # harakat
+_FOLD.update({chr(0x06F0 + digit): str(digit) for digit in range(10)})  # Persian digits
+_FOLD.update({chr(0x0660 + digit): str(digit) for digit in range(10)})  # Arabic-Indic digits
+_FOLD_TABLE = str.maketrans(_FOLD)
+
+
+def normalize(text):
+    return (text or '').translate(_FOLD_TABLE).casefold()
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    HafezGhazal = apps.get_model('faal', 'HafezGhazal')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            "persian_text, english_translation, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        rows = HafezGhazal.objects.values_list('pk', 'persian_text', 'english_translation')
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, persian_text, english_translation) VALUES (%s, %s, %s)',
+            [(pk, normalize(persian), normalize(english)) for pk, persian, english in rows],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faal', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
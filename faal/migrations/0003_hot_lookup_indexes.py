@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faal', '0002_ghazal_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quote',
+            index=models.Index(condition=models.Q(('is_daily_quote', True)), fields=['id'], name='faal_quote_daily_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quote',
+            index=models.Index(fields=['author'], name='faal_quote_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userdailyfaal',
+            index=models.Index(fields=['date', 'user'], name='faal_udf_date_user_idx'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:37
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copies of faal.search.tokenize() and faal.beyts.beyt_fields() as of this
+# migration, so later changes to the app code cannot change what it does.
+_FOLD = {
+    '\u064a': '\u06cc',  # Arabic yeh -> Persian yeh
+    '\u0649': '\u06cc',  # alef maksura -> Persian yeh
+    '\u0643': '\u06a9',  # Arabic kaf -> Persian kaf
+    '\u0623': '\u0627',  # alef with hamza above -> alef
+    '\u0625': '\u0627',  # alef with hamza below -> alef
+    '\u0671': '\u0627',  # alef wasla -> alef
+    '\u0629': '\u0647',  # teh marbuta -> heh
+    '\u06c0': '\u0647',  # heh with yeh above -> heh
+    '\u200c': None,  # zero-width non-joiner
+    '\u200d': None,  # zero-width joiner
+    '\u0640': None,  # tatweel
+    '\u0670': None,  # superscript alef
+}
+_FOLD.update({chr(code): None for code in range(0x064B, 0x0660)})  # harakat
+_FOLD.update({chr(0x06F0 + digit): str(digit) for digit in range(10)})  # Persian digits
+_FOLD.update({chr(0x0660 + digit): str(digit) for digit in range(10)})  # Arabic-Indic digits
+_FOLD_TABLE = str.maketrans(_FOLD)
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').translate(_FOLD_TABLE).casefold())
+
+
+def beyt_fields(ghazal_id, text):
+    lines = [line.strip() for line in (text or '').splitlines()]
+    lines = [line for line in lines if line]
+    rows = []
+    token_offset = 0
+    for index in range(0, len(lines), 2):
+        first, second = lines[index], lines[index + 1] if index + 1 < len(lines) else ''
+        tokens = tokenize(first) + tokenize(second)
+        rows.append({
+            'ghazal_id': ghazal_id,
+            'position': index // 2 + 1,
+            'first_mesra': first,
+            'second_mesra': second,
+            'tokens': ' '.join(tokens),
+            'token_offset': token_offset,
+        })
+        token_offset += len(tokens)
+    return rows
+
+
+def populate_beyts(apps, schema_editor):
+    HafezGhazal = apps.get_model('faal', 'HafezGhazal')
+    Beyt = apps.get_model('faal', 'Beyt')
+    db = schema_editor.connection.alias
+    for pk, text in HafezGhazal.objects.using(db).values_list('pk', 'persian_text').iterator():
+        Beyt.objects.using(db).bulk_create(Beyt(**fields) for fields in beyt_fields(pk, text))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faal', '0003_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Beyt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('first_mesra', models.TextField()),
+                ('second_mesra', models.TextField(blank=True)),
+                ('tokens', models.TextField()),
+                ('token_offset', models.PositiveIntegerField()),
+                ('ghazal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='beyts', to='faal.hafezghazal')),
+            ],
+            options={
+                'ordering': ['ghazal_id', 'position'],
+                'constraints': [models.UniqueConstraint(fields=('ghazal', 'position'), name='faal_beyt_ghazal_position_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_beyts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The rollup triggers, and the backfill of faal.analytics as of this migration,
+# written out so later changes to the app code cannot change what it does.
+_COUNT_NEW = """
+INSERT INTO faal_ghazaldrawcount (date, ghazal_id, count) VALUES (NEW.date, NEW.ghazal_id, 1)
+    ON CONFLICT (date, ghazal_id) DO UPDATE SET count = count + 1;
+INSERT INTO faal_dailyfaalcount (date, count) VALUES (NEW.date, 1)
+    ON CONFLICT (date) DO UPDATE SET count = count + 1;
+"""
+_UNCOUNT_OLD = """
+UPDATE faal_ghazaldrawcount SET count = count - 1 WHERE date = OLD.date AND ghazal_id = OLD.ghazal_id;
+UPDATE faal_dailyfaalcount SET count = count - 1 WHERE date = OLD.date;
+"""
+TRIGGERS = {
+    'faal_udf_rollup_insert': f'AFTER INSERT ON faal_userdailyfaal BEGIN {_COUNT_NEW} END',
+    'faal_udf_rollup_delete': f'AFTER DELETE ON faal_userdailyfaal BEGIN {_UNCOUNT_OLD} END',
+    'faal_udf_rollup_update': (
+        f'AFTER UPDATE OF date, ghazal_id ON faal_userdailyfaal BEGIN {_UNCOUNT_OLD}{_COUNT_NEW} END'
+    ),
+}
+BACKFILL = [
+    'INSERT INTO faal_ghazaldrawcount (date, ghazal_id, count) '
+    'SELECT date, ghazal_id, COUNT(*) FROM faal_userdailyfaal GROUP BY date, ghazal_id',
+    'INSERT INTO faal_dailyfaalcount (date, count) SELECT date, COUNT(*) FROM faal_userdailyfaal GROUP BY date',
+]
+
+
+def create_rollup_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for name, body in TRIGGERS.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+        for statement in BACKFILL:
+            cursor.execute(statement)
+
+
+def drop_rollup_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faal', '0004_beyt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFaalCount',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GhazalDrawCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('ghazal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='faal.hafezghazal')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'ghazal'), name='faal_drawcount_date_ghazal_uniq')],
+            },
+        ),
+        migrations.RunPython(create_rollup_triggers, drop_rollup_triggers),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:10
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faal', '0005_analytics_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # auth_user belongs to django.contrib.auth, so its case-folded lookup
+    # indexes (faal.availability) are created here as plain SQL.
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX faal_user_username_lower_idx ON auth_user (LOWER(username))',
+            'DROP INDEX faal_user_username_lower_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX faal_user_email_lower_idx ON auth_user (LOWER(email))',
+            'DROP INDEX faal_user_email_lower_idx',
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-import random
+from .corpus import daily_quote, ghazal_index
+from .corpus_map import corpus_map, ghazal_instance
 
 class Quote(models.Model):
     text = models.TextField()
@@ -9,15 +10,25 @@ class Quote(models.Model):
     is_daily_quote = models.BooleanField(default=False)
     added_date = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Only the few curated rows, so get_daily_quote() never scans.
+            models.Index(fields=['id'], condition=models.Q(is_daily_quote=True), name='faal_quote_daily_idx'),
+            models.Index(fields=['author'], name='faal_quote_author_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.text[:50]}... - {self.author}"
     
     @classmethod
     def get_daily_quote(cls):
-        daily_quote = cls.objects.filter(is_daily_quote=True).first()
-        if daily_quote:
-            return daily_quote
-        return cls.objects.order_by('?').first()
+        # Rotates through the flagged quotes, or all of them if none are
+        # flagged, once per day in TIME_ZONE; see faal.corpus.DailyQuote.
+        return daily_quote.get()
+
+    @classmethod
+    async def aget_daily_quote(cls):
+        return await daily_quote.aget()
 
 class HafezGhazal(models.Model):
     ghazal_number = models.IntegerField(unique=True)
@@ -32,7 +43,10 @@ class HafezGhazal(models.Model):
     
     @classmethod
     def get_random_ghazal(cls):
-        return cls.objects.order_by('?').first()
+        mapped = corpus_map.get()
+        if mapped is not None and mapped.ghazal_count:
+            return ghazal_instance(mapped.random_ghazal())
+        return ghazal_index.random_object()
 
 class UserDailyFaal(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -41,6 +55,54 @@ class UserDailyFaal(models.Model):
     
     class Meta:
         unique_together = ('user', 'date')
+        indexes = [
+            # Date-first lookups: admin date filter, per-day history and exports.
+            models.Index(fields=['date', 'user'], name='faal_udf_date_user_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.date} - Ghazal {self.ghazal.ghazal_number}"
\ No newline at end of file
+        return f"{self.user.username} - {self.date} - Ghazal {self.ghazal.ghazal_number}"
+
+class Beyt(models.Model):
+    """One couplet of a ghazal; see ``faal.beyts``."""
+
+    ghazal = models.ForeignKey(HafezGhazal, on_delete=models.CASCADE, related_name='beyts')
+    position = models.PositiveSmallIntegerField()
+    first_mesra = models.TextField()
+    second_mesra = models.TextField(blank=True)
+    # search.normalize()d words of both mesras, and how many of the ghazal's words precede them.
+    tokens = models.TextField()
+    token_offset = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['ghazal_id', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['ghazal', 'position'], name='faal_beyt_ghazal_position_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Ghazal {self.ghazal_id} beyt {self.position}"
+
+class GhazalDrawCount(models.Model):
+    """How many faals drew each ghazal on each day; maintained by faal.analytics triggers."""
+
+    date = models.DateField()
+    ghazal = models.ForeignKey(HafezGhazal, on_delete=models.CASCADE, related_name='+')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'ghazal'], name='faal_drawcount_date_ghazal_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - Ghazal {self.ghazal_id}: {self.count}"
+
+class DailyFaalCount(models.Model):
+    """Faals assigned on each day, which is also that day's faal users."""
+
+    date = models.DateField(primary_key=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.count}"
@@ -0,0 +1,84 @@
+"""
+Rendered-page cache for the anonymous, corpus-only pages.
+
+``homepage``, ``ghazals_list`` and ``quotes_list`` only change with the
+corpus, so for anonymous visitors the whole rendered response is kept in the
+default cache under the corpus version and the active language. A corpus
+change bumps the version from the model signals, so stale pages are simply
+never looked up again. A cache hit skips the view entirely: no query and no
+template pass.
+
+``prerender_pages`` writes the same pages, with gzip (and brotli, when the
+``brotli`` package is installed) variants, to ``FAAL_PRERENDER_DIR`` at deploy
+time for a front-end server to serve as static files.
+"""
+
+import functools
+import gzip
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone, translation
+
+from .corpus import corpus_version
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGE_TIMEOUT = 24 * 60 * 60
+
+
+def page_cache_key(name, language=None, variant=''):
+    language = language or translation.get_language()
+    return f'faal:rendered:{name}:{corpus_version()}:{language}:{variant}'
+
+
+def daily_variant(request):
+    # The homepage shows the quote of the day, so it also turns over daily.
+    return timezone.localdate().isoformat()
+
+
+def _cacheable(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # A rendered {% csrf_token %} ties the page to this visitor's cookie.
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def cached_page(name, variant=None):
+    """Serve the view's response from the page cache for anonymous GET/HEAD requests.
+
+    ``variant(request)`` adds to the key for pages that change on more than
+    the corpus, like the homepage's quote of the day.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated or request.GET:
+                return view(request, *args, **kwargs)
+            key = page_cache_key(name, variant=variant(request) if variant else '')
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+            if _cacheable(request, response):
+                cache.set(key, (response.content, response['Content-Type']), PAGE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def compressed_variants(content):
+    """``{extension: bytes}`` of the precompressed forms a static server can pick from."""
+    variants = {'gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, quality=11)
+    return variants
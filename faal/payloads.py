@@ -0,0 +1,156 @@
+"""
+Pre-rendered JSON for ghazals.
+
+A ghazal's serialized form only changes with the corpus, yet every dashboard
+response used to rebuild it through ``HafezGhazalSerializer``. The rendered
+bytes are read from the shared corpus map (``faal.corpus_map``) or, without
+one, kept per worker keyed by corpus version and ghazal id, and spliced into
+responses as-is.
+"""
+
+import threading
+
+from rest_framework.renderers import JSONRenderer
+
+from .assignment import MESSAGE_NO_GHAZALS
+from .corpus import corpus_version
+from .corpus_map import corpus_map
+from .metrics import serializer_timer
+from .models import HafezGhazal, UserDailyFaal
+from .serializers import HafezGhazalSerializer
+
+renderer = JSONRenderer()
+
+# Stand-in value rendered in place of the ghazal, then swapped for the cached
+# bytes. It renders as "\u0000ghazal\u0000", which no real field can produce.
+_GHAZAL_SLOT = '\x00ghazal\x00'
+_GHAZAL_SLOT_BYTES = renderer.render(_GHAZAL_SLOT)
+SLOT = _GHAZAL_SLOT
+
+
+def splice(data, raw):
+    """Render ``data`` with the ``SLOT`` value in it replaced by the JSON bytes ``raw``."""
+    return renderer.render(data).replace(_GHAZAL_SLOT_BYTES, raw, 1)
+
+
+class GhazalPayloadCache:
+    """``HafezGhazalSerializer`` output as JSON bytes, keyed by (corpus version, ghazal id)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._payloads = {}
+        self._version = None
+
+    def _current_version(self):
+        version = corpus_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._payloads = {}
+                    self._version = version
+        return version
+
+    def _mapped(self, ghazal_id):
+        mapped = corpus_map.get()
+        return mapped.ghazal_payload(ghazal_id) if mapped is not None else None
+
+    def get(self, ghazal_id, ghazal=None):
+        payload = self._mapped(ghazal_id)
+        if payload is not None:
+            return payload
+        key = (self._current_version(), ghazal_id)
+        payload = self._payloads.get(key)
+        if payload is None:
+            if ghazal is None:
+                ghazal = HafezGhazal.objects.filter(pk=ghazal_id).first()
+                if ghazal is None:
+                    return None
+            payload = renderer.render(HafezGhazalSerializer(ghazal).data)
+            self._payloads[key] = payload
+        return payload
+
+    async def aget(self, ghazal_id, ghazal=None):
+        """``get()`` for async code: a miss loads the ghazal with the async ORM."""
+        payload = self._mapped(ghazal_id) or self._payloads.get((self._current_version(), ghazal_id))
+        if payload is not None:
+            return payload
+        if ghazal is None:
+            ghazal = await HafezGhazal.objects.filter(pk=ghazal_id).afirst()
+            if ghazal is None:
+                return None
+        return self.get(ghazal_id, ghazal)
+
+    def invalidate(self):
+        with self._lock:
+            self._payloads = {}
+            self._version = None
+
+
+ghazal_payloads = GhazalPayloadCache()
+
+
+def _loaded_ghazal(faal):
+    return faal.ghazal if UserDailyFaal.ghazal.is_cached(faal) else None
+
+
+@serializer_timer()
+def render_daily_faal(faal, payload=None):
+    """Render a ``UserDailyFaal`` exactly like ``UserDailyFaalSerializer`` would."""
+    if payload is None:
+        payload = ghazal_payloads.get(faal.ghazal_id, _loaded_ghazal(faal))
+    if payload is None:
+        return None
+    envelope = renderer.render({
+        'id': faal.pk,
+        'ghazal': _GHAZAL_SLOT,
+        'date': faal.date.isoformat(),
+        'user': faal.user_id,
+    })
+    return envelope.replace(_GHAZAL_SLOT_BYTES, payload, 1)
+
+
+def dashboard_ghazal(daily_faal):
+    """``(ghazal, available, message)`` for the server-rendered dashboard.
+
+    A deterministic assignment only carries ``ghazal_id``. When that ghazal has
+    been deleted since, this answers like ``render_dashboard()`` instead of
+    raising ``DoesNotExist``.
+    """
+    if not daily_faal.faal:
+        return None, daily_faal.available, daily_faal.message
+    try:
+        return daily_faal.faal.ghazal, daily_faal.available, daily_faal.message
+    except HafezGhazal.DoesNotExist:
+        return None, False, MESSAGE_NO_GHAZALS
+
+
+@serializer_timer()
+def render_dashboard(daily_faal, payload=None):
+    """Render the ``user_dashboard`` body, splicing in the cached ghazal payload."""
+    faal_bytes = render_daily_faal(daily_faal.faal, payload) if daily_faal.faal else None
+    if daily_faal.faal and faal_bytes is None:
+        # The ghazal vanished between assignment and rendering.
+        return renderer.render({'faal': None, 'faal_available': False, 'message': MESSAGE_NO_GHAZALS})
+    if faal_bytes is None:
+        return renderer.render({
+            'faal': None,
+            'faal_available': daily_faal.available,
+            'message': daily_faal.message,
+        })
+    envelope = renderer.render({
+        'faal': _GHAZAL_SLOT,
+        'faal_available': daily_faal.available,
+        'message': daily_faal.message,
+    })
+    return envelope.replace(_GHAZAL_SLOT_BYTES, faal_bytes, 1)
+
+
+async def arender_dashboard(daily_faal):
+    """``render_dashboard()`` for async views; the ghazal payload is fetched without blocking."""
+    payload = None
+    if daily_faal.faal:
+        faal = daily_faal.faal
+        payload = await ghazal_payloads.aget(faal.ghazal_id, _loaded_ghazal(faal))
+        if payload is None:
+            return renderer.render({'faal': None, 'faal_available': False, 'message': MESSAGE_NO_GHAZALS})
+    return render_dashboard(daily_faal, payload)
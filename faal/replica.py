@@ -0,0 +1,272 @@
+"""
+Read-only corpus snapshot and the router that sends corpus reads to it.
+
+``HafezGhazal``, ``Beyt`` and ``Quote`` only change through the admin and
+the import commands, yet their reads share the ``default`` database with
+every faal, session and user write. ``build_snapshot()`` copies the corpus tables, with
+their indexes, into ``FAAL_CORPUS_SNAPSHOT``. The ``corpus`` database alias
+opens that file with ``mode=ro&immutable=1``, so SQLite takes no locks and
+skips change detection for it. ``CorpusReplicaRouter`` sends corpus reads
+there. All writes, and everything else, stay on ``default``.
+
+The snapshot file is never modified in place. A new one is written next to
+it and swapped in with ``os.replace()``. Each worker thread checks the file
+at the start of every request and reconnects when it has been replaced.
+
+A corpus change unlinks the snapshot straight away, so every worker falls
+back to ``default`` until the rebuild lands, and again once it commits.
+The rebuild runs in the background once the changes have been quiet for
+``FAAL_CORPUS_SNAPSHOT_DELAY`` seconds, so an admin bulk edit costs one copy.
+``migrate`` rebuilds it, and so does ``manage.py build_corpus_snapshot`` at
+deploy time.
+
+A build in one worker can read the rows from before another worker's change
+and finish after that change was committed. Each build notes the corpus
+version before reading, and ``swap_in()`` throws it away if the version has
+moved since (see there for the narrow case the check alone misses).
+"""
+
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from .corpus import bump_corpus_version, corpus_version
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'corpus'
+CORPUS_MODELS = ('faal.HafezGhazal', 'faal.Quote', 'faal.Beyt')
+
+_local = threading.local()
+
+
+def snapshot_path():
+    return getattr(settings, 'FAAL_CORPUS_SNAPSHOT', None)
+
+
+def enabled():
+    """Whether the ``corpus`` alias opens the snapshot of the database ``default`` is using.
+
+    Under the test runner the alias mirrors ``default``, and test or scratch
+    databases are not ``FAAL_CORPUS_SNAPSHOT_SOURCE``.
+    """
+    path = snapshot_path()
+    return (
+        bool(path)
+        and str(path) in str(connections.databases.get(REPLICA_ALIAS, {}).get('NAME', ''))
+        and str(connections.databases['default']['NAME']) == str(getattr(settings, 'FAAL_CORPUS_SNAPSHOT_SOURCE', ''))
+    )
+
+
+def corpus_tables():
+    return [apps.get_model(label)._meta.db_table for label in CORPUS_MODELS]
+
+
+def build_snapshot(path=None, source=None):
+    """Copy the corpus tables from ``default`` into a new snapshot and swap it in.
+
+    Returns the snapshot's path, or ``None`` when the corpus changed during
+    the copy and the snapshot was thrown away.
+    """
+    path = str(path or snapshot_path())
+    source = str(source or connections['default'].settings_dict['NAME'])
+    version = corpus_version()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        target = sqlite3.connect(f'file:{tmp_path}', uri=True, isolation_level=None)
+        try:
+            target.execute('ATTACH DATABASE ? AS source', (f'file:{source}?mode=ro',))
+            # One read transaction, so every table comes from the same commit.
+            target.execute('BEGIN')
+            for table in corpus_tables():
+                schema = target.execute(
+                    "SELECT type, sql FROM source.sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL "
+                    "ORDER BY type = 'index'",
+                    (table,),
+                ).fetchall()
+                for kind, sql in schema:
+                    target.execute(sql)
+                    if kind == 'table':
+                        target.execute(f'INSERT INTO main."{table}" SELECT * FROM source."{table}"')
+            target.execute('COMMIT')
+            target.execute('DETACH DATABASE source')
+            target.execute('ANALYZE')
+        finally:
+            target.close()
+        return swap_in(tmp_path, path, version)
+    except BaseException:
+        remove(tmp_path)
+        raise
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def swap_in(tmp_path, path, version):
+    """Move a finished build to ``path`` unless the corpus moved on from ``version``.
+
+    A change committed in another worker moves the version and then removes
+    ``path``. If that lands between the check and ``os.replace()``, the build
+    is removed again and the version moved once more, so nothing another
+    worker cached from it in between is kept.
+    """
+    if corpus_version() != version:
+        remove(tmp_path)
+        return None
+    os.replace(tmp_path, path)
+    if corpus_version() != version:
+        remove(path)
+        bump_corpus_version()
+        return None
+    return path
+
+
+class SnapshotBuilder:
+    """Runs ``build`` in the background once corpus changes settle.
+
+    ``discard`` removes the built file. ``invalidate()`` runs it between
+    builds, so a build in this process that read the data before a change
+    can never land after it. Builds in other processes are checked against
+    the corpus version by ``swap_in()``.
+    """
+
+    def __init__(self, build, discard, delay=1.0):
+        self.build = build
+        self.discard = discard
+        self.delay = delay
+        self._build_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = False
+        self._thread = None
+
+    def schedule(self):
+        with self._lock:
+            self._pending = True
+            self._wake.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='faal-snapshot', daemon=True)
+                self._thread.start()
+
+    def invalidate(self):
+        """Drop the built file and schedule a rebuild."""
+        with self._build_lock:
+            self.discard()
+        self.schedule()
+
+    def flush(self):
+        """Build now if a rebuild is still waiting."""
+        with self._build_lock:
+            with self._lock:
+                pending, self._pending = self._pending, False
+            if pending:
+                self.build()
+        return pending
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            # Wait for a quiet period: every new change restarts the delay.
+            while self._wake.wait(self.delay):
+                self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to rebuild the corpus snapshot')
+            finally:
+                connections['default'].close()
+
+
+builder = SnapshotBuilder(
+    build_snapshot, lambda: remove(snapshot_path()), delay=getattr(settings, 'FAAL_CORPUS_SNAPSHOT_DELAY', 1.0)
+)
+atexit.register(lambda: enabled() and builder.flush())
+
+
+def _close_replica():
+    if REPLICA_ALIAS in connections:
+        connections[REPLICA_ALIAS].close()
+
+
+def refresh():
+    """Reconnect this thread's replica if the snapshot was replaced or removed."""
+    try:
+        inode = os.stat(snapshot_path()).st_ino
+    except OSError:
+        inode = None
+    if inode != getattr(_local, 'inode', None):
+        _close_replica()
+        _local.inode = inode
+    _local.available = inode is not None
+    return _local.available
+
+
+def available():
+    state = getattr(_local, 'available', None)
+    return refresh() if state is None else state
+
+
+def invalidate():
+    """Stop reading the snapshot everywhere and rebuild it.
+
+    The rebuild is scheduled straight away, so a rolled back change still
+    gets its snapshot back. After a commit the snapshot is dropped and
+    rebuilt again, in case that rebuild read the rows before the change.
+    """
+    if not enabled():
+        return
+    builder.invalidate()
+    _close_replica()
+    _local.inode = None
+    _local.available = False
+    transaction.on_commit(builder.invalidate)
+
+
+@receiver(request_started)
+def refresh_replica(sender, **kwargs):
+    if enabled():
+        refresh()
+
+
+@receiver(post_migrate)
+def rebuild_after_migrate(sender, using='default', **kwargs):
+    # Migrations can add corpus tables or change their rows and schema.
+    if sender.name == 'faal' and using == 'default' and enabled():
+        build_snapshot()
+
+
+class CorpusReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Historical models in data migrations must read the database being migrated.
+        if model._meta.apps is not apps:
+            return None
+        if model._meta.label in CORPUS_MODELS and enabled() and available():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        # An instance read from the replica would otherwise be saved back to it.
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same rows, so faals may point at replica ghazals.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
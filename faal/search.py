@@ -0,0 +1,226 @@
+"""
+Full-text search over the ghazals.
+
+Ghazals are indexed in the SQLite FTS5 table ``faal_ghazal_search`` (created
+by migration ``0002``), keyed by ``HafezGhazal.id``. Both the indexed text and
+incoming queries go through ``normalize()`` so that spelling variants that are
+common in typed Persian still match:
+
+* Arabic yeh/alef maksura and kaf fold to Persian yeh and kaf,
+* hamza-carrying alefs, teh marbuta and heh with yeh fold to their base letter,
+* harakat, tanwin, superscript alef and tatweel are dropped,
+* ZWNJ is removed, so "می‌روم" and "میروم" are the same word,
+* Persian and Arabic-Indic digits fold to ASCII digits.
+
+The index is kept current by the ``HafezGhazal`` signals; ``rebuild_index()``
+re-creates it after bulk loads that bypass signals.
+
+The index only holds folded text, so result snippets are cut from the stored
+``persian_text`` and ``english_translation`` instead (``snippet()``), with
+words matched on their folded form.
+"""
+
+import re
+
+from django.db import connection, transaction
+
+SEARCH_TABLE = 'faal_ghazal_search'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+SNIPPET_TOKENS = 12
+MAX_RESULTS = 100
+
+_FOLD = {
+    '\u064a': '\u06cc',  # Arabic yeh -> Persian yeh
+    '\u0649': '\u06cc',  # alef maksura -> Persian yeh
+    '\u0643': '\u06a9',  # Arabic kaf -> Persian kaf
+    '\u0623': '\u0627',  # alef with hamza above -> alef
+    '\u0625': '\u0627',  # alef with hamza below -> alef
+    '\u0671': '\u0627',  # alef wasla -> alef
+    '\u0629': '\u0647',  # teh marbuta -> heh
+    '\u06c0': '\u0647',  # heh with yeh above -> heh
+    '\u200c': None,  # zero-width non-joiner
+    '\u200d': None,  # zero-width joiner
+    '\u0640': None,  # tatweel
+    '\u0670': None,  # superscript alef
+}
+_FOLD.update({chr(code): None for code in range(0x064B, 0x0660)})  # harakat
+_FOLD.update({chr(0x06F0 + digit): str(digit) for digit in range(10)})  # Persian digits
+_FOLD.update({chr(0x0660 + digit): str(digit) for digit in range(10)})  # Arabic-Indic digits
+_FOLD_TABLE = str.maketrans(_FOLD)
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Fold Persian/Arabic spelling variants so indexed text and queries agree."""
+    return (text or '').translate(_FOLD_TABLE).casefold()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def build_match(query, column=None):
+    """Turn free text into an FTS5 MATCH expression of prefix terms, or None."""
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    terms = ' '.join(f'"{token}"*' for token in tokens)
+    if column:
+        return f'{column} : ({terms})'
+    return terms
+
+
+def index_rows(cursor, rows, replace=True):
+    """Insert or replace ``(id, persian_text, english_translation)`` rows in the index."""
+    rows = [(pk, normalize(persian), normalize(english)) for pk, persian, english in rows]
+    if replace:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+    cursor.executemany(
+        f'INSERT INTO {SEARCH_TABLE} (rowid, persian_text, english_translation) VALUES (%s, %s, %s)',
+        rows,
+    )
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def index_ghazal(ghazal):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        index_rows(cursor, [(ghazal.pk, ghazal.persian_text, ghazal.english_translation)])
+
+
+def remove_ghazal(ghazal_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [ghazal_id])
+
+
+def rebuild_index(batch_size=2000):
+    """Re-index every ghazal; use after loads that bypass model signals."""
+    from .models import HafezGhazal
+
+    if not is_available():
+        return 0
+    count = 0
+    rows = HafezGhazal.objects.order_by('pk').values_list('pk', 'persian_text', 'english_translation')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                index_rows(cursor, batch, replace=False)
+                count += len(batch)
+                batch = []
+        if batch:
+            index_rows(cursor, batch, replace=False)
+            count += len(batch)
+    return count
+
+
+def _folded_with_origins(text):
+    """``normalize(text)`` and, for each of its characters, the index in ``text`` it came from."""
+    folded, origins = [], []
+    for index, char in enumerate(text):
+        char = normalize(char)
+        folded.append(char)
+        origins.extend([index] * len(char))
+    return ''.join(folded), origins
+
+
+def snippet(text, terms, size=SNIPPET_TOKENS):
+    """About ``size`` words of ``text`` around the most prefix matches of ``terms``, highlighted.
+
+    Like FTS5's ``snippet()``, but cut from the original text, so it keeps the
+    spelling the ghazal is stored with.
+    """
+    text = text or ''
+    folded, origins = _folded_with_origins(text)
+    prefixes = tuple(terms)
+    words = [
+        (origins[word.start()], origins[word.end() - 1] + 1, bool(prefixes) and word.group().startswith(prefixes))
+        for word in _TOKEN_RE.finditer(folded)
+    ]
+    if not words:
+        return ''
+    matches = [sum(matched for _, _, matched in words[start:start + size]) for start in range(len(words))]
+    first = matches.index(max(matches[:max(1, len(words) - size + 1)]))
+    window = words[first:first + size]
+    parts = ['…' if first else '']
+    position = window[0][0]
+    for begin, end, matched in window:
+        parts.append(text[position:begin])
+        parts.append(f'{HIGHLIGHT_START}{text[begin:end]}{HIGHLIGHT_END}' if matched else text[begin:end])
+        position = end
+    if first + size < len(words):
+        parts.append('…')
+    return ''.join(parts)
+
+
+def search(query, column=None, limit=20):
+    """Ranked matches as dicts with ``id``, ``ghazal_number``, ``score`` and snippets.
+
+    ``column`` restricts matching to ``persian_text`` or ``english_translation``.
+    """
+    match = build_match(query, column)
+    if match is None:
+        return []
+    limit = max(1, min(limit, MAX_RESULTS))
+    if not is_available():
+        return _like_search(query, column, limit)
+
+    sql = (
+        f'SELECT g.id, g.ghazal_number, bm25({SEARCH_TABLE}, 1.0, 0.5) AS score, '
+        f'g.persian_text, g.english_translation '
+        f'FROM {SEARCH_TABLE} JOIN faal_hafezghazal g ON g.id = {SEARCH_TABLE}.rowid '
+        f'WHERE {SEARCH_TABLE} MATCH %s ORDER BY score LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit])
+        rows = cursor.fetchall()
+    terms = tokenize(query)
+    persian_terms = terms if column in (None, 'persian_text') else ()
+    english_terms = terms if column in (None, 'english_translation') else ()
+    return [
+        {
+            'id': pk,
+            'ghazal_number': number,
+            # bm25() is lower-is-better; flip it so clients can sort descending.
+            'score': round(-score, 4),
+            'persian_snippet': snippet(persian, persian_terms),
+            'english_snippet': snippet(english, english_terms),
+        }
+        for pk, number, score, persian, english in rows
+    ]
+
+
+def matching_ids(query, column=None, limit=MAX_RESULTS):
+    return [result['id'] for result in search(query, column, limit)]
+
+
+def _like_search(query, column, limit):
+    from django.db.models import Q
+
+    from .models import HafezGhazal
+
+    columns = [column] if column else ['persian_text', 'english_translation']
+    condition = Q()
+    for field in columns:
+        condition |= Q(**{f'{field}__icontains': query})
+    ghazals = HafezGhazal.objects.filter(condition)[:limit]
+    return [
+        {
+            'id': ghazal.pk,
+            'ghazal_number': ghazal.ghazal_number,
+            'score': 0.0,
+            'persian_snippet': ghazal.persian_text[:200],
+            'english_snippet': ghazal.english_translation[:200],
+        }
+        for ghazal in ghazals
+    ]
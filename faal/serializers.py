@@ -1,8 +1,22 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Quote, HafezGhazal, UserDailyFaal
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from . import availability
+from .metrics import serializer_timer
+from .models import Beyt, Quote, HafezGhazal, UserDailyFaal
 
-class UserSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """Counts ``.data`` towards the request's serializer time in ``faal.metrics``."""
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'date_joined']
@@ -16,14 +30,13 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         fields = ['username', 'email', 'password', 'password2']
         extra_kwargs = {
             'email': {'required': True},
-            'username': {'required': True},
+            # Without the model's UniqueValidator: validate() checks both fields in one query.
+            'username': {'required': True, 'validators': [UnicodeUsernameValidator()]},
         }
     
     def validate_email(self, value):
         if not value:
             raise serializers.ValidationError("ایمیل الزامی است")
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("این ایمیل قبلاً استفاده شده است")
         return value
     
     def validate_username(self, value):
@@ -31,8 +44,6 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("نام کاربری الزامی است")
         if len(value) < 3:
             raise serializers.ValidationError("نام کاربری باید حداقل ۳ کاراکتر باشد")
-        if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError("این نام کاربری قبلاً گرفته شده است")
         return value
     
     def validate_password(self, value):
@@ -43,8 +54,12 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return value
     
     def validate(self, attrs):
+        taken = availability.taken(username=attrs.get('username'), email=attrs.get('email'))
+        errors = {field: availability.MESSAGES[field] for field in taken}
         if attrs.get('password') != attrs.get('password2'):
-            raise serializers.ValidationError({"password2": "رمز عبور و تکرار آن یکسان نیستند"})
+            errors["password2"] = "رمز عبور و تکرار آن یکسان نیستند"
+        if errors:
+            raise serializers.ValidationError(errors)
         return attrs
     
     def create(self, validated_data):
@@ -53,19 +68,30 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class QuoteSerializer(serializers.ModelSerializer):
+class QuoteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Quote
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
 
-class HafezGhazalSerializer(serializers.ModelSerializer):
+class HafezGhazalSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = HafezGhazal
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
+
+class BeytSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    ghazal_number = serializers.IntegerField(source='ghazal.ghazal_number')
 
-class UserDailyFaalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Beyt
+        fields = ['ghazal_number', 'position', 'first_mesra', 'second_mesra']
+        list_serializer_class = TimedListSerializer
+
+class UserDailyFaalSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     ghazal = HafezGhazalSerializer(read_only=True)
     
     class Meta:
         model = UserDailyFaal
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        list_serializer_class = TimedListSerializer
\ No newline at end of file
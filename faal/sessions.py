@@ -0,0 +1,92 @@
+"""
+Cached sessions that only write to the database when something changed.
+
+With ``SESSION_SAVE_EVERY_REQUEST = True`` the stock backends rewrite the
+``django_session`` row on every authenticated request just to slide its
+expiry, which competes with faal writes for the SQLite lock. This backend
+keeps the session in ``SESSION_CACHE_ALIAS`` (a cache shared by all workers)
+and writes through to the database only when:
+
+* the session data or expiry was modified, or
+* the expiry stored in the database has less than
+  ``SESSION_DB_REFRESH_RATIO`` of the session age left.
+
+Unmodified requests only refresh the cache entry, so the sliding expiry is
+kept without rewriting the row. The database row can trail the cookie by up
+to that fraction of the session age, which only matters if the cache is lost.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.utils import timezone
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = 'faal.sessions'
+
+    @property
+    def db_expiry_key(self):
+        return self.cache_key + ':db-expiry'
+
+    def load(self):
+        try:
+            data = self._cache.get(self.cache_key)
+        except Exception:
+            data = None
+        if data is None:
+            session = self._get_session_from_db()
+            if session:
+                data = self.decode(session.session_data)
+                self._cache.set(self.cache_key, data, self.get_expiry_age(expiry=session.expire_date))
+                self._remember_db_expiry(session.expire_date)
+            else:
+                data = {}
+        return data
+
+    async def aload(self):
+        # Async views (request.auser()) read the session here; keep the
+        # db-expiry bookkeeping identical to load().
+        cache_key = await self.acache_key()
+        try:
+            data = await self._cache.aget(cache_key)
+        except Exception:
+            data = None
+        if data is None:
+            session = await self._aget_session_from_db()
+            if session:
+                data = self.decode(session.session_data)
+                age = self.get_expiry_age(expiry=session.expire_date)
+                await self._cache.aset(cache_key, data, age)
+                await self._cache.aset(cache_key + ':db-expiry', session.expire_date, age)
+            else:
+                data = {}
+        return data
+
+    def _remember_db_expiry(self, expire_date):
+        self._cache.set(self.db_expiry_key, expire_date, self.get_expiry_age(expiry=expire_date))
+
+    def _db_needs_refresh(self):
+        db_expiry = self._cache.get(self.db_expiry_key)
+        if db_expiry is None:
+            return True
+        ratio = getattr(settings, 'SESSION_DB_REFRESH_RATIO', 0.5)
+        remaining = db_expiry - timezone.now()
+        return remaining < timedelta(seconds=self.get_expiry_age() * ratio)
+
+    def save(self, must_create=False):
+        if must_create or self.modified or self._session_key is None or self._db_needs_refresh():
+            super().save(must_create)
+            self._remember_db_expiry(self.get_expiry_date())
+            return
+        # Unchanged session: slide the expiry in the cache only. touch() also
+        # avoids the file cache's directory scan that set() does for culling.
+        if not self._cache.touch(self.cache_key, self.get_expiry_age()):
+            self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        super().delete(session_key)
+        if key:
+            self._cache.delete(self.cache_key_prefix + key + ':db-expiry')
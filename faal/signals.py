@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import beyts, corpus, replica, search
+from .availability import availability_filter
+from .corpus_map import corpus_map
+from .payloads import ghazal_payloads
+from .models import HafezGhazal, Quote
+
+
+@receiver(post_save, sender=HafezGhazal)
+@receiver(post_delete, sender=HafezGhazal)
+@receiver(post_save, sender=Quote)
+@receiver(post_delete, sender=Quote)
+def corpus_changed(sender, **kwargs):
+    corpus.bump_corpus_version()
+    # Other workers may reload before the commit; move the version again once it lands.
+    transaction.on_commit(corpus.bump_corpus_version)
+    corpus.ghazal_index.invalidate()
+    corpus.quote_index.invalidate()
+    corpus.ghazal_pool.invalidate()
+    corpus.quote_pool.invalidate()
+    corpus.daily_quote.invalidate()
+    ghazal_payloads.invalidate()
+    replica.invalidate()
+    corpus_map.invalidate()
+
+
+@receiver(post_save, sender=HafezGhazal)
+def index_ghazal(sender, instance, **kwargs):
+    search.index_ghazal(instance)
+
+
+@receiver(post_save, sender=HafezGhazal)
+def split_beyts(sender, instance, **kwargs):
+    beyts.index_ghazal(instance)
+
+
+@receiver(post_delete, sender=HafezGhazal)
+def unindex_ghazal(sender, instance, **kwargs):
+    search.remove_ghazal(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def remember_user(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login alone; only new or renamed users change the filter.
+    if update_fields is None or {'username', 'email'} & set(update_fields):
+        availability_filter.add(instance)
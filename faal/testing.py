@@ -0,0 +1,40 @@
+"""
+Test runner that keeps the suite out of the checkout's ``.cache``.
+
+Workers running from the same checkout share files under ``BASE_DIR/.cache``,
+so a test that bumps the corpus version there would clear their caches. The
+runner points those settings at a temporary directory for the whole run.
+"""
+
+import os
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def scratch_settings(directory):
+    """The settings that name shared files, pointed into ``directory``."""
+    return {
+        'FAAL_CORPUS_VERSION_FILE': os.path.join(directory, 'corpus.version'),
+        'FAAL_METRICS_DIR': os.path.join(directory, 'metrics'),
+        'FAAL_THROTTLE_DB': os.path.join(directory, 'throttle.sqlite3'),
+        'CACHES': {
+            **settings.CACHES,
+            'sessions': {**settings.CACHES['sessions'], 'LOCATION': os.path.join(directory, 'sessions')},
+        },
+    }
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._scratch = tempfile.TemporaryDirectory(prefix='faal-test-')
+        self._scratch_settings = override_settings(**scratch_settings(self._scratch.name))
+        self._scratch_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._scratch_settings.disable()
+        self._scratch.cleanup()
+        super().teardown_test_environment(**kwargs)
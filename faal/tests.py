@@ -1,3 +1,1483 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.migrations.state import ProjectState
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, clear_url_caches, path, resolve, reverse
+from django.utils import timezone
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from rest_framework.renderers import JSONRenderer
+
+from . import (
+    analytics, api_urls, assignment, async_api_views, audio, availability, beyts, corpus, corpus_map, db, frontend,
+    metrics, pages, payloads, replica, search, sessions, testing, throttling, urls,
+)
+from .benchmarks import ROUTES, SAMPLE_PERSIAN_TEXT
+from .coalescing import SingleFlight
+from .hashing import HashingPool, PooledHasherMixin
+from .models import Beyt, DailyFaalCount, GhazalDrawCount, HafezGhazal, Quote, UserDailyFaal
+from .serializers import UserDailyFaalSerializer, UserRegistrationSerializer
+from .signals import corpus_changed
+
+PAGE_TEMPLATES = {
+    'faal/homepage.html': '{{ quote.text }}',
+    'faal/dashboard.html': '{{ ghazal.ghazal_number }} {{ message }}',
+    'faal/ghazals.html': '{% for ghazal in ghazals %}{{ ghazal.ghazal_number }}{% endfor %}',
+    'faal/quotes.html': '{% for quote in quotes %}{{ quote.text }}{% endfor %}',
+    'registration/register.html': '{{ form }}',
+}
+PAGE_TEMPLATE_SETTINGS = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {
+        'loaders': [('django.template.loaders.locmem.Loader', PAGE_TEMPLATES)],
+        'context_processors': ['django.contrib.auth.context_processors.auth'],
+    },
+}]
+
+
+class HotQueryPlanTests(TestCase):
+    """Every hot lookup must be answered from an index, never a full table scan."""
+
+    # Scanning a partial index only visits the rows matching its condition.
+    partial_indexes = ('faal_quote_daily_idx',)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        cls.ghazal = HafezGhazal.objects.create(ghazal_number=1, persian_text='الا یا ایها الساقی')
+        cls.today = datetime.date(2026, 1, 1)
+        UserDailyFaal.objects.create(user=cls.user, ghazal=cls.ghazal, date=cls.today)
+        Quote.objects.create(text='text', author='Hafez', is_daily_quote=True)
+
+    def hot_queries(self):
+        return {
+            'dashboard faal': UserDailyFaal.objects.select_related('ghazal').filter(
+                user=self.user, date=self.today
+            ),
+            'daily quote': Quote.objects.filter(is_daily_quote=True).order_by('pk')[:1],
+            'admin faal date filter': UserDailyFaal.objects.filter(date=self.today),
+            'admin quote author filter': Quote.objects.filter(author='Hafez'),
+            'ghazal by pk': HafezGhazal.objects.filter(pk=self.ghazal.pk),
+            'ghazal by number': HafezGhazal.objects.filter(ghazal_number=1),
+            'ghazal page': HafezGhazal.objects.order_by('ghazal_number').filter(ghazal_number__gt=0)[:51],
+            'quote page': Quote.objects.order_by('id').filter(id__gt=0)[:51],
+            'user by folded username or email': availability.matching_users('Reader', 'Reader@Example.com'),
+        }
+
+    def test_hot_queries_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite specific')
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                scans = [
+                    line for line in plan.splitlines()
+                    if re.search(r'\bSCAN\b', line)
+                    and not any(index in line for index in self.partial_indexes)
+                ]
+                self.assertEqual(scans, [], f'{name} falls back to a full scan:\n{plan}')
+
+
+class CorpusVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text=f'غزل {number}') for number in (1, 2)
+        )
+        Quote.objects.bulk_create([Quote(text='سخن', author='Hafez')])
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'corpus.version')
+        patcher = override_settings(FAAL_CORPUS_VERSION_FILE=self.path)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        cache.clear()
+
+    def change_in_another_worker(self):
+        """New rows plus a newer version file, and no signal in this process."""
+        HafezGhazal.objects.bulk_create([HafezGhazal(ghazal_number=9, persian_text='غزل 9')])
+        HafezGhazal.objects.filter(ghazal_number=1).update(english_translation='revised')
+        Quote.objects.bulk_create([Quote(text='سخن تازه', author='Hafez')])
+        later = (corpus.corpus_version() + 1000) * 1_000_000
+        os.utime(self.path, ns=(later, later))
+
+    def test_versions_only_move_forward(self):
+        first = corpus.bump_corpus_version()
+        second = corpus.bump_corpus_version()
+        self.assertGreater(second, first)
+        self.assertEqual(corpus.corpus_version(), second)
+
+    def test_caches_miss_after_a_change_in_another_worker(self):
+        ghazal = HafezGhazal.objects.get(ghazal_number=1)
+        url = reverse('api_ghazals')
+        before = self.client.get(url)
+        self.assertEqual(len(corpus.ghazal_index.get()), 2)
+        self.assertEqual(corpus.ghazal_pool.get().numbers, (1, 2))
+        self.assertEqual(len(corpus.quote_pool.get()), 1)
+        payloads.ghazal_payloads.get(ghazal.pk)
+
+        self.change_in_another_worker()
+        self.assertEqual(len(corpus.ghazal_index.get()), 3)
+        self.assertEqual(corpus.ghazal_pool.get().numbers, (1, 2, 9))
+        self.assertEqual(len(corpus.quote_pool.get()), 2)
+        self.assertEqual(json.loads(payloads.ghazal_payloads.get(ghazal.pk))['english_translation'], 'revised')
+        after = self.client.get(url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual([row['ghazal_number'] for row in after.json()], [1, 2, 9])
+
+    def test_saves_move_the_version_again_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Quote.objects.create(text='سخن نو', author='Hafez')
+        self.assertIn(corpus.bump_corpus_version, callbacks)
+
+
+class TestRunnerTests(SimpleTestCase):
+    def test_shared_files_are_kept_out_of_the_checkout(self):
+        cache_dir = str(settings.BASE_DIR / '.cache')
+        paths = [
+            settings.FAAL_CORPUS_VERSION_FILE,
+            settings.CACHES['sessions']['LOCATION'],
+            settings.FAAL_THROTTLE_DB,
+            settings.FAAL_METRICS_DIR,
+        ]
+        for path in paths:
+            self.assertFalse(str(path).startswith(cache_dir), path)
+
+
+# 08:30 on 1 January in Tehran.
+MORNING = datetime.datetime(2026, 1, 1, 5, 0, tzinfo=datetime.timezone.utc)
+
+
+@override_settings(FAAL_ASSIGNMENT_MODE='deterministic')
+class DeterministicAssignmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{number}') for number in range(5)]
+        HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text='غزل') for number in range(1, 8)
+        )
+
+    def setUp(self):
+        corpus_changed(sender=HafezGhazal)
+        self.flusher = assignment.FaalFlusher(batch_size=1000, interval=3600)
+        patcher = mock.patch('faal.assignment.flusher', self.flusher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_visit_only_queues_the_assignment(self):
+        user = self.users[0]
+        expected = assignment.derive_ghazal(user.pk, MORNING.date(), corpus.ghazal_pool.get())
+        with self.assertNumQueries(1):
+            daily_faal = assignment.get_daily_faal(user, MORNING)
+        self.assertEqual((daily_faal.faal.ghazal_id, daily_faal.message), (expected[1], assignment.MESSAGE_ASSIGNED))
+        self.assertFalse(UserDailyFaal.objects.exists())
+        with self.assertNumQueries(0):
+            again = assignment.get_daily_faal(user, MORNING)
+        self.assertEqual((again.faal.ghazal_id, again.message), (expected[1], None))
+
+        self.assertEqual(self.flusher.flush(), 1)
+        self.assertEqual(UserDailyFaal.objects.get(user=user).ghazal_id, expected[1])
+        self.assertEqual(assignment.get_daily_faal(user, MORNING).faal.ghazal_id, expected[1])
+
+    def test_existing_rows_win(self):
+        ghazal = HafezGhazal.objects.get(ghazal_number=7)
+        UserDailyFaal.objects.create(user=self.users[0], ghazal=ghazal, date=MORNING.date())
+        self.assertEqual(assignment.get_daily_faal(self.users[0], MORNING).faal.ghazal, ghazal)
+
+    def test_day_and_gate_are_local(self):
+        # 21:00 UTC is already 00:30 on the next day in Tehran: before that day's gate.
+        evening = MORNING.replace(hour=21)
+        self.assertEqual(assignment.get_daily_faal(self.users[0], evening).message, assignment.MESSAGE_NOT_YET)
+        self.assertEqual(assignment.get_daily_faal(self.users[0], MORNING).faal.date, datetime.date(2026, 1, 1))
+
+    def test_assignments_survive_corpus_reordering(self):
+        day = MORNING.date()
+
+        def assigned_numbers():
+            pool = corpus.ghazal_pool.get()
+            return [assignment.derive_ghazal(user.pk, day, pool)[0] for user in self.users]
+
+        before = assigned_numbers()
+        numbers = list(HafezGhazal.objects.values_list('ghazal_number', flat=True))
+        HafezGhazal.objects.all().delete()
+        HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text='غزل') for number in numbers[::-1]
+        )
+        corpus.ghazal_pool.invalidate()
+        self.assertEqual(assigned_numbers(), before)
+        pool = corpus.ghazal_pool.get()
+        number, pk = assignment.derive_ghazal(self.users[0].pk, day, pool)
+        self.assertEqual(HafezGhazal.objects.get(pk=pk).ghazal_number, number)
+
+
+@override_settings(FAAL_ASSIGNMENT_MODE='deterministic')
+class PrepareDailyFaalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{number}') for number in range(4)]
+        User.objects.create_user('retired', is_active=False)
+        HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text='غزل') for number in range(1, 8)
+        )
+
+    def setUp(self):
+        corpus_changed(sender=HafezGhazal)
+        patcher = mock.patch('faal.assignment.flusher', assignment.FaalFlusher(batch_size=1000, interval=3600))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def prepare(self, now=MORNING, **options):
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            call_command('prepare_daily_faals', stdout=io.StringIO(), **options)
+
+    def test_assigns_each_active_user_once(self):
+        self.prepare(chunk_size=3)
+        day = MORNING.date()
+        pool = corpus.ghazal_pool.get()
+        self.assertEqual(
+            dict(UserDailyFaal.objects.values_list('user_id', 'ghazal_id')),
+            {user.pk: assignment.derive_ghazal(user.pk, day, pool)[1] for user in self.users},
+        )
+        self.prepare()
+        self.assertEqual(UserDailyFaal.objects.count(), len(self.users))
+
+    def test_default_date_is_local(self):
+        # 22:00 UTC on 31 December is already 1 January in Tehran.
+        self.prepare(now=datetime.datetime(2025, 12, 31, 22, 0, tzinfo=datetime.timezone.utc))
+        self.assertEqual(set(UserDailyFaal.objects.values_list('date', flat=True)), {datetime.date(2026, 1, 1)})
+
+    def test_active_within(self):
+        User.objects.filter(pk=self.users[0].pk).update(last_login=MORNING - datetime.timedelta(days=1))
+        self.prepare(active_within=7)
+        self.assertEqual(list(UserDailyFaal.objects.values_list('user_id', flat=True)), [self.users[0].pk])
+
+    def test_prepared_faals_wait_for_the_gate(self):
+        # Prepared at 07:00 in Tehran, half an hour before the visits below.
+        self.prepare(now=MORNING - datetime.timedelta(minutes=90))
+        prepared = UserDailyFaal.objects.get(user=self.users[0])
+        before_gate = assignment.get_daily_faal(self.users[0], MORNING - datetime.timedelta(minutes=45))
+        self.assertEqual((before_gate.faal, before_gate.message), (None, assignment.MESSAGE_NOT_YET))
+        after_gate = assignment.get_daily_faal(self.users[0], MORNING)
+        self.assertEqual((after_gate.faal.ghazal_id, after_gate.message), (prepared.ghazal_id, None))
+
+
+class FaalFlusherTests(TransactionTestCase):
+    def test_rows_of_deleted_users_are_dropped(self):
+        kept, deleted = User.objects.create_user('kept'), User.objects.create_user('deleted')
+        ghazal = HafezGhazal.objects.create(ghazal_number=1, persian_text='غزل')
+        flusher = assignment.FaalFlusher(batch_size=1000, interval=3600)
+        day = MORNING.date()
+        flusher.add(kept.pk, day, ghazal.pk)
+        flusher.add(deleted.pk, day, ghazal.pk)
+        deleted.delete()
+        with self.assertLogs('faal.assignment', 'WARNING'):
+            self.assertEqual(flusher.flush(), 2)
+        self.assertEqual(list(UserDailyFaal.objects.values_list('user_id', flat=True)), [kept.pk])
+        self.assertIsNone(flusher.get(deleted.pk, day))
+        self.assertEqual(flusher.flush(), 0)
+
+
+@override_settings(TEMPLATES=PAGE_TEMPLATE_SETTINGS, FAAL_ASSIGNMENT_MODE='deterministic', FAAL_THROTTLE_RATES={})
+class DashboardPayloadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        cls.ghazal = HafezGhazal.objects.create(
+            ghazal_number=4, persian_text=SAMPLE_PERSIAN_TEXT, english_translation='Wine'
+        )
+
+    def setUp(self):
+        corpus_changed(sender=HafezGhazal)
+        patcher = mock.patch('faal.assignment.flusher', assignment.FaalFlusher(batch_size=1000, interval=3600))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def test_spliced_dashboard_matches_the_serializer(self):
+        faal = UserDailyFaal.objects.create(user=self.user, ghazal=self.ghazal, date=MORNING.date())
+        daily_faal = assignment.DailyFaal(faal, True, None)
+        expected = JSONRenderer().render({
+            'faal': UserDailyFaalSerializer(faal).data, 'faal_available': True, 'message': None,
+        })
+        self.assertEqual(payloads.render_dashboard(daily_faal), expected)
+
+    def test_deleted_ghazal_is_no_faal(self):
+        with mock.patch('faal.views.get_daily_faal', lambda user: assignment.get_daily_faal(user, MORNING)):
+            self.assertContains(self.client.get(reverse('dashboard')), '4 ')
+            HafezGhazal.objects.all().delete()
+            corpus_changed(sender=HafezGhazal)
+            daily_faal = assignment.get_daily_faal(self.user, MORNING)
+            self.assertEqual(json.loads(payloads.render_dashboard(daily_faal)), {
+                'faal': None, 'faal_available': False, 'message': assignment.MESSAGE_NO_GHAZALS,
+            })
+            self.assertContains(self.client.get(reverse('dashboard')), assignment.MESSAGE_NO_GHAZALS)
+
+
+ASYNC_VIEWS = {
+    'api_daily_quote': async_api_views.daily_quote,
+    'api_quotes': async_api_views.quote_list,
+    'api_ghazals': async_api_views.ghazal_list,
+    'api_dashboard': async_api_views.user_dashboard,
+    'api_current_user': async_api_views.current_user,
+}
+
+
+class AsyncURLConf:
+    """The API URLs as ``FAAL_ASYNC_API`` routes them, whatever this process was started with."""
+
+    urlpatterns = [
+        path(f'api/{pattern.pattern}', ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+        for pattern in api_urls.urlpatterns
+    ]
+
+
+@override_settings(FAAL_ASSIGNMENT_MODE='deterministic', FAAL_THROTTLE_RATES={})
+class AsyncAPIViewTests(TestCase):
+    """The async read views answer exactly like the DRF views they stand in for."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text=f'غزل {number}', english_translation=f'ghazal {number}')
+            for number in range(1, 6)
+        )
+        Quote.objects.bulk_create(Quote(text=f'سخن {number}', author='Hafez') for number in range(3))
+
+    def setUp(self):
+        cache.clear()
+        corpus_changed(sender=HafezGhazal)
+        patcher = mock.patch('faal.assignment.flusher', assignment.FaalFlusher(batch_size=1000, interval=3600))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def responses(self, url):
+        sync = await sync_to_async(self.client.get)(url)
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            clear_url_caches()
+            try:
+                native = await self.async_client.get(url)
+            finally:
+                clear_url_caches()
+        return sync, native
+
+    async def assertSameResponse(self, url):
+        sync, native = await self.responses(url)
+        self.assertEqual((native.status_code, native.content), (sync.status_code, sync.content), url)
+        return sync, native
+
+    async def test_public_views(self):
+        await sync_to_async(Quote.objects.filter(pk=(await Quote.objects.afirst()).pk).update)(is_daily_quote=True)
+        for url in (reverse('api_daily_quote'), reverse('api_quotes'), reverse('api_ghazals'),
+                    reverse('api_ghazals') + '?page_size=2', reverse('api_ghazals') + '?page_size=2&cursor=Mg=='):
+            await self.assertSameResponse(url)
+
+    async def test_signed_in_views(self):
+        for url in (reverse('api_dashboard'), reverse('api_current_user')):
+            await self.assertSameResponse(url)
+        await sync_to_async(self.client.force_login)(self.user)
+        await self.async_client.aforce_login(self.user)
+        # The first visit of the day assigns the faal and says so; compare the visits after it.
+        await sync_to_async(self.client.get)(reverse('api_dashboard'))
+        for url in (reverse('api_dashboard'), reverse('api_current_user')):
+            sync, _ = await self.assertSameResponse(url)
+            self.assertEqual(sync.status_code, 200)
+
+    async def test_throttled_dashboard(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        take = throttling.take
+
+        def off_the_event_loop(*args, **kwargs):
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+            return take(*args, **kwargs)
+
+        with override_settings(
+            FAAL_THROTTLE_RATES={'dashboard_user': '1/min'},
+            FAAL_THROTTLE_DB=os.path.join(directory.name, 'throttle.sqlite3'),
+        ), mock.patch('faal.throttling._local', threading.local()), \
+                mock.patch('faal.async_api_views.take', off_the_event_loop):
+            await sync_to_async(self.client.force_login)(self.user)
+            await self.async_client.aforce_login(self.user)
+            url = reverse('api_dashboard')
+            await self.responses(url)
+            sync, native = await self.responses(url)
+        self.assertEqual(sync.status_code, 429)
+        self.assertEqual(native.status_code, 429)
+        self.assertEqual(native.json(), sync.json())
+        self.assertEqual(native['Retry-After'], sync['Retry-After'])
+
+
+@override_settings(TEMPLATES=PAGE_TEMPLATE_SETTINGS, FAAL_THROTTLE_RATES={})
+class ListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text=f'غزل {number}') for number in (4, 1, 5, 2, 3)
+        )
+
+    def setUp(self):
+        cache.clear()
+        corpus_changed(sender=HafezGhazal)
+
+    def test_cursor_pages(self):
+        url, numbers = reverse('api_ghazals') + '?page_size=2', []
+        while url:
+            body = self.client.get(url).json()
+            numbers.append([ghazal['ghazal_number'] for ghazal in body['results']])
+            url = body['next']
+        self.assertEqual(numbers, [[1, 2], [3, 4], [5]])
+        self.assertEqual(self.client.get(reverse('api_ghazals'), {'cursor': '!'}).status_code, 404)
+        self.assertEqual(len(self.client.get(reverse('api_ghazals')).json()), 5)
+
+    def test_fields(self):
+        response = self.client.get(reverse('api_ghazals'), {'fields': 'ghazal_number', 'page_size': 1})
+        self.assertEqual(response.json()['results'], [{'ghazal_number': 1}])
+        self.assertEqual(self.client.get(reverse('api_ghazals'), {'fields': 'secret'}).status_code, 400)
+
+    def test_unchanged_listing_is_not_modified(self):
+        url = reverse('api_ghazals') + '?page_size=2'
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+            )
+        # Another query string is another representation.
+        other = self.client.get(reverse('api_ghazals'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(other.status_code, 200)
+        HafezGhazal.objects.create(ghazal_number=6, persian_text='غزل 6')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_html_pages_are_never_answered_from_the_corpus_etag(self):
+        response = self.client.get(reverse('ghazals_list'))
+        self.assertEqual(response.content.decode(), '12345')
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(TEMPLATES=PAGE_TEMPLATE_SETTINGS)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text=f'غزل {number}') for number in (2, 1, 3)
+        )
+        Quote.objects.create(text='سخن', author='Hafez')
+
+    def setUp(self):
+        cache.clear()
+        corpus_changed(sender=HafezGhazal)
+
+    def test_anonymous_hits_skip_the_view(self):
+        for name, content in (('homepage', 'سخن'), ('ghazals_list', '123'), ('quotes_list', 'سخن')):
+            self.assertEqual(self.client.get(reverse(name)).content.decode(), content)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(reverse(name)).content.decode(), content)
+
+    def test_corpus_change_renders_afresh(self):
+        self.client.get(reverse('ghazals_list'))
+        HafezGhazal.objects.create(ghazal_number=4, persian_text='غزل 4')
+        self.assertEqual(self.client.get(reverse('ghazals_list')).content.decode(), '1234')
+
+    def test_key_covers_language_and_day(self):
+        self.assertNotEqual(pages.page_cache_key('ghazals_list', 'fa'), pages.page_cache_key('ghazals_list', 'en'))
+        tomorrow = timezone.now() + datetime.timedelta(days=1)
+        self.client.get(reverse('homepage'))
+        with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+            key = pages.page_cache_key('homepage', variant=pages.daily_variant(None))
+            self.assertIsNone(cache.get(key))
+            self.client.get(reverse('homepage'))
+            self.assertIsNotNone(cache.get(key))
+
+    def test_signed_in_and_query_string_requests_are_not_cached(self):
+        url = reverse('ghazals_list')
+        self.client.get(url, {'page': 2})
+        self.client.force_login(self.user)
+        self.client.get(url)
+        self.assertIsNone(cache.get(pages.page_cache_key('ghazals_list')))
+
+    def test_pages_with_a_csrf_token_are_not_cached(self):
+        view = pages.cached_page('form')(lambda request: HttpResponse(get_token(request)))
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        view(request)
+        self.assertIsNone(cache.get(pages.page_cache_key('form')))
+
+    def test_prerender_pages(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        call_command('prerender_pages', output=directory.name, languages=['fa'], stdout=io.StringIO())
+        target = os.path.join(directory.name, 'fa', reverse('ghazals_list').strip('/'), 'index.html')
+        with open(target, 'rb') as f:
+            content = f.read()
+        with open(f'{target}.gz', 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), content)
+        self.assertEqual(content.decode(), '123')
+
+
+class DailyQuoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Quote.objects.bulk_create(Quote(text=f'سخن {number}', author='Hafez') for number in range(5))
+
+    def setUp(self):
+        cache.clear()
+        corpus_changed(sender=Quote)
+
+    def picks(self, days):
+        start = datetime.date(2026, 1, 1)
+        return [corpus.daily_quote.get(start + datetime.timedelta(days=day)).pk for day in range(days)]
+
+    def test_held_for_the_day(self):
+        quote = Quote.get_daily_quote()
+        with self.assertNumQueries(0):
+            self.assertEqual(Quote.get_daily_quote(), quote)
+            self.assertEqual(self.client.get(reverse('api_daily_quote')).json()['text'], quote.text)
+
+    def test_no_repeats_until_the_pool_is_used_up(self):
+        picks = self.picks(10)
+        self.assertEqual(sorted(picks[:5]), sorted(Quote.objects.values_list('pk', flat=True)))
+        self.assertEqual(picks[5:], picks[:5])
+
+    def test_curated_quotes_only(self):
+        curated = list(Quote.objects.values_list('pk', flat=True)[:2])
+        Quote.objects.filter(pk__in=curated).update(is_daily_quote=True)
+        corpus_changed(sender=Quote)
+        self.assertEqual(sorted(self.picks(2)), sorted(curated))
+
+    def test_day_is_local(self):
+        # 21:00 UTC is already the next day in Tehran.
+        with mock.patch('django.utils.timezone.now', return_value=MORNING.replace(hour=21)):
+            self.assertEqual(Quote.get_daily_quote(), corpus.daily_quote.get(datetime.date(2026, 1, 2)))
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        HafezGhazal.objects.create(ghazal_number=1, persian_text='غزل 1')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patcher = override_settings(
+            FAAL_METRICS_DIR=self.directory, FAAL_QUERY_BUDGETS={'api_ghazals': 0}, FAAL_THROTTLE_RATES={}
+        )
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        patcher = mock.patch('faal.metrics.registry', metrics.Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        corpus_changed(sender=HafezGhazal)
+
+    def test_histograms_and_query_budget(self):
+        with self.assertLogs('faal.metrics', 'WARNING'):
+            response = self.client.get(reverse('api_ghazals'))
+        stats = metrics.registry.views['api_ghazals']
+        self.assertEqual((stats['count'], stats['budget_exceeded']), (1, 1))
+        self.assertGreater(stats['queries_sum'], 0)
+        self.assertEqual(stats['response_bytes'], len(response.content))
+        text = metrics.render_prometheus(metrics.collect())
+        self.assertIn('faal_request_duration_seconds_bucket{view="api_ghazals",le="+Inf"} 1', text)
+        self.assertIn(f'faal_db_queries_sum{{view="api_ghazals"}} {stats["queries_sum"]}', text)
+        self.assertIn('faal_query_budget_exceeded_total{view="api_ghazals"} 1', text)
+
+    def test_scrape_adds_up_every_running_worker(self):
+        other = metrics.Registry()
+        other.observe('api_ghazals', 0.02, metrics.RequestState(), 10, False)
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+        for pid in (os.getppid(), exited.pid):
+            with open(os.path.join(self.directory, f'{pid}.json'), 'w') as f:
+                json.dump(other.snapshot(), f)
+        with self.assertLogs('faal.metrics', 'WARNING'):
+            response = self.client.get(reverse('api_ghazals'))
+        merged = metrics.collect()['api_ghazals']
+        self.assertEqual((merged['count'], merged['response_bytes']), (2, len(response.content) + 10))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, f'{exited.pid}.json')))
+
+    def test_scrapes_are_local_only(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.7').status_code, 404)
+        self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='203.0.113.7').status_code, 404)
+
+    async def test_async_requests(self):
+        async def view(request):
+            await HafezGhazal.objects.acount()
+            return HttpResponse(b'ok')
+
+        self.assertFalse(iscoroutinefunction(metrics.MetricsMiddleware(lambda request: HttpResponse())))
+        middleware = metrics.MetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        await middleware(RequestFactory().get('/'))
+        stats = metrics.registry.views['unmatched']
+        self.assertEqual((stats['count'], stats['queries_sum'], stats['response_bytes']), (1, 1, 2))
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = override_settings(
+            FAAL_THROTTLE_RATES={'availability_ip': '2/min'},
+            FAAL_THROTTLE_DB=os.path.join(directory.name, 'throttle.sqlite3'),
+        )
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        patcher = mock.patch('faal.throttling._local', threading.local())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check(self, **extra):
+        return self.client.get(reverse('api_availability'), {'username': 'reader'}, **extra)
+
+    def test_empty_bucket_answers_429_with_retry_after(self):
+        self.assertEqual([self.check().status_code for _ in range(2)], [200, 200])
+        response = self.check()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self.check(REMOTE_ADDR='203.0.113.7').status_code, 200)
+
+    def test_forwarded_for_is_only_trusted_behind_proxies(self):
+        for forged in ('198.51.100.1', '198.51.100.2', '198.51.100.3'):
+            response = self.check(HTTP_X_FORWARDED_FOR=forged)
+        self.assertEqual(response.status_code, 429)
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='198.51.100.1, 203.0.113.7')
+            self.assertEqual(throttling.client_ip(request), '203.0.113.7')
+
+    def test_single_flight_coalesces_concurrent_calls(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def load():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return len(calls)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(flight.do, 'key', load)
+            started.wait(5)
+            followers = [executor.submit(flight.do, 'key', load) for _ in range(3)]
+            # The followers are waiting on the leader's call, not running their own.
+            time.sleep(0.05)
+            release.set()
+            results = [future.result(5) for future in [leader, *followers]]
+        self.assertEqual((results, len(calls)), ([1, 1, 1, 1], 1))
+        self.assertEqual(flight.do('key', load), 2)
+
+    def test_single_flight_shares_errors(self):
+        flight = SingleFlight()
+        with self.assertRaises(ZeroDivisionError):
+            flight.do('key', lambda: 1 / 0)
+        self.assertEqual(flight.do('key', lambda: 'again'), 'again')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        HafezGhazal.objects.create(
+            ghazal_number=1, persian_text='می‌روم به كوی ساقی\nتا شرابی بنوشم',
+            english_translation='To the cupbearer I go',
+        )
+        HafezGhazal.objects.create(
+            ghazal_number=2, persian_text='الا یا ایها الساقی ادر کاسا و ناولها', english_translation='Pass the cup',
+        )
+
+    def search(self, **params):
+        return self.client.get(reverse('api_search'), params).json()['results']
+
+    def test_normalize(self):
+        self.assertEqual(search.normalize('می‌روم'), 'میروم')
+        self.assertEqual(search.normalize('كوي'), 'کوی')
+        self.assertEqual(search.normalize('دِلِ أهل'), 'دل اهل')
+        self.assertEqual(search.normalize('۱۲ ١٢ Cup'), '12 12 cup')
+        self.assertEqual(search.build_match('Cup  ساقی'), '"cup"* "ساقی"*')
+
+    def test_spelling_variants_match_and_snippets_keep_the_stored_text(self):
+        results = self.search(q='میروم کوی')
+        self.assertEqual([result['ghazal_number'] for result in results], [1])
+        self.assertEqual(results[0]['persian_snippet'], '<mark>می‌روم</mark> به <mark>كوی</mark> ساقی\nتا شرابی بنوشم')
+
+    def test_search_one_column(self):
+        results = self.search(q='cup', **{'in': 'english'})
+        self.assertEqual(sorted(result['ghazal_number'] for result in results), [1, 2])
+        self.assertNotIn('<mark>', results[0]['persian_snippet'])
+        self.assertEqual(self.search(q='ساقی', **{'in': 'english'}), [])
+        self.assertEqual(self.search(q=''), [])
+        self.assertEqual(self.client.get(reverse('api_search'), {'q': 'cup', 'in': 'arabic'}).status_code, 400)
+
+    def test_snippet_window(self):
+        text = ' '.join(f'w{number}' for number in range(30)) + ' ساقی'
+        self.assertEqual(search.snippet(text, ['ساقی'], size=4), '…w27 w28 w29 <mark>ساقی</mark>')
+        self.assertEqual(search.snippet(text, [], size=2), 'w0 w1…')
+
+
+class ImportCorpusTests(TestCase):
+    def write(self, lines):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'ghazals.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(line, ensure_ascii=False) + '\n' for line in lines)
+        return path
+
+    def assertImported(self, numbers):
+        imported = HafezGhazal.objects.order_by('ghazal_number').values_list('ghazal_number', flat=True)
+        self.assertEqual(list(imported), numbers)
+        self.assertEqual(sorted(result['ghazal_number'] for result in search.search('ساقی')), numbers)
+        self.assertEqual(sorted(corpus.ghazal_pool.get().numbers), numbers)
+        # The sample's five beyts plus the ساقی line.
+        self.assertEqual(Beyt.objects.filter(ghazal__ghazal_number__in=numbers).count(), 6 * len(numbers))
+
+    def test_import_upserts_and_refreshes_derived_state(self):
+        HafezGhazal.objects.create(ghazal_number=2, persian_text='کهنه')
+        corpus.ghazal_pool.get()
+        path = self.write(
+            {'ghazal_number': number, 'persian_text': f'ساقی\n{SAMPLE_PERSIAN_TEXT}'} for number in (1, 2, 3)
+        )
+        call_command('import_corpus', 'ghazals', path, '--batch-size', '2', stdout=io.StringIO())
+        self.assertImported([1, 2, 3])
+
+    def test_failed_import_still_refreshes_the_committed_batches(self):
+        corpus.ghazal_pool.get()
+        path = self.write([
+            {'ghazal_number': 1, 'persian_text': f'ساقی\n{SAMPLE_PERSIAN_TEXT}'},
+            {'ghazal_number': 'x', 'persian_text': 'ساقی'},
+        ])
+        with self.assertRaisesMessage(CommandError, 'line 2: ghazal_number must be an integer (the 1 rows'):
+            call_command('import_corpus', 'ghazals', path, '--batch-size', '1', stdout=io.StringIO())
+        self.assertImported([1])
+
+    def test_overlong_author_is_rejected(self):
+        path = self.write([{'text': 'سخن', 'author': 'ح' * 201}])
+        with self.assertRaisesMessage(CommandError, 'line 1: author is longer than 200 characters'):
+            call_command('import_corpus', 'quotes', path, stdout=io.StringIO())
+        self.assertFalse(Quote.objects.exists())
+
+
+class SQLiteTuningTests(SimpleTestCase):
+    # A second connection to a scratch file, not the test database.
+    databases = {'default'}
+
+    def test_new_connections_get_the_pragmas(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        name = os.path.join(directory.name, 'db.sqlite3')
+        wrapper = connections['default'].__class__({**connection.settings_dict, 'NAME': name})
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            for pragma, value in (('journal_mode', 'wal'), ('synchronous', 1), ('busy_timeout', 20000)):
+                cursor.execute(f'PRAGMA {pragma}')
+                self.assertEqual(cursor.fetchone()[0], value, pragma)
+
+    def test_locked_writes_are_retried(self):
+        calls = []
+
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'written'
+
+        with mock.patch('faal.db.time.sleep') as sleep:
+            self.assertEqual(db.retry_on_locked(write)(), 'written')
+            self.assertEqual(sleep.call_count, 2)
+            with self.assertRaises(OperationalError):
+                db.retry_on_locked(mock.Mock(side_effect=OperationalError('no such table')))()
+            self.assertEqual(sleep.call_count, 2)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'},
+})
+class SessionStoreTests(TestCase):
+    def setUp(self):
+        caches['sessions'].clear()
+        self.store = sessions.SessionStore()
+        self.store['faal'] = 1
+        self.store.save()
+
+    def reopen(self):
+        return sessions.SessionStore(self.store.session_key)
+
+    def stored_expiry(self):
+        return Session.objects.get(session_key=self.store.session_key).expire_date
+
+    def test_unchanged_sessions_slide_in_the_cache_only(self):
+        store = self.reopen()
+        with self.assertNumQueries(0):
+            self.assertEqual(store['faal'], 1)
+            store.save()
+
+    def test_changes_are_written_through(self):
+        store = self.reopen()
+        store['faal'] = 2
+        store.save()
+        caches['sessions'].clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.reopen()['faal'], 2)
+
+    def test_ageing_database_expiry_is_refreshed(self):
+        soon = timezone.now() + datetime.timedelta(hours=1)
+        Session.objects.filter(session_key=self.store.session_key).update(expire_date=soon)
+        caches['sessions'].set(self.store.cache_key + ':db-expiry', soon)
+        store = self.reopen()
+        store.load()
+        store.save()
+        self.assertGreater(self.stored_expiry(), soon + datetime.timedelta(hours=12))
+
+    def test_delete_forgets_the_database_expiry(self):
+        self.store.delete()
+        self.assertIsNone(caches['sessions'].get(self.store.cache_key_prefix + self.store.session_key + ':db-expiry'))
+        self.assertFalse(Session.objects.exists())
+
+
+class PooledMD5PasswordHasher(PooledHasherMixin, MD5PasswordHasher):
+    pass
+
+
+@override_settings(PASSWORD_HASHERS=['faal.tests.PooledMD5PasswordHasher'], FAAL_THROTTLE_RATES={})
+class HashingPoolTests(TestCase):
+    def use_pool(self, pool):
+        patcher = mock.patch('faal.hashing.hashing_pool', pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(pool.shutdown)
+
+    def test_login_hashes_on_the_pool_inside_the_request_transaction(self):
+        self.use_pool(HashingPool(2, 4))
+        # Created inside this test's transaction, so only the request's own connection can see it.
+        User.objects.create_user('reader', password='secret123')
+        threads = []
+        verify = MD5PasswordHasher.verify
+
+        def record(hasher, password, encoded):
+            threads.append(threading.current_thread().name)
+            return verify(hasher, password, encoded)
+
+        with mock.patch.object(MD5PasswordHasher, 'verify', record):
+            response = self.client.post(reverse('api_login'), {'username': 'reader', 'password': 'secret123'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('faal-hashing'))
+
+    def test_saturated_pool_answers_429(self):
+        User.objects.create_user('reader', password='secret123')
+        self.use_pool(HashingPool(0, 0))
+        login = self.client.post(reverse('api_login'), {'username': 'reader', 'password': 'secret123'})
+        register = self.client.post(reverse('api_register'), {
+            'username': 'newcomer', 'email': 'newcomer@example.com', 'password': 'a-long-passphrase',
+            'password2': 'a-long-passphrase',
+        })
+        for response in (login, register):
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+
+    def test_saturated_pool_answers_429_outside_the_api(self):
+        User.objects.create_user('reader', password='secret123', is_staff=True)
+        self.use_pool(HashingPool(0, 0))
+        credentials = {'username': 'reader', 'password': 'secret123'}
+        responses = [
+            self.client.post(reverse('login'), credentials),
+            self.client.post(reverse('admin:login'), credentials),
+            self.client.post(reverse('register'), {
+                'username': 'newcomer', 'password1': 'a-long-passphrase', 'password2': 'a-long-passphrase',
+            }),
+        ]
+        self.assertEqual([response.status_code for response in responses], [429, 429, 429])
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+
+
+@override_settings(
+    TEMPLATES=PAGE_TEMPLATE_SETTINGS,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    FAAL_ASSIGNMENT_MODE='random',
+    # The first, cold request of each route is expected to go over budget.
+    FAAL_QUERY_BUDGETS={},
+    FAAL_THROTTLE_RATES={},
+)
+class RouteQueryCountTests(TestCase):
+    """Exact query counts for every route once the worker's corpus caches are warm.
+
+    A change to any count here is a performance change: update the number in
+    the same commit that explains it.
+    """
+
+    routes = ROUTES
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'secret123')
+        cls.staff = User.objects.create_user('curator', 'curator@example.com', 'secret123', is_staff=True)
+        HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text=f'الا یا ایها الساقی {number}\n{SAMPLE_PERSIAN_TEXT}')
+            for number in range(1, 61)
+        )
+        beyts.rebuild()
+        Quote.objects.bulk_create(Quote(text=f'quote {number}', author='Hafez') for number in range(60))
+        today = datetime.date.today()
+        ghazals = list(HafezGhazal.objects.all()[:40])
+        UserDailyFaal.objects.bulk_create(
+            UserDailyFaal(user=cls.user, ghazal=ghazal, date=today - datetime.timedelta(days=days))
+            for days, ghazal in enumerate(ghazals, start=1)
+        )
+
+    def setUp(self):
+        cache.clear()
+        # bulk_create() sends no signals, so drop every process-local corpus cache by hand.
+        corpus_changed(sender=HafezGhazal)
+        patcher = mock.patch('faal.hashing.hashing_pool', HashingPool(0, 16))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, name, kwargs, method, data, attempt):
+        if data is not None:
+            data = {key: value.format(n=attempt) for key, value in data.items()}
+        response = getattr(self.client, method)(reverse(name, kwargs=kwargs), data)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f'{name}: {response.status_code}')
+        return response
+
+    def test_every_route_is_covered(self):
+        names = {pattern.name for pattern in api_urls.urlpatterns + urls.urlpatterns}
+        self.assertEqual(names, {route[0] for route in self.routes})
+
+    def test_route_query_counts(self):
+        for name, kwargs, method, data, signed_in, queries in self.routes:
+            with self.subTest(name):
+                # The first request loads the corpus caches; measure the next one.
+                for attempt in (1, 2):
+                    self.client = self.client_class()
+                    if signed_in:
+                        self.client.force_login(self.staff if signed_in == 'staff' else self.user)
+                    if attempt == 1:
+                        self.request(name, kwargs, method, data, attempt)
+                with self.assertNumQueries(queries):
+                    self.request(name, kwargs, method, data, attempt)
+
+
+class HistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        cls.other = User.objects.create_user('saqi')
+        cls.staff = User.objects.create_user('curator', is_staff=True, is_superuser=True)
+        ghazals = HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text='غزل') for number in range(1, 6)
+        )
+        cls.days = [datetime.date(2026, 1, day) for day in range(1, 6)]
+        UserDailyFaal.objects.bulk_create(
+            UserDailyFaal(user=user, ghazal=ghazal, date=day)
+            for user in (cls.user, cls.other) for ghazal, day in zip(ghazals, cls.days)
+        )
+
+    def pages(self, **params):
+        url, dates = reverse('api_history'), []
+        while url:
+            body = self.client.get(url, params if url == reverse('api_history') else None).json()
+            dates.append([faal['date'] for faal in body['results']])
+            url = body['next']
+        return dates
+
+    def export(self, fmt, **params):
+        response = self.client.get(reverse('api_history_export', args=[fmt]), params)
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="faal-history.{fmt}"')
+        return b''.join(response.streaming_content).decode()
+
+    def test_history_pages_newest_first(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.pages(page_size=2), [
+            ['2026-01-05', '2026-01-04'], ['2026-01-03', '2026-01-02'], ['2026-01-01'],
+        ])
+        # Only staff can read someone else's history.
+        self.assertEqual(self.pages(user=self.other.pk, page_size=5), [[day.isoformat() for day in self.days[::-1]]])
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_history')).status_code, 403)
+
+    def test_exports(self):
+        self.client.force_login(self.user)
+        lines = self.export('csv', start='2026-01-04').splitlines()
+        self.assertEqual(lines, [
+            'date,user_id,username,ghazal_number',
+            f'2026-01-04,{self.user.pk},reader,4',
+            f'2026-01-05,{self.user.pk},reader,5',
+        ])
+        self.assertEqual(self.client.get(reverse('api_history_export', args=['xml'])).status_code, 404)
+        self.client.force_login(self.staff)
+        rows = [json.loads(line) for line in self.export('jsonl', end='2026-01-01').splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['reader', 'saqi'])
+
+    # No collectstatic manifest in tests.
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_admin_changelist_joins_its_relations(self):
+        self.client.force_login(self.staff)
+        url = reverse('admin:faal_userdailyfaal_changelist')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ten_rows:
+            self.assertContains(self.client.get(url), 'reader')
+        UserDailyFaal.objects.filter(user=self.other).delete()
+        with CaptureQueriesContext(connection) as five_rows:
+            self.client.get(url)
+        self.assertEqual(len(ten_rows), len(five_rows))
+
+
+class BeytTests(TestCase):
+    def test_split_into_normalized_couplets(self):
+        rows = beyts.beyt_fields(7, 'دلم ز صومعه بگرفت\n\nخرقه سالوس\nمی‌روم ۲ كجا\n')
+        self.assertEqual([row['position'] for row in rows], [1, 2])
+        self.assertEqual(rows[0]['second_mesra'], 'خرقه سالوس')
+        # A trailing odd line is a beyt of its own.
+        self.assertEqual(rows[1]['second_mesra'], '')
+        self.assertEqual(rows[1]['tokens'], 'میروم 2 کجا')
+        self.assertEqual(rows[1]['token_offset'], 6)
+
+    def test_beyts_follow_the_ghazal_text(self):
+        ghazal = HafezGhazal.objects.create(ghazal_number=3, persian_text=SAMPLE_PERSIAN_TEXT)
+        self.assertEqual(ghazal.beyts.count(), 5)
+        ghazal.persian_text = 'صلاح کار کجا\nو من خراب کجا'
+        ghazal.save()
+        self.assertEqual(list(ghazal.beyts.values_list('first_mesra', flat=True)), ['صلاح کار کجا'])
+
+    def test_beyt_endpoints(self):
+        HafezGhazal.objects.create(ghazal_number=3, persian_text=SAMPLE_PERSIAN_TEXT)
+        lines = SAMPLE_PERSIAN_TEXT.splitlines()
+        response = self.client.get(reverse('api_beyt', args=[3, 2]))
+        self.assertEqual(response.json(), {
+            'ghazal_number': 3, 'position': 2, 'first_mesra': lines[2], 'second_mesra': lines[3],
+        })
+        response = self.client.get(reverse('api_beyts', args=[3]), {'start': 4})
+        self.assertEqual([beyt['position'] for beyt in response.json()['results']], [4, 5])
+        self.assertEqual(self.client.get(reverse('api_beyt', args=[3, 6])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_beyts', args=[3]), {'end': 'x'}).status_code, 400)
+
+
+class AudioRangeTests(TestCase):
+    data = bytes(range(100))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with open(os.path.join(directory.name, '7.mp3'), 'wb') as f:
+            f.write(self.data)
+        patcher = override_settings(
+            FAAL_AUDIO_DIR=directory.name, FAAL_AUDIO_MANIFEST=os.path.join(directory.name, 'manifest.json')
+        )
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        audio.library.invalidate()
+        self.addCleanup(audio.library.invalidate)
+        self.url = reverse('api_audio', args=[7, 'mp3'])
+        self.etag = self.client.get(self.url)['ETag']
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(body, self.data)
+
+    def test_byte_ranges(self):
+        ranges = [('bytes=10-19', 10, 19), ('bytes=95-', 95, 99), ('bytes=-5', 95, 99), ('bytes=90-500', 90, 99)]
+        for header, start, end in ranges:
+            response, body = self.get(Range=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/100')
+            self.assertEqual(response['Content-Length'], str(end - start + 1))
+            self.assertEqual(body, self.data[start:end + 1])
+
+    def test_if_range(self):
+        response, body = self.get(Range='bytes=10-19', If_Range=self.etag)
+        self.assertEqual((response.status_code, body), (206, self.data[10:20]))
+        response, body = self.get(Range='bytes=10-19', If_Range='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.data))
+
+    def test_unsatisfiable_range(self):
+        for header in ('bytes=100-', 'bytes=-0'):
+            response, _ = self.get(Range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_multiple_and_malformed_ranges_send_everything(self):
+        for header in ('bytes=0-1,4-5', 'bytes=5-2', 'items=0-1'):
+            response, body = self.get(Range=header)
+            self.assertEqual((response.status_code, body), (200, self.data), header)
+
+    def test_not_modified(self):
+        response, _ = self.get(If_None_Match=self.etag, Range='bytes=0-1')
+        self.assertEqual(response.status_code, 304)
+
+
+class CorpusMapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text=f'غزل {number}', english_translation=f'ghazal {number}')
+            for number in (5, 2, 9, 7)
+        )
+        Quote.objects.bulk_create(Quote(text=f'سخن {number}', author='Hafez') for number in range(3))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(directory.name, 'corpus.map')
+        patcher = override_settings(
+            FAAL_CORPUS_MAP=self.path, FAAL_CORPUS_SNAPSHOT_SOURCE=connection.settings_dict['NAME']
+        )
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        # Drop this process's mapping once the file is gone.
+        self.addCleanup(corpus_map.corpus_map.refresh)
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(corpus_map.builder, 'schedule')
+        self.schedule = patcher.start()
+        self.addCleanup(patcher.stop)
+        corpus_map.build()
+
+    def test_accessors_match_the_database(self):
+        mapped = corpus_map.corpus_map.get()
+        ghazal = HafezGhazal.objects.get(ghazal_number=7)
+        self.assertEqual(mapped.ghazal_count, 4)
+        self.assertEqual(mapped.ghazal_by_number(7), (ghazal.pk, 7, 'غزل 7', 'ghazal 7'))
+        self.assertEqual(mapped.ghazal(ghazal.pk), mapped.ghazal_by_number(7))
+        self.assertIsNone(mapped.ghazal_by_number(3))
+        self.assertEqual(mapped.quote_at(2).text, 'سخن 2')
+        payloads, next_number = mapped.page('ghazals', after=2, page_size=2)
+        self.assertEqual([json.loads(payload)['ghazal_number'] for payload in payloads], [5, 7])
+        self.assertEqual(next_number, 7)
+        self.assertIsNotNone(mapped.ghazal(HafezGhazal.get_random_ghazal().pk))
+
+    def test_list_responses_match_the_orm(self):
+        urls = [reverse('api_ghazals'), reverse('api_quotes'), reverse('api_ghazals') + '?page_size=2&cursor=Mg==']
+        mapped = [self.client.get(url).content for url in urls]
+        with override_settings(FAAL_CORPUS_MAP=None):
+            cache.clear()
+            self.assertEqual([self.client.get(url).content for url in urls], mapped)
+
+    def test_corpus_change_falls_back_until_rebuilt(self):
+        ghazal = HafezGhazal.objects.get(ghazal_number=9)
+        with self.captureOnCommitCallbacks() as callbacks:
+            ghazal.english_translation = 'revised'
+            ghazal.save()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(corpus_map.corpus_map.get())
+        # Scheduled now, so a rollback still gets its map back, and dropped again after the commit.
+        self.schedule.assert_called_once_with()
+        self.assertIn(corpus_map.builder.invalidate, callbacks)
+        corpus_map.build()
+        self.assertEqual(corpus_map.corpus_map.get().ghazal(ghazal.pk).english_translation, 'revised')
+
+    def test_build_that_overlaps_a_change_is_thrown_away(self):
+        os.remove(self.path)
+        # Another worker moved the version after this build had read it.
+        with mock.patch('faal.corpus_map.corpus_version', return_value=corpus.corpus_version() - 1):
+            self.assertIsNone(corpus_map.build())
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), [])
+
+
+class ReplicaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        HafezGhazal.objects.create(ghazal_number=1, persian_text='غزل 1')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, 'corpus.sqlite3')
+        patcher = override_settings(FAAL_CORPUS_SNAPSHOT=self.path)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        # Reconnect this thread's replica state once the file is gone.
+        self.addCleanup(replica.refresh)
+
+    def source(self):
+        """A file copy of the test database's corpus and user tables; the test database lives in memory."""
+        path = os.path.join(self.directory, 'source.sqlite3')
+        target = sqlite3.connect(path)
+        with connection.cursor() as cursor:
+            for table in replica.corpus_tables() + ['auth_user']:
+                cursor.execute("SELECT sql FROM sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL", [table])
+                for (sql,) in cursor.fetchall():
+                    target.execute(sql)
+                cursor.execute(f'SELECT * FROM "{table}"')
+                rows = cursor.fetchall()
+                if rows:
+                    target.executemany(f'INSERT INTO "{table}" VALUES ({", ".join("?" * len(rows[0]))})', rows)
+        target.commit()
+        target.close()
+        return path
+
+    def test_snapshot_copies_the_corpus(self):
+        replica.build_snapshot(source=self.source())
+        snapshot = sqlite3.connect(self.path)
+        self.addCleanup(snapshot.close)
+        self.assertEqual(snapshot.execute('SELECT ghazal_number FROM faal_hafezghazal').fetchall(), [(1,)])
+        tables = {row[0] for row in snapshot.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertNotIn('auth_user', tables)
+
+    def test_failed_copy_leaves_no_temporary_file(self):
+        garbage = os.path.join(self.directory, 'garbage.sqlite3')
+        with open(garbage, 'wb') as f:
+            f.write(b'not a database' * 100)
+        with self.assertRaises(sqlite3.DatabaseError):
+            replica.build_snapshot(source=garbage)
+        self.assertEqual(os.listdir(self.directory), ['garbage.sqlite3'])
+
+    def test_builds_that_overlap_a_change_are_thrown_away(self):
+        tmp_path = f'{self.path}.tmp'
+        version = corpus.corpus_version()
+        open(tmp_path, 'wb').close()
+        # Another worker commits a change while the rows are being copied.
+        corpus.bump_corpus_version()
+        self.assertIsNone(replica.swap_in(tmp_path, self.path, version))
+        self.assertFalse(os.path.exists(tmp_path))
+        self.assertFalse(os.path.exists(self.path))
+
+        # The change lands between the check and the swap.
+        version = corpus.corpus_version()
+        open(tmp_path, 'wb').close()
+        replace = os.replace
+
+        def replace_then_change(src, dst):
+            replace(src, dst)
+            corpus.bump_corpus_version()
+
+        with mock.patch('os.replace', side_effect=replace_then_change):
+            self.assertIsNone(replica.swap_in(tmp_path, self.path, version))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertGreater(corpus.corpus_version(), version + 1)
+
+    def test_router(self):
+        router = replica.CorpusReplicaRouter()
+        historical = ProjectState.from_apps(django_apps).apps.get_model('faal', 'HafezGhazal')
+        with mock.patch('faal.replica.enabled', return_value=True):
+            self.assertIsNone(router.db_for_read(HafezGhazal))
+            open(self.path, 'wb').close()
+            replica.refresh()
+            self.assertEqual(router.db_for_read(HafezGhazal), replica.REPLICA_ALIAS)
+            self.assertEqual(router.db_for_read(Beyt), replica.REPLICA_ALIAS)
+            self.assertIsNone(router.db_for_read(User))
+            self.assertIsNone(router.db_for_read(historical))
+        self.assertEqual(router.db_for_write(HafezGhazal), 'default')
+        self.assertFalse(router.allow_migrate(replica.REPLICA_ALIAS, 'faal'))
+
+    def test_invalidate_rebuilds_after_rollback_and_commit(self):
+        builds = []
+        builder = replica.SnapshotBuilder(lambda: builds.append(1), lambda: replica.remove(self.path), delay=0)
+        with mock.patch('faal.replica.enabled', return_value=True), mock.patch('faal.replica.builder', builder), \
+                mock.patch.object(builder, 'schedule') as schedule:
+            open(self.path, 'wb').close()
+            with self.captureOnCommitCallbacks() as callbacks:
+                replica.invalidate()
+            self.assertFalse(os.path.exists(self.path))
+            self.assertFalse(replica.available())
+            # Scheduled at once, so a rolled back change is rebuilt too.
+            self.assertEqual(schedule.call_count, 1)
+            self.assertEqual(callbacks, [builder.invalidate])
+            open(self.path, 'wb').close()
+            callbacks[0]()
+            self.assertFalse(os.path.exists(self.path))
+            self.assertEqual(schedule.call_count, 2)
+        builder._pending = True
+        self.assertTrue(builder.flush())
+        self.assertEqual(builds, [1])
+
+
+class AvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('Reader', 'Reader@Example.com', 'secret123')
+
+    def setUp(self):
+        availability.availability_filter.invalidate()
+
+    def check(self, **values):
+        return self.client.get(reverse('api_availability'), values).json()
+
+    def test_taken_ignores_case(self):
+        self.assertEqual(availability.taken('reader', 'reader@example.com'), {'username', 'email'})
+        self.assertEqual(availability.taken('reader2', 'READER@EXAMPLE.COM'), {'email'})
+        self.assertEqual(availability.taken(email='other@example.com'), set())
+
+    def test_free_names_are_answered_by_the_filter(self):
+        self.check(username='warm')
+        with self.assertNumQueries(0):
+            result = self.check(username='hafez', email='hafez@example.com')
+        self.assertEqual(result['username'], {'available': True, 'message': None})
+        with self.assertNumQueries(1):
+            result = self.check(username='READER', email='hafez@example.com')
+        self.assertFalse(result['username']['available'])
+        self.assertTrue(result['email']['available'])
+        self.assertEqual(self.client.get(reverse('api_availability')).status_code, 400)
+
+    def test_new_users_are_taken_at_once(self):
+        self.check(username='warm')
+        User.objects.create_user('saqi', 'saqi@example.com')
+        self.assertFalse(self.check(username='Saqi')['username']['available'])
+
+    def test_invalidate_during_a_check_keeps_the_filter_it_read(self):
+        bloom_filter = availability.availability_filter
+        bloom_filter.get()
+
+        def invalidate_meanwhile(now):
+            bloom_filter.invalidate()
+            return False
+
+        with mock.patch.object(bloom_filter, '_needs_refresh', side_effect=invalidate_meanwhile):
+            self.assertTrue(bloom_filter.might_be_taken('username', 'reader'))
+
+    def test_registration_checks_both_fields_in_one_query(self):
+        serializer = UserRegistrationSerializer(data={
+            'username': 'READER', 'email': 'reader@EXAMPLE.com', 'password': 'secret123', 'password2': 'x',
+        })
+        with self.assertNumQueries(1):
+            self.assertFalse(serializer.is_valid())
+        self.assertEqual(set(serializer.errors), {'username', 'email', 'password2'})
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = availability.BloomFilter(1000)
+        keys = [f'user{number}' for number in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f'other{number}' in bloom for number in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class AnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{number}') for number in range(3)]
+        cls.ghazals = HafezGhazal.objects.bulk_create(
+            HafezGhazal(ghazal_number=number, persian_text='غزل') for number in range(1, 4)
+        )
+        cls.day = datetime.date(2026, 1, 1)
+
+    def rollups(self):
+        return (
+            set(GhazalDrawCount.objects.filter(count__gt=0).values_list('date', 'ghazal_id', 'count')),
+            set(DailyFaalCount.objects.filter(count__gt=0).values_list('date', 'count')),
+        )
+
+    def test_triggers_follow_every_write(self):
+        first, second, third = self.ghazals
+        faal = UserDailyFaal.objects.create(user=self.users[0], ghazal=first, date=self.day)
+        UserDailyFaal.objects.bulk_create(
+            [
+                UserDailyFaal(user=self.users[0], ghazal=second, date=self.day),  # conflict, skipped
+                UserDailyFaal(user=self.users[1], ghazal=first, date=self.day),
+                UserDailyFaal(user=self.users[2], ghazal=third, date=self.day),
+            ],
+            ignore_conflicts=True,
+        )
+        faal.ghazal = second
+        faal.save()
+        UserDailyFaal.objects.filter(user=self.users[2]).delete()
+        expected = ({(self.day, first.pk, 1), (self.day, second.pk, 1)}, {(self.day, 2)})
+        self.assertEqual(self.rollups(), expected)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {analytics.DRAWS}')
+        self.assertEqual(analytics.backfill(), 1)
+        self.assertEqual(self.rollups(), expected)
+
+    def test_uniformity(self):
+        ids = [ghazal.pk for ghazal in self.ghazals]
+        self.assertEqual(analytics.uniformity({pk: 100 for pk in ids}, ids)['chi_square'], 0)
+        self.assertGreater(analytics.uniformity({pk: 100 for pk in ids}, ids)['p_value'], 0.5)
+        skewed = {ids[0]: 300, ids[1]: 0, ids[2]: 0}
+        self.assertLess(analytics.uniformity(skewed, ids)['p_value'], 0.001)
+
+    def test_report_is_staff_only(self):
+        UserDailyFaal.objects.create(user=self.users[0], ghazal=self.ghazals[0], date=self.day)
+        url = reverse('api_analytics')
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.users[1].is_staff = True
+        self.users[1].save()
+        self.client.force_login(self.users[1])
+        response = self.client.get(url, {'start': '2025-12-31', 'end': '2026-01-02'})
+        self.assertEqual(response.json()['days'], [{'date': '2026-01-01', 'count': 1}])
+        self.assertEqual([ghazal['draws'] for ghazal in response.json()['ghazals']], [1, 0, 0])
+        self.assertEqual(self.client.get(url, {'start': '2020-01-01'}).status_code, 400)
+
+
+class FrontendTests(SimpleTestCase):
+    def setUp(self):
+        build = tempfile.TemporaryDirectory()
+        self.addCleanup(build.cleanup)
+        self.build = build.name
+        os.makedirs(os.path.join(self.build, 'static', 'js'))
+        for name, content in (('index.html', b'<div id="root"></div>'), ('static/js/main.1a2b3c4d.js', b'1')):
+            with open(os.path.join(self.build, name), 'wb') as f:
+                f.write(content)
+        patcher = override_settings(FAAL_FRONTEND_BUILD=self.build)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def test_spa_index_is_revalidated(self):
+        response = frontend.spa(RequestFactory().get('/app/ghazal/12'))
+        self.assertEqual(response.content, b'<div id="root"></div>')
+        self.assertIn('no-cache', response['Cache-Control'])
+        response = frontend.spa(RequestFactory().get('/app/ghazal/12', HTTP_IF_NONE_MATCH=response['ETag']))
+        self.assertEqual(response.status_code, 304)
+
+    def test_spa_lives_under_app(self):
+        self.assertEqual(resolve('/app/').func, frontend.spa)
+        self.assertEqual(resolve('/app/ghazal/12').func, frontend.spa)
+        # The site root and Django's own pages are not shadowed by the SPA.
+        self.assertEqual(resolve('/').url_name, 'homepage')
+        self.assertEqual(resolve('/ghazals/').url_name, 'ghazals_list')
+        with self.assertRaises(Resolver404):
+            resolve('/app/missing.js')
+
+    def test_hashed_bundle_files_are_immutable(self):
+        middleware = frontend.FrontendMiddleware(lambda request: None)
+        response = middleware(RequestFactory().get('/app/static/js/main.1a2b3c4d.js'))
+        self.assertIn('immutable', response['Cache-Control'])
+        response = middleware(RequestFactory().get('/app/index.html'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIsNone(middleware(RequestFactory().get('/static/js/main.1a2b3c4d.js')))
\ No newline at end of file
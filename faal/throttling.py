@@ -0,0 +1,156 @@
+"""
+Token-bucket throttles for the auth and dashboard endpoints.
+
+A bucket holds up to N tokens and refills at N per period, with rates written
+the DRF way (``'10/min'``) in ``FAAL_THROTTLE_RATES``. Each request takes a
+token; an empty bucket answers 429 with ``Retry-After`` set to when the next
+token arrives. Clients get their full burst back after one quiet period,
+while a retry storm is held to the refill rate.
+
+Buckets live in a small SQLite file, ``FAAL_THROTTLE_DB``, shared by every
+worker on the host. Each check is a single UPSERT, so concurrent workers
+never grant the same token twice. The file is separate from the main
+database and never competes for its write lock. Losing it only resets
+everyone's allowance.
+"""
+
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Buckets untouched this long are full again and can be dropped.
+PRUNE_AFTER = 86400
+
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bucket (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    granted INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+# SET expressions all see the row as it was, so the refill is spelled out in each.
+_TAKE = """
+INSERT INTO bucket (key, tokens, updated, granted) VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = min(:capacity, tokens + (:now - updated) * :refill)
+        - (min(:capacity, tokens + (:now - updated) * :refill) >= 1),
+    granted = min(:capacity, tokens + (:now - updated) * :refill) >= 1,
+    updated = :now
+RETURNING tokens, granted
+"""
+
+
+def parse_rate(rate):
+    """``'10/min'`` -> ``(10, 60)``: the bucket size and the seconds it takes to refill."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def _connection():
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        os.makedirs(os.path.dirname(settings.FAAL_THROTTLE_DB), exist_ok=True)
+        connection = sqlite3.connect(settings.FAAL_THROTTLE_DB, timeout=5, isolation_level=None)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = OFF')
+        connection.execute(_SCHEMA)
+        _local.connection = connection
+    return connection
+
+
+def take(scope, key, now=None):
+    """Take a token from ``scope``'s bucket for ``key``.
+
+    Returns ``None`` when the request may go ahead, otherwise the seconds
+    until a token is available. Scopes without a rate are not throttled.
+    """
+    rate = settings.FAAL_THROTTLE_RATES.get(scope)
+    if not rate or key is None:
+        return None
+    capacity, period = parse_rate(rate)
+    refill = capacity / period
+    now = time.time() if now is None else now
+    connection = _connection()
+    tokens, granted = connection.execute(
+        _TAKE, {'key': f'{scope}:{key}', 'capacity': capacity, 'refill': refill, 'now': now}
+    ).fetchone()
+    if random.random() < 0.001:
+        connection.execute('DELETE FROM bucket WHERE updated < ?', (now - PRUNE_AFTER,))
+    if granted:
+        return None
+    return (1 - tokens) / refill
+
+
+def client_ip(request):
+    return BaseThrottle().get_ident(request)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle over ``take()``; subclasses pick the scope and the bucket key."""
+
+    scope = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_seconds = take(self.scope, self.get_key(request))
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AuthIPThrottle(TokenBucketThrottle):
+    scope = 'auth_ip'
+
+    def get_key(self, request):
+        return client_ip(request)
+
+
+class AvailabilityIPThrottle(TokenBucketThrottle):
+    """Generous enough for as-you-type checks, tight enough to slow down account enumeration."""
+
+    scope = 'availability_ip'
+
+    def get_key(self, request):
+        return client_ip(request)
+
+
+class LoginUsernameThrottle(TokenBucketThrottle):
+    """Per account, so one username cannot be guessed at from many addresses."""
+
+    scope = 'login_username'
+
+    def get_key(self, request):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        return username.lower() if isinstance(username, str) and username else None
+
+
+class DashboardUserThrottle(TokenBucketThrottle):
+    scope = 'dashboard_user'
+
+    def get_key(self, request):
+        return request.user.pk if request.user.is_authenticated else None
+
+
+class DashboardIPThrottle(TokenBucketThrottle):
+    scope = 'dashboard_ip'
+
+    def get_key(self, request):
+        return client_ip(request)
+
+
+def retry_after(wait):
+    return str(max(1, math.ceil(wait)))
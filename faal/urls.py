@@ -7,4 +7,5 @@ urlpatterns = [
     path('ghazals/', views.ghazals_list, name='ghazals_list'),
     path('quotes/', views.quotes_list, name='quotes_list'),
     path('register/', views.register_view, name='register'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file
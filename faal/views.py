@@ -2,61 +2,39 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
-from django.utils import timezone
-from datetime import datetime, time
-from .models import Quote, HafezGhazal, UserDailyFaal
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_safe
+from . import metrics as request_metrics
+from .assignment import get_daily_faal
+from .listing import corpus_rows
+from .models import Quote
+from .pages import cached_page, daily_variant
+from .payloads import dashboard_ghazal
 
+@cached_page('homepage', variant=daily_variant)
 def homepage(request):
     daily_quote = Quote.get_daily_quote()
     return render(request, 'faal/homepage.html', {'quote': daily_quote})
 
 @login_required
 def dashboard(request):
-    today = timezone.now().date()
-    current_time = timezone.now().time()
-    faal_time = time(8, 0)  # 8:00 AM
-    
-    # Check if user already has a faal for today
-    try:
-        user_faal = UserDailyFaal.objects.get(user=request.user, date=today)
-        assigned_ghazal = user_faal.ghazal
-        faal_available = True
-        message = None
-    except UserDailyFaal.DoesNotExist:
-        if current_time >= faal_time:
-            # Assign new faal
-            random_ghazal = HafezGhazal.get_random_ghazal()
-            if random_ghazal:
-                UserDailyFaal.objects.create(
-                    user=request.user,
-                    ghazal=random_ghazal,
-                    date=today
-                )
-                assigned_ghazal = random_ghazal
-                faal_available = True
-                message = "Your personal Hafez Faal for today has been assigned!"
-            else:
-                assigned_ghazal = None
-                faal_available = False
-                message = "No ghazals available."
-        else:
-            assigned_ghazal = None
-            faal_available = False
-            message = "Your personal Hafez Faal for today will be available after 8 A.M."
-    
+    ghazal, available, message = dashboard_ghazal(get_daily_faal(request.user))
     context = {
-        'ghazal': assigned_ghazal,
-        'faal_available': faal_available,
+        'ghazal': ghazal,
+        'faal_available': available,
         'message': message,
     }
     return render(request, 'faal/dashboard.html', context)
 
+@cached_page('ghazals_list')
 def ghazals_list(request):
-    ghazals = HafezGhazal.objects.all()
+    ghazals = corpus_rows('ghazals')
     return render(request, 'faal/ghazals.html', {'ghazals': ghazals})
 
+@cached_page('quotes_list')
 def quotes_list(request):
-    quotes = Quote.objects.all()
+    quotes = corpus_rows('quotes')
     return render(request, 'faal/quotes.html', {'quotes': quotes})
 
 def register_view(request):
@@ -68,4 +46,12 @@ def register_view(request):
             return redirect('dashboard')
     else:
         form = UserCreationForm()
-    return render(request, 'registration/register.html', {'form': form})
\ No newline at end of file
+    return render(request, 'registration/register.html', {'form': form})
+
+@require_safe
+def metrics(request):
+    # Behind a proxy every request looks local, so forwarded ones are refused too.
+    if request.META.get('REMOTE_ADDR') not in settings.FAAL_METRICS_ALLOWED_IPS or 'HTTP_X_FORWARDED_FOR' in request.META:
+        raise Http404
+    body = request_metrics.render_prometheus(request_metrics.collect())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
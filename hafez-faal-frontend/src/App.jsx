@@ -21,7 +21,7 @@ function App() {
     <ErrorBoundary>
       <ThemeProvider>
         <AuthProvider>
-          <Router>
+          <Router basename={process.env.PUBLIC_URL}>
             <div className="App">
               <Header />
               <Routes>
@@ -1,4 +1,18 @@
 import React, { useState, useRef, useEffect } from 'react';
+import { apiService } from '../services/api';
+
+// The manifest lists every recording's duration and versioned URLs; fetch it once.
+let manifestRequest = null;
+const getRecording = async (ghazalNumber) => {
+  if (!manifestRequest) {
+    manifestRequest = apiService.getAudioManifest().catch((err) => {
+      manifestRequest = null;
+      throw err;
+    });
+  }
+  const { data } = await manifestRequest;
+  return data.results.find((recording) => recording.ghazal_number === ghazalNumber) || null;
+};
 
 const HafezAudioPlayer = ({ ghazalNumber }) => {
   const [isPlaying, setIsPlaying] = useState(false);
@@ -8,23 +22,36 @@ const HafezAudioPlayer = ({ ghazalNumber }) => {
   const [error, setError] = useState(null);
   const [volume, setVolume] = useState(0.8);
   const [isHovered, setIsHovered] = useState(false);
+  const [sources, setSources] = useState([]);
   const audioRef = useRef(null);
 
-  // Generate audio file paths
-  const getAudioSrc = () => {
-    const mp3Path = `/audio/hafez/${ghazalNumber}.mp3`;
-    const oggPath = `/audio/hafez/ogg/${ghazalNumber}.ogg`;
-    return { mp3: mp3Path, ogg: oggPath };
-  };
-
-  const { mp3, ogg } = getAudioSrc();
+  useEffect(() => {
+    let cancelled = false;
+    getRecording(Number(ghazalNumber))
+      .then((recording) => {
+        if (cancelled) return;
+        if (!recording) {
+          setError('فایل صوتی یافت نشد');
+          return;
+        }
+        // Known up front, so the player never downloads a file to learn its length.
+        setDuration(recording.duration);
+        setSources(recording.sources);
+      })
+      .catch(() => {
+        if (!cancelled) setError('فایل صوتی یافت نشد');
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [ghazalNumber]);
 
   useEffect(() => {
     const audio = audioRef.current;
     if (!audio) return;
 
     const setAudioData = () => {
-      setDuration(audio.duration);
+      if (isFinite(audio.duration)) setDuration(audio.duration);
       setCurrentTime(audio.currentTime);
     };
 
@@ -39,6 +66,9 @@ const HafezAudioPlayer = ({ ghazalNumber }) => {
       setLoading(false);
       setError(null);
     };
+
+    // With preload="none" the browser stops after loadstart until play is pressed.
+    const handleSuspend = () => setLoading(false);
     
     const handleError = () => {
       setLoading(false);
@@ -54,6 +84,7 @@ const HafezAudioPlayer = ({ ghazalNumber }) => {
     audio.addEventListener('timeupdate', setAudioTime);
     audio.addEventListener('loadstart', handleLoadStart);
     audio.addEventListener('canplay', handleCanPlay);
+    audio.addEventListener('suspend', handleSuspend);
     audio.addEventListener('error', handleError);
     audio.addEventListener('ended', handleEnded);
 
@@ -65,10 +96,11 @@ const HafezAudioPlayer = ({ ghazalNumber }) => {
       audio.removeEventListener('timeupdate', setAudioTime);
       audio.removeEventListener('loadstart', handleLoadStart);
       audio.removeEventListener('canplay', handleCanPlay);
+      audio.removeEventListener('suspend', handleSuspend);
       audio.removeEventListener('error', handleError);
       audio.removeEventListener('ended', handleEnded);
     };
-  }, [ghazalNumber, volume]);
+  }, [ghazalNumber, volume, sources]);
 
   const togglePlayPause = () => {
     const audio = audioRef.current;
@@ -168,11 +200,14 @@ const HafezAudioPlayer = ({ ghazalNumber }) => {
         </div>
 
         {/* Audio Element */}
-        <audio ref={audioRef} preload="metadata">
-          <source src={mp3} type="audio/mpeg" />
-          <source src={ogg} type="audio/ogg" />
-          مرورگر شما از پخش فایل صوتی پشتیبانی نمی‌کند.
-        </audio>
+        {sources.length > 0 && (
+          <audio ref={audioRef} preload="none">
+            {sources.map((source) => (
+              <source key={source.format} src={apiService.audioUrl(source.url)} type={source.mime_type} />
+            ))}
+            مرورگر شما از پخش فایل صوتی پشتیبانی نمی‌کند.
+          </audio>
+        )}
 
         {/* Controls */}
         <div className="space-y-6">
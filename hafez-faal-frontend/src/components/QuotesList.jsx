@@ -127,14 +127,14 @@ const QuotesList = () => {
               <h3 className="text-lg font-bold text-theme-accent mb-4">دسترسی سریع</h3>
               <div className="flex flex-wrap justify-center gap-2">
                 <a 
-                  href="/search" 
+                  href={`${process.env.PUBLIC_URL}/search`} 
                   className="btn-secondary text-sm flex items-center space-x-2 space-x-reverse"
                 >
                   <span>🔍</span>
                   <span>جستجو در غزل‌ها</span>
                 </a>
                 <a 
-                  href="/dashboard" 
+                  href={`${process.env.PUBLIC_URL}/dashboard`} 
                   className="btn-secondary text-sm flex items-center space-x-2 space-x-reverse"
                 >
                   <span>🎯</span>
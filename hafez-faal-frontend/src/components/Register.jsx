@@ -1,6 +1,7 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
+import { apiService } from '../services/api';
 
 const Register = () => {
   const [formData, setFormData] = useState({
@@ -11,15 +12,52 @@ const Register = () => {
   });
   const [loading, setLoading] = useState(false);
   const [errors, setErrors] = useState({});
+  const [availability, setAvailability] = useState({});
   const { register } = useAuth();
   const navigate = useNavigate();
 
+  // Check the username and email once typing pauses; registration checks them again.
+  useEffect(() => {
+    const params = {};
+    if (formData.username.trim().length >= 3) {
+      params.username = formData.username.trim();
+    }
+    if (/\S+@\S+\.\S+/.test(formData.email)) {
+      params.email = formData.email.trim();
+    }
+    if (Object.keys(params).length === 0) {
+      setAvailability({});
+      return undefined;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await apiService.checkAvailability(params);
+        if (!cancelled) {
+          setAvailability(response.data);
+        }
+      } catch (error) {
+        // Only a hint; a failed check leaves the form as it was.
+      }
+    }, 400);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [formData.username, formData.email]);
+
+  const unavailable = (name) => (
+    availability[name] && !availability[name].available ? availability[name].message : ''
+  );
+
   const handleChange = (e) => {
     const { name, value } = e.target;
     setFormData(prev => ({
       ...prev,
       [name]: value
     }));
+    // An answer for the previous value no longer applies.
+    setAvailability(prev => ({ ...prev, [name]: undefined }));
     // Clear specific error when user starts typing
     if (errors[name]) {
       setErrors(prev => ({
@@ -36,12 +74,16 @@ const Register = () => {
       newErrors.username = 'نام کاربری الزامی است';
     } else if (formData.username.length < 3) {
       newErrors.username = 'نام کاربری باید حداقل ۳ کاراکتر باشد';
+    } else if (unavailable('username')) {
+      newErrors.username = unavailable('username');
     }
     
     if (!formData.email.trim()) {
       newErrors.email = 'ایمیل الزامی است';
     } else if (!/\S+@\S+\.\S+/.test(formData.email)) {
       newErrors.email = 'فرمت ایمیل صحیح نیست';
+    } else if (unavailable('email')) {
+      newErrors.email = unavailable('email');
     }
     
     if (!formData.password) {
@@ -138,8 +180,8 @@ const Register = () => {
                 required
                 dir="rtl"
               />
-              {errors.username && (
-                <p className="mt-2 text-sm text-red-600 dark:text-red-400">{errors.username}</p>
+              {(errors.username || unavailable('username')) && (
+                <p className="mt-2 text-sm text-red-600 dark:text-red-400">{errors.username || unavailable('username')}</p>
               )}
             </div>
 
@@ -162,8 +204,8 @@ const Register = () => {
                 required
                 dir="ltr"
               />
-              {errors.email && (
-                <p className="mt-2 text-sm text-red-600 dark:text-red-400">{errors.email}</p>
+              {(errors.email || unavailable('email')) && (
+                <p className="mt-2 text-sm text-red-600 dark:text-red-400">{errors.email || unavailable('email')}</p>
               )}
             </div>
 
@@ -69,7 +69,7 @@ api.interceptors.response.use(
       console.warn('Authentication required. Redirecting to login...');
       localStorage.removeItem('user');
       if (!window.location.pathname.includes('/login')) {
-        window.location.href = '/login';
+        window.location.href = `${process.env.PUBLIC_URL}/login`;
       }
     } else if (response?.status === 500) {
       console.error('Server error:', response.data);
@@ -88,6 +88,7 @@ export const apiService = {
   // Auth
   login: (credentials) => api.post('/auth/login/', credentials),
   register: (userData) => api.post('/auth/register/', userData),
+  checkAvailability: (params) => api.get('/auth/availability/', { params }),
   logout: () => api.post('/auth/logout/'),
   getCurrentUser: () => api.get('/auth/user/'),
 
@@ -96,6 +97,10 @@ export const apiService = {
   getDashboard: () => api.get('/dashboard/'),
   getQuotes: () => api.get('/quotes/'),
   getGhazals: () => api.get('/ghazals/'),
+
+  // Audio
+  getAudioManifest: () => api.get('/audio/manifest/'),
+  audioUrl: (path) => new URL(path, API_BASE_URL).href,
 };
 
 export default api;
\ No newline at end of file